@@ -0,0 +1,138 @@
+"""
+端到端吞吐基准测试：在本机启动替身服务器并运行完整转换流程（无需访问外网，仍需本地浏览器及其驱动）
+
+    python -m benchmarks.pipeline_benchmark --lines 50 --mode 日文Yukkuri
+    python -m benchmarks.pipeline_benchmark --lines 50 --mode 中文Yukkuri --latency 300 --jitter 100 --error-rate 0.05
+
+录制真实网站上的一次运行，之后不访问网站、不启动浏览器即可反复回放（按原始耗时或尽快）：
+
+    python -m benchmarks.pipeline_benchmark --live --input script.txt --mode 中文Yukkuri --record run.zip
+    python -m benchmarks.pipeline_benchmark --input script.txt --mode 中文Yukkuri --replay run.zip --replay-speed fast
+
+输出总耗时、每分钟行数、各阶段统计（来自 ThroughputTracker）以及替身服务器的请求/错误/限流计数
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from core.conversion_engine import ConversionEngine
+from standin.server import SERVICES, FaultProfile, StandinServer
+
+SAMPLE_LINES = {
+    "中文Yukkuri": "今天的天气非常好我们一起去公园散步吧",
+    "英文Yukkuri": "the quick brown fox jumps over the lazy dog",
+    "日文Yukkuri": "ゆっくりしていってね今日はいい天気ですね",
+    "中文翻译日文Yukkuri": "这是一个用于测试翻译流程的句子",
+}
+
+
+def sample_script(mode, count):
+    """生成长度不一的测试文本（每行长度按行号循环变化）"""
+    base = SAMPLE_LINES[mode]
+    separator = " " if mode == "英文Yukkuri" else ""
+    lines = []
+    for i in range(count):
+        if mode == "英文Yukkuri":
+            words = base.split()
+            lines.append(separator.join(words[:3 + i % (len(words) - 2)]))
+        else:
+            lines.append(base[:6 + i % (len(base) - 5)])
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="基于替身服务器的端到端吞吐基准测试")
+    parser.add_argument("--lines", type=int, default=20)
+    parser.add_argument("--mode", default="日文Yukkuri", choices=sorted(SAMPLE_LINES))
+    parser.add_argument("--browser", default="自动检测", choices=["自动检测", "Chrome", "Edge", "Firefox"])
+    parser.add_argument("--speed", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=100.0, help="替身服务器基础延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--synth-ms-per-char", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="保留输出目录")
+    parser.add_argument("--input", default=None, help="使用指定的文本文件（默认生成 --lines 行测试文本）")
+    parser.add_argument("--live", action="store_true", help="访问真实网站而不是替身服务器")
+    parser.add_argument("--record", default=None, help="把远程交互录制到该存档（zip）")
+    parser.add_argument("--replay", default=None, help="从存档回放远程交互（不访问网站）")
+    parser.add_argument("--replay-speed", default="original",
+                        help="回放耗时：original（原始耗时）、fast（不等待）或倍率数值")
+    args = parser.parse_args(argv)
+
+    server = None
+    base_url = None
+    if not args.live and not args.replay:
+        base = FaultProfile(args.latency, args.jitter, args.error_rate, args.rate_limit)
+        profiles = {name: base for name in SERVICES}
+        profiles["yukumo_synth"] = base.updated(ms_per_char=args.synth_ms_per_char)
+        server = StandinServer(profiles=profiles, seed=args.seed)
+        base_url = server.start()
+
+    work_dir = tempfile.mkdtemp(prefix="yukkuri-bench-")
+    output_dir = os.path.join(work_dir, "out")
+    os.makedirs(output_dir)
+    if args.input:
+        input_file = args.input
+        with open(input_file, "r", encoding="utf-8") as f:
+            line_count = len([line for line in f if line.strip()])
+    else:
+        input_file = os.path.join(work_dir, "script.txt")
+        line_count = args.lines
+        with open(input_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(sample_script(args.mode, args.lines)))
+
+    def log(message):
+        print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+    params = {
+        "input_file": input_file,
+        "output_dir": output_dir,
+        "mode": args.mode,
+        "voice_type": "aqtk1-f1",
+        "speed": args.speed,
+        "volume": 100,
+        "pitch": 100,
+        "generate_lrc": True,
+        "browser_type": args.browser,
+        "endpoints": base_url,
+        "record_path": args.record,
+        "replay_path": args.replay,
+        "replay_speed": args.replay_speed if args.replay_speed in ("original", "fast") else float(args.replay_speed),
+        # 基准测试不写入用户的吞吐历史
+        "history_path": os.path.join(work_dir, "history.json"),
+        "log_callback": log,
+        "progress_callback": lambda value, text: None,
+        "status_callback": log,
+        "stop_flag": lambda: False,
+    }
+
+    start = time.perf_counter()
+    try:
+        ConversionEngine().run_conversion(params)
+    finally:
+        elapsed = time.perf_counter() - start
+        if server:
+            server.stop()
+
+    produced = len([name for name in os.listdir(output_dir) if not name.startswith(".")
+                    and not name.endswith(".lrc")])
+    print()
+    print(f"模式 {args.mode}，{line_count} 行，生成 {produced} 个音频文件")
+    print(f"总耗时 {elapsed:.1f} 秒，{line_count / elapsed * 60:.1f} 行/分")
+    if server:
+        print(f"{'服务':<14}{'请求':>6}{'错误':>6}{'限流':>6}{'注入延迟(s)':>14}")
+        for name, stats in server.snapshot().items():
+            print(f"{name:<14}{stats['requests']:>6}{stats['errors']:>6}{stats['throttled']:>6}"
+                  f"{stats['latency_total']:>14.1f}")
+    if args.keep:
+        print(f"输出目录: {work_dir}")
+    else:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+质量预设基准测试：fast / balanced / high 的处理耗时、输出大小与相对 high 的谱距离
+
+    python -m benchmarks.quality_preset_benchmark                      # 使用合成的类语音信号
+    python -m benchmarks.quality_preset_benchmark voice.mp3 --speed 130 --pitch 120
+
+每个预设都走完整的 AudioProcessor.process_audio（解码、音程/语速/音量处理、编码），
+质量指标为与 high 输出在语音频带（8kHz 以下）内的对数谱距离（统一重采样到 22.05kHz 单声道，
+低于峰值 60dB 的能量视为静音，单位dB，越小越接近 high）
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import librosa
+import numpy as np
+
+from core.audio_codec import AudioCodec, get_output_format
+from core.audio_processor import AudioProcessor, QUALITY_PRESETS
+from benchmarks.time_stretch_benchmark import synthetic_speech
+
+COMPARE_SR = 22050
+SPEECH_BAND_HZ = 8000
+FLOOR_DB = 60
+
+
+def speech_band_distance(reference, estimate, n_fft=1024, hop=256):
+    """语音频带内的对数谱距离；两者都按 reference 的峰值设下限，避免静音段与编码器截止频率以上的空白主导结果"""
+    length = min(len(reference), len(estimate))
+    bins = int(SPEECH_BAND_HZ / (COMPARE_SR / 2) * (n_fft // 2)) + 1
+    ref = np.abs(librosa.stft(reference[:length], n_fft=n_fft, hop_length=hop))[:bins]
+    est = np.abs(librosa.stft(estimate[:length], n_fft=n_fft, hop_length=hop))[:bins]
+    floor = ref.max() * 10 ** (-FLOOR_DB / 20)
+    diff = 20 * np.log10(np.maximum(ref, floor)) - 20 * np.log10(np.maximum(est, floor))
+    return float(np.mean(np.sqrt(np.mean(diff ** 2, axis=0))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="质量预设基准测试")
+    parser.add_argument("audio", nargs="?", help="输入音频（默认使用合成语音）")
+    parser.add_argument("--speed", type=int, default=130)
+    parser.add_argument("--volume", type=int, default=120)
+    parser.add_argument("--pitch", type=int, default=110)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    codec = AudioCodec()
+    processor = AudioProcessor()
+    work_dir = tempfile.mkdtemp(prefix="yukkuri-quality-")
+    try:
+        source = os.path.join(work_dir, "source.mp3")
+        if args.audio:
+            shutil.copyfile(args.audio, source)
+        else:
+            codec.encode_with_format(synthetic_speech(44100), 44100, source, get_output_format("mp3_320"))
+        duration = codec.duration(source)
+
+        # 预热（librosa 首次调用包含 numba 编译等开销）
+        for key in QUALITY_PRESETS:
+            warm = os.path.join(work_dir, f"warm-{key}.mp3")
+            shutil.copyfile(source, warm)
+            processor.process_audio(warm, args.speed, args.volume, args.pitch, lambda message: None,
+                                    quality_preset=key, streaming=False)
+
+        results = {}
+        for key in QUALITY_PRESETS:
+            best = float("inf")
+            output = None
+            for repeat in range(args.repeats):
+                clip = os.path.join(work_dir, f"{key}-{repeat}.mp3")
+                shutil.copyfile(source, clip)
+                start = time.perf_counter()
+                output = processor.process_audio(clip, args.speed, args.volume, args.pitch, lambda message: None,
+                                                 quality_preset=key, streaming=False)
+                best = min(best, time.perf_counter() - start)
+            audio, _ = codec.decode(output, sample_rate=COMPARE_SR, mono=True)
+            results[key] = (best, os.path.getsize(output), audio)
+
+        reference = results["high"][2]
+        print(f"音频时长 {duration:.2f} 秒，语速 {args.speed}% 音量 {args.volume}% 音程 {args.pitch}%")
+        print(f"{'预设':<10}{'耗时(ms)':>12}{'相对high':>12}{'输出大小(KB)':>16}{'与high谱距离(dB)':>20}")
+        for key, (elapsed, size, audio) in results.items():
+            distance = speech_band_distance(reference, audio) if key != "high" else 0.0
+            print(f"{key:<10}{elapsed * 1000:>12.1f}{results['high'][0] / elapsed:>11.1f}x"
+                  f"{size / 1024:>16.1f}{distance:>20.2f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from core.cancellation import check_cancelled
+
+# 各远程服务的初始设置：并发上限、初始并发、请求间隔（秒）的初始值/下限、失败后的最小退避、
+# 每次成功增加的请求速率（次/秒）
+SERVICE_DEFAULTS = {
+    # 语音合成（每个浏览器一次一行；分段合成与任务服务器会并发）；各行长短不同耗时差别大，延迟阈值放宽
+    "yukumo": {"max_concurrency": 4, "initial_concurrency": 2, "initial_interval": 1.0,
+               "min_interval": 0.2, "min_backoff": 1.0, "rate_step": 0.2, "latency_factor": 3.0},
+    # 中文转片假名（每次转换整段文本，通常只有一个请求，间隔只在重试时起作用）
+    "ltool": {"max_concurrency": 1, "initial_concurrency": 1, "initial_interval": 0.0,
+              "min_interval": 0.0, "min_backoff": 2.0},
+    # 英文转片假名（逐行）
+    "sljfaq": {"max_concurrency": 1, "initial_concurrency": 1, "initial_interval": 1.0,
+               "min_interval": 0.2, "min_backoff": 1.0},
+    # MyMemory 翻译接口（逐行 HTTP 请求）
+    "translation": {"max_concurrency": 4, "initial_concurrency": 2, "initial_interval": 0.5,
+                    "min_interval": 0.1, "min_backoff": 0.5},
+}
+
+
+class AdaptiveLimiter:
+    """
+    单个远程服务的自适应限速（AIMD）与熔断：
+    - 请求成功且延迟正常时加性增加（并发上限 +1/上限，请求速率 +rate_step 次/秒）
+    - 失败、被限流或延迟超过基线 latency_factor 倍时乘性减少（并发上限减半，请求间隔加倍，至少 min_backoff）
+    - 连续失败 failure_threshold 次后熔断：cool_down 秒内不发出请求，之后只放行一个探测请求，
+      探测成功后从初始速率重新开始，失败则再次熔断且冷却时间加倍（不超过 max_cool_down）
+    熔断期间的请求等待冷却结束（可被取消），而不是直接失败，避免把失败行的重试次数浪费在熔断上
+    """
+
+    def __init__(self, name, max_concurrency=4, initial_concurrency=1, initial_interval=0.5,
+                 min_interval=0.0, max_interval=10.0, min_backoff=1.0, rate_step=0.5,
+                 latency_factor=2.0, failure_threshold=5, cool_down=30.0, max_cool_down=300.0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.initial_concurrency = initial_concurrency
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.min_backoff = min_backoff
+        self.rate_step = rate_step
+        self.latency_factor = latency_factor
+        self.failure_threshold = failure_threshold
+        self.base_cool_down = cool_down
+        self.max_cool_down = max_cool_down
+
+        self.limit = float(min(initial_concurrency, max_concurrency))
+        self.interval = initial_interval
+        self.cool_down = cool_down
+        self.baseline_latency = None
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.throttled = 0
+        self.opened = 0
+        self._next_start = 0.0
+        self._open_until = 0.0
+        self._half_open = False
+        self._probing = False
+        self._condition = threading.Condition()
+
+    @property
+    def state(self):
+        with self._condition:
+            if self._open_until > time.monotonic():
+                return "open"
+            return "half_open" if self._half_open else "closed"
+
+    @contextmanager
+    def request(self, log_callback=None):
+        """
+        发出一次请求：等待熔断冷却、并发名额与请求间隔后进入；块内抛出异常或调用 call.fail()
+        视为失败，正常结束视为成功并按耗时调整；取消、KeyboardInterrupt 等只归还名额，不计入结果
+        """
+        self._acquire(log_callback)
+        call = _Call()
+        start = time.monotonic()
+        success = None
+        try:
+            yield call
+        except Exception:
+            success = False
+            raise
+        else:
+            if call.throttled:
+                with self._condition:
+                    self.throttled += 1
+            success = not call.failed
+        finally:
+            # 无论以何种方式离开都恰好归还一次并发名额
+            if success is None:
+                self._release()
+            else:
+                self._record(success, time.monotonic() - start, log_callback)
+
+    def _acquire(self, log_callback):
+        announced = False
+        with self._condition:
+            while True:
+                check_cancelled()
+                now = time.monotonic()
+                if self._open_until > now:
+                    wait = self._open_until - now
+                    if log_callback and not announced:
+                        log_callback(f"{self.name} 连续失败已熔断，{wait:.0f} 秒后试探恢复")
+                        announced = True
+                elif self._open_until and not self._half_open:
+                    # 冷却结束：进入半开状态，只放行一个探测请求
+                    self._half_open = True
+                    continue
+                elif self._half_open and (self._probing or self.in_flight):
+                    wait = 0.1
+                elif self.in_flight >= max(1, int(self.limit)):
+                    wait = 0.1
+                elif self._next_start > now:
+                    wait = self._next_start - now
+                else:
+                    self.in_flight += 1
+                    self.requests += 1
+                    self._next_start = now + self.interval
+                    self._probing = self._half_open
+                    return
+                # 分段等待，以便及时响应取消与其他请求的结束
+                self._condition.wait(min(wait, 0.1))
+
+    def _release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._probing = False
+            self._condition.notify_all()
+
+    def _record(self, success, latency, log_callback):
+        with self._condition:
+            self.in_flight -= 1
+            self._probing = False
+            if success:
+                self._on_success(latency, log_callback)
+            else:
+                self._on_failure(log_callback)
+            self._condition.notify_all()
+
+    def _on_success(self, latency, log_callback):
+        self.consecutive_failures = 0
+        if self._half_open:
+            # 熔断前学到的速率已不可信，从初始值重新开始
+            self._half_open = False
+            self._open_until = 0.0
+            self.cool_down = self.base_cool_down
+            self.limit = float(min(self.initial_concurrency, self.max_concurrency))
+            self.interval = self.initial_interval
+            if log_callback:
+                log_callback(f"{self.name} 已恢复")
+            return
+
+        congested = self.baseline_latency is not None and latency > self.baseline_latency * self.latency_factor
+        # 延迟基线取较慢的指数平均，偶发的慢请求不会立即拉高基线
+        self.baseline_latency = latency if self.baseline_latency is None else (
+            0.9 * self.baseline_latency + 0.1 * latency)
+        if congested:
+            self._decrease()
+        else:
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            if self.interval > 0:
+                self.interval = max(self.min_interval, 1.0 / (1.0 / self.interval + self.rate_step))
+
+    def _on_failure(self, log_callback):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self._half_open or self.consecutive_failures >= self.failure_threshold:
+            if self._half_open:
+                self.cool_down = min(self.max_cool_down, self.cool_down * 2)
+            self._half_open = False
+            self._open_until = time.monotonic() + self.cool_down
+            self.consecutive_failures = 0
+            self.opened += 1
+            if log_callback:
+                log_callback(f"{self.name} 连续失败，暂停请求 {self.cool_down:.0f} 秒")
+        else:
+            self._decrease()
+
+    def _decrease(self):
+        self.limit = max(1.0, self.limit / 2)
+        self.interval = min(self.max_interval, max(self.interval * 2, self.min_backoff))
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                "state": self.state,
+                "limit": round(self.limit, 2),
+                "interval": round(self.interval, 3),
+                "latency": round(self.baseline_latency, 3) if self.baseline_latency is not None else None,
+                "requests": self.requests,
+                "failures": self.failures,
+                "throttled": self.throttled,
+                "opened": self.opened,
+            }
+
+    def summary(self):
+        info = self.snapshot()
+        latency = f"{info['latency']:.2f}s" if info["latency"] is not None else "-"
+        return (f"{self.name}: 请求 {info['requests']} 次，失败 {info['failures']} 次"
+                f"（其中限流 {info['throttled']} 次），熔断 {info['opened']} 次，"
+                f"当前并发上限 {int(info['limit'])}、间隔 {info['interval']:.2f}s、延迟基线 {latency}")
+
+
+class _Call:
+    """request() 块内用于标记本次请求结果"""
+
+    def __init__(self):
+        self.failed = False
+        self.throttled = False
+
+    def fail(self, throttled=False):
+        self.failed = True
+        self.throttled = self.throttled or throttled
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(service):
+    """进程内共享的服务限速器（同一进程中的多个任务共用，学到的速率在任务之间保留）"""
+    with _limiters_lock:
+        limiter = _limiters.get(service)
+        if limiter is None:
+            limiter = _limiters[service] = AdaptiveLimiter(service, **SERVICE_DEFAULTS.get(service, {}))
+        return limiter
+
+
+def limiter_summaries():
+    """本进程中发出过请求的各服务的统计"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.summary() for limiter in limiters if limiter.requests]
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+
+from core.cancellation import CancellationToken, use_token
+from core.conversion_engine import ConversionEngine
+
+
+class AsyncConversionEngine:
+    """
+    ConversionEngine 的 asyncio 调度层：阻塞的 Selenium/librosa 调用在工作线程中执行，
+    事件循环每 poll_interval 秒检查一次停止标志。停止时取消令牌：可中断的等待立即结束，
+    各阶段的循环抛出 ConversionCancelled，已打开的浏览器被关闭（进行中的 WebDriver 调用随之失败），
+    并在 grace_period 秒内返回；仍在执行的单次音频处理在后台结束，结果被丢弃
+    """
+
+    def __init__(self, engine=None, poll_interval=0.1, grace_period=1.0):
+        self.engine = engine or ConversionEngine()
+        self.poll_interval = poll_interval
+        self.grace_period = grace_period
+        self._worker = None
+
+    async def run_conversion(self, params):
+        """与 ConversionEngine.run_conversion 相同，成功完成时返回 True"""
+        return await self._supervise(self.engine.run_conversion, params)
+
+    async def run_batch(self, params, input_files, file_callback=None):
+        """与 ConversionEngine.run_batch 相同，返回各文件结果（取消时返回 None）"""
+        return await self._supervise(self.engine.run_batch, params, input_files, file_callback)
+
+    def run_conversion_blocking(self, params):
+        """供线程（GUI、任务服务器）调用的同步入口"""
+        return asyncio.run(self.run_conversion(params))
+
+    def run_batch_blocking(self, params, input_files, file_callback=None):
+        return asyncio.run(self.run_batch(params, input_files, file_callback))
+
+    async def _supervise(self, target, params, *args):
+        user_stop = params["stop_flag"]
+        # 上一次被取消的转换可能仍在后台收尾，等它结束再复用同一个引擎
+        if self._worker is not None and self._worker.is_alive():
+            params["log_callback"]("等待上一次转换结束...")
+            while self._worker.is_alive():
+                if user_stop():
+                    return None
+                await asyncio.sleep(self.poll_interval)
+
+        token = CancellationToken()
+        run_params = dict(params, stop_flag=lambda: token.cancelled or user_stop())
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(result, error):
+            if not future.done():
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+        def work():
+            # 无论以何种异常结束（包括 ConversionCancelled 等 BaseException）都要结束 future，
+            # 否则事件循环会一直等待
+            result, error = None, None
+            try:
+                with use_token(token):
+                    result = target(run_params, *args)
+            except BaseException as e:
+                error = e
+            finally:
+                try:
+                    loop.call_soon_threadsafe(resolve, result, error)
+                except RuntimeError:
+                    # 事件循环已关闭（取消后 _supervise 已返回）
+                    pass
+
+        # 守护线程：取消后不阻塞事件循环与进程退出
+        self._worker = threading.Thread(target=work, daemon=True)
+        self._worker.start()
+
+        while not future.done():
+            if user_stop():
+                token.cancel()
+                params["log_callback"]("正在取消所有进行中的任务...")
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), self.grace_period)
+                except asyncio.TimeoutError:
+                    params["log_callback"]("已停止，仍在执行的单个音频处理将在后台结束")
+                    return None
+                break
+            await asyncio.wait({future}, timeout=self.poll_interval)
+
+        result = future.result()
+        if "result" in run_params:
+            params["result"] = run_params["result"]
+        return result
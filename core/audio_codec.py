@@ -0,0 +1,349 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+import numpy as np
+import soundfile as sf
+
+from core.utils import get_ffmpeg_path
+
+# soundfile 可直接读写的容器（libsndfile >= 1.1 起支持 MP3）
+_SOUNDFILE_FORMATS = {".wav": "WAV", ".flac": "FLAC", ".ogg": "OGG", ".mp3": "MP3"}
+
+# 可选的输出格式
+# subtype/compression_level/bitrate_mode 用于 libsndfile 编码，ffmpeg_args 用于回退到 ffmpeg 时；
+# sample_rate 为 None 时使用处理器的默认采样率，channels 为 1 时混缩为单声道
+OUTPUT_FORMATS = {
+    "mp3_320": {
+        "label": "MP3 320k CBR（最高质量）",
+        "extension": ".mp3",
+        "subtype": "MPEG_LAYER_III",
+        "bitrate_mode": "CONSTANT",
+        "compression_level": 0.0,
+        "ffmpeg_args": ["-codec:a", "libmp3lame", "-q:a", "0", "-joint_stereo", "1",
+                        "-reservoir", "1", "-b:a", "320k"],
+    },
+    "mp3_v2": {
+        "label": "MP3 VBR V2（约190k）",
+        "extension": ".mp3",
+        "subtype": "MPEG_LAYER_III",
+        "bitrate_mode": "VARIABLE",
+        "compression_level": 0.2,
+        "ffmpeg_args": ["-codec:a", "libmp3lame", "-q:a", "2"],
+    },
+    "mp3_v5": {
+        "label": "MP3 VBR V5（约130k）",
+        "extension": ".mp3",
+        "subtype": "MPEG_LAYER_III",
+        "bitrate_mode": "VARIABLE",
+        "compression_level": 0.5,
+        "ffmpeg_args": ["-codec:a", "libmp3lame", "-q:a", "5"],
+    },
+    "mp3_speech_fast": {
+        "label": "MP3 语音快速（单声道 22.05kHz VBR V7）",
+        "extension": ".mp3",
+        "subtype": "MPEG_LAYER_III",
+        "bitrate_mode": "VARIABLE",
+        "compression_level": 0.7,
+        "sample_rate": 22050,
+        "channels": 1,
+        "ffmpeg_args": ["-codec:a", "libmp3lame", "-q:a", "7", "-compression_level", "9"],
+    },
+    "opus": {
+        "label": "Opus/OGG 96k",
+        "extension": ".ogg",
+        "subtype": "OPUS",
+        "compression_level": 0.85,
+        "sample_rate": 48000,
+        "ffmpeg_args": ["-codec:a", "libopus", "-b:a", "96k"],
+    },
+    "speech_fast": {
+        "label": "Opus 语音快速（单声道 24kHz，推荐草稿）",
+        "extension": ".ogg",
+        "subtype": "OPUS",
+        "compression_level": 0.9,
+        "sample_rate": 24000,
+        "channels": 1,
+        "ffmpeg_args": ["-codec:a", "libopus", "-b:a", "32k", "-application", "voip",
+                        "-compression_level", "0"],
+    },
+    "flac": {
+        "label": "FLAC 无损",
+        "extension": ".flac",
+        "subtype": "PCM_16",
+        "compression_level": 0.5,
+        "ffmpeg_args": ["-codec:a", "flac", "-compression_level", "5"],
+    },
+    "wav": {
+        "label": "WAV 16位（不压缩，编码最快）",
+        "extension": ".wav",
+        "subtype": "PCM_16",
+        "ffmpeg_args": ["-codec:a", "pcm_s16le"],
+    },
+}
+
+DEFAULT_OUTPUT_FORMAT = "mp3_320"
+
+
+def get_output_format(key):
+    """按键名获取输出格式，未知键名时使用默认格式"""
+    return OUTPUT_FORMATS.get(key) or OUTPUT_FORMATS[DEFAULT_OUTPUT_FORMAT]
+
+
+class AudioCodec:
+    """
+    进程内的音频编解码入口，AudioProcessor 的所有解码/编码都经过这里
+    优先使用 libsndfile（soundfile）在进程内完成，避免每次调用都启动 ffmpeg/ffprobe；
+    libsndfile 不支持的格式回退为单个经管道传输PCM的 ffmpeg 进程（不调用 ffprobe、不写临时WAV）
+    """
+
+    def __init__(self, max_ffmpeg_processes=2):
+        self._formats = {name.upper() for name in sf.available_formats()}
+        # 限制同时运行的 ffmpeg 子进程数量
+        self._ffmpeg_slots = threading.BoundedSemaphore(max_ffmpeg_processes)
+
+    def supports_in_process(self, path):
+        """判断该文件能否由 libsndfile 在进程内编解码"""
+        container = _SOUNDFILE_FORMATS.get(os.path.splitext(path)[1].lower())
+        return container is not None and container in self._formats
+
+    def ffmpeg_binary(self):
+        """优先使用 resources 中附带的 ffmpeg，其次使用 PATH 中的 ffmpeg"""
+        bundled = get_ffmpeg_path()
+        if os.path.exists(bundled):
+            return bundled
+        return shutil.which("ffmpeg") or "ffmpeg"
+
+    def decode(self, path, sample_rate=None, mono=False, res_type=None):
+        """
+        解码为 float32 数组（单声道为 (n,)，多声道为 (channels, n)，与 librosa.load(mono=False) 一致）
+        sample_rate 不为 None 时重采样到该采样率（res_type 为重采样器，见 resample）；返回 (数组, 采样率)
+        """
+        if self.supports_in_process(path):
+            data, sr = sf.read(path, dtype="float32", always_2d=True)
+            audio = data.T
+        else:
+            audio, sr = self._decode_with_ffmpeg(path)
+
+        if mono and audio.shape[0] > 1:
+            audio = audio.mean(axis=0, keepdims=True)
+
+        if sample_rate is not None and sr != sample_rate:
+            audio = self.resample(audio, sr, sample_rate, res_type)
+            sr = sample_rate
+
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        return (audio[0] if audio.shape[0] == 1 else audio), sr
+
+    def duration(self, path):
+        """音频时长（秒），不解码"""
+        if self.supports_in_process(path):
+            return sf.info(path).duration
+        import mutagen
+        info = mutagen.File(path)
+        return getattr(info.info, "length", 0.0) if info else 0.0
+
+    def open_reader(self, path, block_seconds):
+        """
+        流式解码：返回 (块迭代器, 采样率, 声道数)，每块为约 block_seconds 秒的 (channels, n) float32 数组
+        """
+        if self.supports_in_process(path):
+            info = sf.info(path)
+            block = max(1, int(info.samplerate * block_seconds))
+
+            def blocks():
+                with sf.SoundFile(path) as f:
+                    for data in f.blocks(blocksize=block, dtype="float32", always_2d=True):
+                        yield data.T
+
+            return blocks(), info.samplerate, info.channels
+
+        sr, channels = self._probe(path)
+        return self._stream_from_ffmpeg(path, sr, channels, max(1, int(sr * block_seconds))), sr, channels
+
+    def open_writer(self, path, sample_rate, channels, output_format):
+        """流式编码：返回带 write((channels, n) 数组) 与 close() 的写入器（参数同 encode_with_format）"""
+        if self.supports_in_process(path):
+            container = _SOUNDFILE_FORMATS[os.path.splitext(path)[1].lower()]
+            options = {}
+            if output_format.get("compression_level") is not None:
+                options["compression_level"] = output_format["compression_level"]
+            if output_format.get("bitrate_mode") is not None:
+                options["bitrate_mode"] = output_format["bitrate_mode"]
+            try:
+                return _SoundFileWriter(sf.SoundFile(path, "w", sample_rate, channels, format=container,
+                                                     subtype=output_format.get("subtype"), **options))
+            except TypeError:
+                # 旧版 soundfile 不支持码率设置，交给 ffmpeg
+                pass
+        return _FfmpegWriter(self, path, sample_rate, channels, output_format.get("ffmpeg_args") or [])
+
+    def resample(self, audio, orig_sr, target_sr, res_type=None):
+        """对 (channels, n) 数组重采样；res_type 为 librosa 的重采样器（默认 soxr_hq，soxr_mq/soxr_lq 更快）"""
+        import librosa
+        options = {"res_type": res_type} if res_type else {}
+        return librosa.resample(audio, orig_sr=orig_sr, target_sr=target_sr, axis=-1, **options)
+
+    def encode_with_format(self, audio, sample_rate, path, output_format):
+        """按输出格式配置（OUTPUT_FORMATS 中的一项）调整采样率/声道后编码"""
+        audio = np.asarray(audio, dtype=np.float32)
+        if output_format.get("channels") == 1 and audio.ndim > 1:
+            audio = audio.mean(axis=0)
+
+        target_rate = output_format.get("sample_rate") or sample_rate
+        if target_rate != sample_rate:
+            audio = self.resample(audio, sample_rate, target_rate)
+
+        return self.encode(audio, target_rate, path,
+                           subtype=output_format.get("subtype"),
+                           compression_level=output_format.get("compression_level"),
+                           bitrate_mode=output_format.get("bitrate_mode"),
+                           ffmpeg_args=output_format.get("ffmpeg_args"))
+
+    def encode(self, audio, sample_rate, path, subtype=None, compression_level=None,
+               bitrate_mode=None, ffmpeg_args=None):
+        """
+        把 float32 数组编码写入 path（格式由扩展名决定）
+        subtype/compression_level/bitrate_mode 为 libsndfile 的编码设置；ffmpeg_args 为回退到 ffmpeg 时的编码参数
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        frames = audio.T if audio.ndim > 1 else audio
+
+        if self.supports_in_process(path):
+            container = _SOUNDFILE_FORMATS[os.path.splitext(path)[1].lower()]
+            options = {}
+            if compression_level is not None:
+                options["compression_level"] = compression_level
+            if bitrate_mode is not None:
+                options["bitrate_mode"] = bitrate_mode
+            try:
+                sf.write(path, frames, sample_rate, format=container, subtype=subtype, **options)
+                return path
+            except TypeError:
+                # 旧版 soundfile 不支持码率设置，交给 ffmpeg
+                pass
+
+        channels = audio.shape[0] if audio.ndim > 1 else 1
+        self._encode_with_ffmpeg(frames, sample_rate, channels, path, ffmpeg_args or [])
+        return path
+
+    def _run_ffmpeg(self, args, input_bytes=None):
+        with self._ffmpeg_slots:
+            result = subprocess.run(
+                [self.ffmpeg_binary(), "-hide_banner", "-v", "error", "-y"] + args,
+                input=input_bytes, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg 执行失败: {result.stderr.decode('utf-8', 'ignore').strip()}")
+        return result.stdout
+
+    def _probe(self, path):
+        """不启动 ffprobe，使用 mutagen 读取采样率与声道数"""
+        import mutagen
+        info = mutagen.File(path)
+        sr = getattr(info.info, "sample_rate", None) if info else None
+        channels = getattr(info.info, "channels", None) if info else None
+        return sr or 44100, channels or 2
+
+    def _decode_with_ffmpeg(self, path):
+        sr, channels = self._probe(path)
+        raw = self._run_ffmpeg(["-i", path, "-f", "f32le", "-acodec", "pcm_f32le",
+                                "-ac", str(channels), "-ar", str(sr), "pipe:1"])
+        audio = np.frombuffer(raw, dtype=np.float32).reshape(-1, channels).T
+        return audio, sr
+
+    def _stream_from_ffmpeg(self, path, sr, channels, block):
+        frame_bytes = 4 * channels
+        with self._ffmpeg_slots:
+            process = subprocess.Popen(
+                [self.ffmpeg_binary(), "-hide_banner", "-v", "error", "-i", path, "-f", "f32le",
+                 "-acodec", "pcm_f32le", "-ac", str(channels), "-ar", str(sr), "pipe:1"],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+            try:
+                while True:
+                    raw = process.stdout.read(block * frame_bytes)
+                    if not raw:
+                        break
+                    raw = raw[:len(raw) // frame_bytes * frame_bytes]
+                    yield np.frombuffer(raw, dtype="<f4").reshape(-1, channels).T
+            finally:
+                process.stdout.close()
+                if process.wait() != 0:
+                    raise RuntimeError(f"ffmpeg 解码失败: {path}")
+
+    def _encode_with_ffmpeg(self, frames, sample_rate, channels, path, ffmpeg_args):
+        pcm = np.ascontiguousarray(frames, dtype="<f4").tobytes()
+        self._run_ffmpeg(["-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0"]
+                         + list(ffmpeg_args) + [path], input_bytes=pcm)
+
+
+class _SoundFileWriter:
+    def __init__(self, sound_file):
+        self.sound_file = sound_file
+
+    def write(self, audio):
+        self.sound_file.write(np.asarray(audio, dtype=np.float32).T)
+
+    def close(self):
+        self.sound_file.close()
+
+
+class _FfmpegWriter:
+    """通过管道把PCM逐块写入 ffmpeg 编码"""
+
+    def __init__(self, codec, path, sample_rate, channels, ffmpeg_args):
+        self.codec = codec
+        # 错误输出写入临时文件：写满管道缓冲区的 ffmpeg 会阻塞，使 write() 永远等待
+        self.stderr = tempfile.TemporaryFile()
+        codec._ffmpeg_slots.acquire()
+        try:
+            self.process = subprocess.Popen(
+                [codec.ffmpeg_binary(), "-hide_banner", "-v", "error", "-y", "-f", "f32le", "-ar", str(sample_rate),
+                 "-ac", str(channels), "-i", "pipe:0"] + list(ffmpeg_args) + [path],
+                stdin=subprocess.PIPE, stderr=self.stderr
+            )
+        except BaseException:
+            codec._ffmpeg_slots.release()
+            self.stderr.close()
+            raise
+
+    def write(self, audio):
+        audio = np.asarray(audio, dtype=np.float32)
+        self.process.stdin.write(np.ascontiguousarray(audio.T, dtype="<f4").tobytes())
+
+    def close(self):
+        try:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass  # ffmpeg 已提前退出，错误见退出码与错误输出
+            if self.process.wait() != 0:
+                self.stderr.seek(0)
+                stderr = self.stderr.read().decode("utf-8", "ignore").strip()[-2000:]
+                raise RuntimeError(f"ffmpeg 执行失败: {stderr}")
+        finally:
+            self.stderr.close()
+            self.codec._ffmpeg_slots.release()
+
+
+def segment_to_array(segment):
+    """pydub.AudioSegment -> float32 数组 ((n,) 或 (channels, n))"""
+    samples = np.array(segment.get_array_of_samples(), dtype=np.float32)
+    samples /= float(1 << (8 * segment.sample_width - 1))
+    if segment.channels > 1:
+        return samples.reshape(-1, segment.channels).T
+    return samples
+
+
+def array_to_segment(audio, sample_rate):
+    """float32 数组 -> 32位 pydub.AudioSegment"""
+    from pydub import AudioSegment
+
+    audio = np.asarray(audio, dtype=np.float32)
+    channels = audio.shape[0] if audio.ndim > 1 else 1
+    interleaved = audio.T.reshape(-1) if audio.ndim > 1 else audio
+    pcm = (np.clip(interleaved, -1.0, 1.0) * 2147483647.0).astype("<i4")
+    return AudioSegment(data=pcm.tobytes(), sample_width=4, frame_rate=sample_rate, channels=channels)
@@ -3,7 +3,6 @@ import time
 import math
 import numpy as np
 import librosa
-import soundfile as sf
 
 # 在导入 pydub 前设置环境变量
 from core.utils import get_ffmpeg_path, get_ffprobe_path
@@ -25,18 +24,86 @@ _setup_ffmpeg_early()
 # 现在再导入 pydub
 from pydub import AudioSegment
 from pydub.effects import speedup
-import tempfile
+
+from core.audio_codec import (AudioCodec, DEFAULT_OUTPUT_FORMAT, get_output_format,
+                              segment_to_array, array_to_segment)
+from core.cancellation import check_cancelled
+from core.dsp import apply_dynamics, resample_pitch, restore_formants, wsola_time_stretch
+from core.block_stream import (OverlapAddStream, MapStream, dynamics_stream, resample_stream,
+                               run_pipeline)
+
+# 可选的语速调整（时间伸缩）算法
+STRETCH_ALGORITHMS = {
+    "librosa": "相位声码器（librosa，默认）",
+    "wsola": "WSOLA（语音快速，保留瞬态）",
+    "pydub": "pydub分块交叉淡化",
+}
+DEFAULT_STRETCH_ALGORITHM = "librosa"
+
+# 质量预设：处理采样率、STFT参数、重采样器、默认变速算法与默认输出格式一起切换
+# （未指定语速算法/输出格式时使用预设的值；None 表示沿用 AudioProcessor 的默认设置）
+# single_pass 为真时音程用一次多相重采样、再与语速合并为一次时间伸缩，省去 pitch_shift 内部的第二次伸缩
+# 速度与质量见 benchmarks/quality_preset_benchmark.py 及 README
+QUALITY_PRESETS = {
+    "fast": {
+        "label": "快速草稿",
+        "sample_rate": 22050,
+        "n_fft": 1024,
+        "hop_length": 256,
+        "res_type": "soxr_lq",
+        "stretch_algorithm": "wsola",
+        "output_format": "mp3_speech_fast",
+        "output_sample_rate": 22050,
+        "single_pass": True,
+    },
+    "balanced": {
+        "label": "均衡",
+        "sample_rate": 32000,
+        "n_fft": 1024,
+        "hop_length": 256,
+        "res_type": "soxr_mq",
+        "stretch_algorithm": None,
+        "output_format": "mp3_v2",
+        "output_sample_rate": 32000,
+        "single_pass": True,
+    },
+    "high": {
+        "label": "高质量（最终成品）",
+        "sample_rate": None,
+        "n_fft": 2048,
+        "hop_length": 512,
+        "res_type": None,
+        "stretch_algorithm": None,
+        "output_format": None,
+        "output_sample_rate": None,
+        "single_pass": False,
+    },
+}
+DEFAULT_QUALITY_PRESET = "high"
+
+
+def get_quality_preset(key):
+    """按键名获取质量预设，未知键名时使用默认预设"""
+    return QUALITY_PRESETS.get(key) or QUALITY_PRESETS[DEFAULT_QUALITY_PRESET]
 
 
 class AudioProcessor:
     def __init__(self):
         self.setup_ffmpeg_paths()
+        # 所有解码/编码都通过进程内编解码器完成，避免每次调用都启动 ffmpeg/ffprobe
+        self.codec = AudioCodec()
 
         # 音频处理参数优化
         self.default_sample_rate = 44100  # 高质量采样率
         self.processing_sample_rate = 44100  # 处理时使用的采样率
         self.output_bitrate = "320k"  # 高质量输出比特率
-        self.quality_preset = "high"  # 质量预设
+        self.output_format = DEFAULT_OUTPUT_FORMAT  # 默认输出格式（见 OUTPUT_FORMATS）
+        self.stretch_algorithm = DEFAULT_STRETCH_ALGORITHM  # 默认时间伸缩算法（见 STRETCH_ALGORITHMS）
+        self.preserve_formants = False  # 变调时是否保留共振峰（音色）
+        self.quality_preset = DEFAULT_QUALITY_PRESET  # 默认质量预设（见 QUALITY_PRESETS）
+        # 分块流式处理：超过该时长（秒）的音频自动按块处理，内存占用与时长无关
+        self.stream_threshold_seconds = 60.0
+        self.stream_block_seconds = 5.0
 
     def setup_ffmpeg_paths(self):
         """设置FFmpeg路径（兼容性保障）"""
@@ -45,28 +112,89 @@ class AudioProcessor:
         AudioSegment.converter = ffmpeg_path
         AudioSegment.ffprobe = ffprobe_path
 
-    def process_audio(self, file_path, speed, volume, pitch, log_callback):
-        """处理音频文件 - 优化版本"""
+    def process_audio(self, file_path, speed, volume, pitch, log_callback, output_format=None,
+                      stretch_algorithm=None, preserve_formants=None, streaming=None, quality_preset=None):
+        """
+        处理音频文件 - 优化版本，返回最终文件路径（扩展名随输出格式变化）
+        streaming 为 None 时按时长自动选择分块流式处理，True/False 强制开启/关闭
+        """
+        return self.process_batch([file_path], speed, volume, pitch, log_callback, output_format,
+                                  stretch_algorithm, preserve_formants, streaming, quality_preset)[0]
+
+    def process_batch(self, file_paths, speed, volume, pitch, log_callback, output_format=None,
+                      stretch_algorithm=None, preserve_formants=None, streaming=None, quality_preset=None):
+        """
+        以相同参数处理一组音频，返回与 file_paths 一一对应的最终文件路径
+        参数解析、FFmpeg路径设置与处理方式的选择每组只做一次；单个文件失败时保留原文件，不影响其他文件
+        quality_preset 为 QUALITY_PRESETS 的键名；未指定的语速算法与输出格式取预设的值
+        """
+        quality_preset = quality_preset or self.quality_preset
+        preset = get_quality_preset(quality_preset)
+        output_format = output_format or preset["output_format"] or self.output_format
+        stretch_algorithm = stretch_algorithm or preset["stretch_algorithm"] or self.stretch_algorithm
+        if preserve_formants is None:
+            preserve_formants = self.preserve_formants
+
         # 如果参数都是默认值，跳过处理
         if speed == 100 and volume == 100 and pitch == 100:
-            return file_path
-
-        log_callback(f"开始高质量音频处理: 语速={speed}%, 音量={volume}%, 音程={pitch}%")
+            if output_format == DEFAULT_OUTPUT_FORMAT:
+                return list(file_paths)
+            # 仅转换格式
+            outputs = []
+            for file_path in file_paths:
+                check_cancelled()
+                try:
+                    audio, sr = self.codec.decode(file_path)
+                    outputs.append(self._convert_to_final_format(audio, sr, file_path, log_callback, output_format,
+                                                                 quality_preset))
+                except Exception as e:
+                    log_callback(f"格式转换失败，保留原始MP3: {str(e)}")
+                    outputs.append(file_path)
+            return outputs
+
+        log_callback(f"开始音频处理（{preset['label']}）: 语速={speed}%, 音量={volume}%, 音程={pitch}%"
+                     + (f"（{len(file_paths)} 个文件）" if len(file_paths) > 1 else ""))
 
         try:
             # 确保FFmpeg路径正确设置
             self.setup_ffmpeg_paths()
-
-            # 优化的处理策略：优先使用 librosa 进行高质量处理
-            if self._has_librosa():
-                return self.process_with_librosa_optimized(file_path, speed, volume, pitch, log_callback)
-            else:
-                log_callback("Librosa未安装，使用优化的pydub处理")
-                return self.process_with_pydub_optimized(file_path, speed, volume, pitch, log_callback)
-
         except Exception as e:
             log_callback(f"音频处理失败: {str(e)}")
-            return file_path
+            return list(file_paths)
+
+        # 优化的处理策略：优先使用 librosa 进行高质量处理（明确选择pydub算法时除外）
+        use_librosa = self._has_librosa() and stretch_algorithm != "pydub"
+        if not use_librosa and stretch_algorithm != "pydub":
+            log_callback("Librosa未安装，使用优化的pydub处理")
+
+        outputs = []
+        for file_path in file_paths:
+            check_cancelled()
+            try:
+                outputs.append(self._process_file(file_path, speed, volume, pitch, log_callback, output_format,
+                                                  stretch_algorithm, preserve_formants, streaming, use_librosa,
+                                                  quality_preset))
+            except Exception as e:
+                log_callback(f"音频处理失败: {str(e)}")
+                outputs.append(file_path)
+        return outputs
+
+    def _process_file(self, file_path, speed, volume, pitch, log_callback, output_format, stretch_algorithm,
+                      preserve_formants, streaming, use_librosa, quality_preset):
+        if use_librosa and self._should_stream(file_path, streaming):
+            try:
+                return self.process_streaming(file_path, speed, volume, pitch, log_callback,
+                                              output_format, stretch_algorithm, preserve_formants, quality_preset)
+            except Exception as e:
+                log_callback(f"分块流式处理失败: {str(e)}，改为整段处理")
+
+        if use_librosa:
+            return self.process_with_librosa_optimized(file_path, speed, volume, pitch, log_callback,
+                                                       output_format, stretch_algorithm, preserve_formants,
+                                                       quality_preset)
+        return self.process_with_pydub_optimized(file_path, speed, volume, pitch, log_callback,
+                                                 output_format, stretch_algorithm, preserve_formants,
+                                                 quality_preset)
 
     def _has_librosa(self):
         """检查是否有librosa库"""
@@ -76,13 +204,16 @@ class AudioProcessor:
         except ImportError:
             return False
 
-    def process_with_librosa_optimized(self, file_path, speed, volume, pitch, log_callback):
+    def process_with_librosa_optimized(self, file_path, speed, volume, pitch, log_callback, output_format=None,
+                                       stretch_algorithm=None, preserve_formants=None, quality_preset=None):
         """使用librosa进行优化的高质量音频处理"""
         try:
             log_callback("使用Librosa进行高质量处理...")
 
-            # 使用更高质量的音频加载参数
-            y, sr = librosa.load(file_path, sr=self.processing_sample_rate, mono=False)
+            # 按质量预设的采样率与重采样器加载
+            preset = get_quality_preset(quality_preset or self.quality_preset)
+            y, sr = self.codec.decode(file_path, sample_rate=preset["sample_rate"] or self.processing_sample_rate,
+                                      res_type=preset["res_type"])
 
             # 如果是立体声，分别处理左右声道
             if y.ndim > 1:
@@ -90,13 +221,14 @@ class AudioProcessor:
                 for channel in range(y.shape[0]):
                     channel_data = y[channel]
                     processed_channel = self._process_single_channel_librosa(
-                        channel_data, sr, speed, volume, pitch, log_callback
+                        channel_data, sr, speed, volume, pitch, log_callback, stretch_algorithm,
+                        preserve_formants, quality_preset
                     )
                     processed_channels.append(processed_channel)
                 processed_audio = np.vstack(processed_channels)
             else:
                 processed_audio = self._process_single_channel_librosa(
-                    y, sr, speed, volume, pitch, log_callback
+                    y, sr, speed, volume, pitch, log_callback, stretch_algorithm, preserve_formants, quality_preset
                 )
 
             # === 关键修复1: 增加峰值保护 ===
@@ -105,239 +237,243 @@ class AudioProcessor:
                 processed_audio = processed_audio * (0.95 / max_val)
                 log_callback("应用峰值保护防止削波")
 
-            # 保存为高质量临时文件
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_path = temp_file.name
-
-            # 使用32位浮点保存，保持最高质量
-            sf.write(temp_path, processed_audio.T if processed_audio.ndim > 1 else processed_audio,
-                     sr, subtype='FLOAT')
-
-            # 转换为最终格式
-            self._convert_to_final_format(temp_path, file_path, log_callback)
-
-            # 清理临时文件
-            try:
-                os.remove(temp_path)
-            except:
-                pass
+            # 直接从内存编码为最终格式（不再经过临时WAV文件）
+            output_path = self._convert_to_final_format(processed_audio, sr, file_path, log_callback,
+                                                        output_format, quality_preset)
 
             log_callback("Librosa高质量处理完成")
-            return file_path
+            return output_path
 
         except Exception as e:
             log_callback(f"Librosa处理失败: {str(e)}，回退到pydub")
-            return self.process_with_pydub_optimized(file_path, speed, volume, pitch, log_callback)
+            return self.process_with_pydub_optimized(file_path, speed, volume, pitch, log_callback,
+                                                     output_format, stretch_algorithm, preserve_formants,
+                                                     quality_preset)
+
+    def _should_stream(self, file_path, streaming):
+        if streaming is not None:
+            return streaming
+        try:
+            return self.codec.duration(file_path) > self.stream_threshold_seconds
+        except Exception:
+            return False
 
-    def _process_single_channel_librosa(self, audio_data, sr, speed, volume, pitch, log_callback):
-        """使用librosa处理单声道音频"""
+    def process_streaming(self, file_path, speed, volume, pitch, log_callback, output_format=None,
+                          stretch_algorithm=None, preserve_formants=None, quality_preset=None):
+        """
+        分块流式处理：边解码边处理边编码，每块带上下文处理后与相邻块重叠相加（交叉淡化）
+        音程/语速、音量动态、输出重采样各为一级，内存占用只与块长有关，与音频时长无关
+        整段处理末尾的峰值归一化在这里由限幅器代替（限幅到同样的 0.95）
+        """
+        fmt = get_output_format(output_format or self.output_format)
+        preset = get_quality_preset(quality_preset or self.quality_preset)
+        blocks, sr, channels = self.codec.open_reader(file_path, self.stream_block_seconds)
+        log_callback(f"使用分块流式处理（每块 {self.stream_block_seconds:g} 秒）...")
+
+        stages = []
+        processing_rate = preset["sample_rate"] or self.processing_sample_rate
+        if sr != processing_rate:
+            stages.append(resample_stream(sr, processing_rate, int(sr * self.stream_block_seconds)))
+            sr = processing_rate
+        block = int(sr * self.stream_block_seconds)
+
+        if pitch != 100 or speed != 100:
+            quiet = lambda message: None
+
+            def transform(segment):
+                return np.stack([
+                    self._process_single_channel_librosa(channel, sr, speed, 100, pitch, quiet,
+                                                         stretch_algorithm, preserve_formants, quality_preset)
+                    for channel in segment
+                ])
+
+            # 上下文覆盖 STFT 帧长，重叠区交叉淡化 30ms
+            stages.append(OverlapAddStream(transform, 100.0 / speed, block,
+                                           context=int(sr * 0.1), overlap=int(sr * 0.03)))
+
+        volume_factor = max(volume / 100.0, 0.01)
+        compress = 20 * math.log10(volume_factor) > 6
+        stages.append(dynamics_stream(sr, block, gain=volume_factor, limit=0.95,
+                                      compressor_threshold_db=-12.0 if compress else None,
+                                      compressor_ratio=4.0))
+
+        if fmt.get("channels") == 1 and channels > 1:
+            stages.append(MapStream(lambda data: data.mean(axis=0, keepdims=True)))
+            channels = 1
+        target_rate = fmt.get("sample_rate") or preset["output_sample_rate"] or self.default_sample_rate
+        if target_rate != sr:
+            stages.append(resample_stream(sr, target_rate, block))
+
+        base_path = os.path.splitext(file_path)[0]
+        final_path = base_path + fmt["extension"]
+        processed_path = base_path + "_processed" + fmt["extension"]
+        writer = self.codec.open_writer(processed_path, target_rate, channels, fmt)
+        try:
+            run_pipeline(blocks, stages, writer.write)
+        finally:
+            writer.close()
+
+        os.replace(processed_path, final_path)
+        if final_path != file_path and os.path.exists(file_path):
+            os.remove(file_path)
+
+        log_callback(f"分块流式处理完成: 语速={speed}%, 音量={volume}%, 音程={pitch}%（{fmt['label']}）")
+        return final_path
+
+    def _process_single_channel_librosa(self, audio_data, sr, speed, volume, pitch, log_callback,
+                                        stretch_algorithm=None, preserve_formants=None, quality_preset=None):
+        """使用librosa处理单声道音频（STFT参数与重采样器取自质量预设）"""
+        preset = get_quality_preset(quality_preset or self.quality_preset)
+        stft = {"n_fft": preset["n_fft"], "hop_length": preset["hop_length"]}
         processed = audio_data.copy()
+        # librosa/WSOLA 的 rate 为播放速度倍率：速度快则 rate 大、时长短
+        rate_factor = speed / 100.0
 
-        # 1. 音程调整（使用高质量算法）
+        # 1. 音程调整
         if pitch != 100:
             pitch_factor = pitch / 100.0
             semitones = 12 * math.log2(pitch_factor)
 
-            # === 关键修复2: 移除不兼容的res_type参数 ===
-            processed = librosa.effects.pitch_shift(
-                processed, sr=sr, n_steps=semitones,
-                bins_per_octave=24  # 更高精度
-            )
+            if preset["single_pass"]:
+                # 重采样同时改变音高与时长，剩余的时长变化并入下面的一次时间伸缩
+                processed = resample_pitch(processed, pitch_factor, sr)
+                rate_factor /= pitch_factor
+            else:
+                # === 关键修复2: 移除不兼容的res_type参数（仅在预设指定时传入） ===
+                # n_steps 以半音为单位（bins_per_octave=12）
+                options = {"res_type": preset["res_type"]} if preset["res_type"] else {}
+                processed = librosa.effects.pitch_shift(
+                    processed, sr=sr, n_steps=semitones, **stft, **options
+                )
+            if preserve_formants or (preserve_formants is None and self.preserve_formants):
+                processed = restore_formants(processed, pitch_factor, sr)
             log_callback(f"音程调整完成: {pitch}% ({semitones:.2f} 半音)")
 
         # 2. 语速调整（保持音程的时间拉伸）
-        if speed != 100:
-            speed_factor = speed / 100.0
-            rate_factor = 1.0 / speed_factor  # 速度快则拉伸因子小
-
-            # === 关键修复3: 移除不兼容的res_type参数 ===
-            processed = librosa.effects.time_stretch(
-                processed, rate=rate_factor,
-                hop_length=512  # 更小的hop length提高质量
-            )
-            log_callback(f"语速调整完成: {speed}%")
+        if abs(rate_factor - 1.0) > 1e-6:
+            if (stretch_algorithm or self.stretch_algorithm) == "wsola":
+                processed = wsola_time_stretch(processed, rate_factor, sr)
+            else:
+                # === 关键修复3: 移除不兼容的res_type参数 ===
+                processed = librosa.effects.time_stretch(processed, rate=rate_factor, **stft)
+            if speed != 100:
+                log_callback(f"语速调整完成: {speed}%")
 
         # 3. 音量调整（带动态范围保护）
         if volume != 100:
-            volume_factor = volume / 100.0
-            processed = processed * volume_factor
-
-            # 防止削波，使用软限制
-            if np.max(np.abs(processed)) > 0.95:
-                processed = self._apply_soft_limiter(processed, threshold=0.95)
-                log_callback("应用软限制器防止削波")
-
-            log_callback(f"音量调整完成: {volume}%")
+            processed = self.apply_volume_dynamics(processed, sr, volume, log_callback)
 
         return processed  # 注意：移除了可能影响静音部分的增强处理
 
-    def _apply_soft_limiter(self, audio, threshold=0.95, ratio=0.1):
-        """应用软限制器防止削波"""
-        abs_audio = np.abs(audio)
-        mask = abs_audio > threshold
-
-        # 对超过阈值的部分应用软限制
-        excess = abs_audio[mask] - threshold
-        limited_excess = threshold + excess * ratio
+    def apply_volume_dynamics(self, audio, sr, volume, log_callback):
+        """
+        librosa 与 pydub 路径共用的音量处理：增益、可选压缩器、前瞻限幅器一次完成（原地处理 float32 数组）
+        放大超过 6dB 时启用压缩器（阈值 -12dBFS，4:1），与原先分步增益加压缩的效果一致
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        volume_factor = max(volume / 100.0, 0.01)
+        compress = 20 * math.log10(volume_factor) > 6
 
-        # 应用限制，保持原始符号
-        audio[mask] = np.sign(audio[mask]) * limited_excess
+        apply_dynamics(audio, sr, gain=volume_factor, limit=0.95,
+                       compressor_threshold_db=-12.0 if compress else None, compressor_ratio=4.0)
 
+        log_callback(f"音量调整完成: {volume}%" + ("（动态范围压缩）" if compress else ""))
         return audio
 
-    def process_with_pydub_optimized(self, file_path, speed, volume, pitch, log_callback):
+    def _apply_soft_limiter(self, audio, threshold=0.95, ratio=0.1):
+        """应用限幅器防止削波（兼容旧接口，ratio 不再使用）"""
+        return apply_dynamics(np.asarray(audio, dtype=np.float32), self.processing_sample_rate, limit=threshold)
+
+    def process_with_pydub_optimized(self, file_path, speed, volume, pitch, log_callback, output_format=None,
+                                     stretch_algorithm=None, preserve_formants=None, quality_preset=None):
         """使用pydub的优化处理方法"""
         try:
             log_callback("使用优化的pydub处理...")
 
-            # 使用更高质量的加载参数
-            audio = AudioSegment.from_file(file_path, format="mp3")
-
-            # 转换为更高质量的格式进行处理
-            audio = audio.set_frame_rate(self.processing_sample_rate)
-            audio = audio.set_sample_width(4)  # 32位
+            # 进程内解码并按质量预设的采样率重采样，转换为32位格式进行处理
+            preset = get_quality_preset(quality_preset or self.quality_preset)
+            samples, sr = self.codec.decode(file_path, sample_rate=preset["sample_rate"] or self.processing_sample_rate,
+                                            res_type=preset["res_type"])
+            audio = array_to_segment(samples, sr)
 
             # 处理顺序优化：先调整音程，再调整语速，最后调整音量
 
             # 1. 音程调整（改进的算法）
             if pitch != 100:
-                audio = self.adjust_pitch_enhanced(audio, pitch, log_callback)
+                audio = self.adjust_pitch_enhanced(audio, pitch, log_callback, preserve_formants)
 
             # 2. 语速调整
             if speed != 100:
                 speed_factor = speed / 100.0
-                audio = speedup(audio, playback_speed=speed_factor, chunk_size=150, crossfade=25)
+                if (stretch_algorithm or self.stretch_algorithm) == "wsola":
+                    stretched = wsola_time_stretch(segment_to_array(audio), speed_factor, audio.frame_rate)
+                    audio = array_to_segment(stretched, audio.frame_rate)
+                else:
+                    audio = speedup(audio, playback_speed=speed_factor, chunk_size=150, crossfade=25)
                 log_callback(f"语速调整完成: {speed}%")
 
             # 3. 音量调整（改进的动态范围处理）
             if volume != 100:
                 audio = self.adjust_volume_enhanced(audio, volume, log_callback)
 
-            # 保存处理后的文件
-            processed_path = file_path.replace(".mp3", "_processed.mp3")
-
-            # 使用高质量编码参数
-            audio.export(processed_path, format="mp3",
-                         bitrate=self.output_bitrate,
-                         codec="libmp3lame",
-                         parameters=[
-                             "-q:a", "0",  # 最高质量
-                             "-joint_stereo", "1",
-                             "-reservoir", "1"
-                         ])
-
-            # 替换原始文件
-            os.remove(file_path)
-            os.rename(processed_path, file_path)
+            # 使用所选输出格式的编码参数保存并替换原始文件
+            output_path = self._convert_to_final_format(segment_to_array(audio), audio.frame_rate, file_path,
+                                                        log_callback, output_format, quality_preset)
 
             log_callback("优化的pydub处理完成")
-            return file_path
+            return output_path
 
         except Exception as e:
             log_callback(f"优化pydub处理失败: {str(e)}")
             raise e
 
-    def adjust_pitch_enhanced(self, audio, pitch, log_callback):
-        """增强的音程调整算法"""
+    def adjust_pitch_enhanced(self, audio, pitch, log_callback, preserve_formants=None):
+        """
+        增强的音程调整算法：一次有理数倍率多相重采样（音高与时长同时改变，与原先的变采样率播放一致）
+        极端音程（20%/200%）也只需一次重采样，不再分步累积混叠
+        """
         pitch_factor = pitch / 100.0
+        if preserve_formants is None:
+            preserve_formants = self.preserve_formants
+
+        shifted = resample_pitch(segment_to_array(audio), pitch_factor, audio.frame_rate, preserve_formants)
+        result = array_to_segment(shifted, audio.frame_rate)
 
-        # 使用更平滑的音程调整策略
-        if 0.8 <= pitch_factor <= 1.25:
-            # 小幅度调整使用直接方法
-            new_sample_rate = int(audio.frame_rate * pitch_factor)
-            pitched_audio = audio._spawn(
-                audio.raw_data,
-                overrides={'frame_rate': new_sample_rate}
-            )
-            result = pitched_audio.set_frame_rate(audio.frame_rate)
-
-        elif pitch_factor < 0.8:
-            # 大幅度降调使用分步处理
-            steps = max(2, int(-math.log2(pitch_factor) * 2))
-            step_factor = pitch_factor ** (1 / steps)
-            result = audio
-
-            for i in range(steps):
-                new_rate = int(result.frame_rate * step_factor)
-                result = result._spawn(
-                    result.raw_data,
-                    overrides={'frame_rate': new_rate}
-                ).set_frame_rate(result.frame_rate)
-
-        else:  # pitch_factor > 1.25
-            # 大幅度升调使用分步处理
-            steps = max(2, int(math.log2(pitch_factor) * 2))
-            step_factor = pitch_factor ** (1 / steps)
-            result = audio
-
-            for i in range(steps):
-                new_rate = int(result.frame_rate * step_factor)
-                result = result._spawn(
-                    result.raw_data,
-                    overrides={'frame_rate': new_rate}
-                ).set_frame_rate(result.frame_rate)
-
-        log_callback(f"音程调整完成: {pitch}%")
+        log_callback(f"音程调整完成: {pitch}%" + ("（保留共振峰）" if preserve_formants else ""))
         return result
 
     def adjust_volume_enhanced(self, audio, volume, log_callback):
-        """增强的音量调整，带动态范围压缩"""
-        volume_factor = volume / 100.0
-
-        if volume_factor > 1.0:
-            # 放大音量时使用软限制
-            db_change = 20 * math.log10(volume_factor)
-
-            # 分步增益以避免过度失真
-            if db_change > 6:  # 超过6dB分步处理
-                steps = int(db_change / 6) + 1
-                step_gain = db_change / steps
-                result = audio
-
-                for _ in range(steps):
-                    result = result.apply_gain(step_gain)
-                    # 应用软限制
-                    if step_gain > 3:
-                        result = result.compress_dynamic_range(threshold=-12.0, ratio=4.0)
-            else:
-                result = audio.apply_gain(db_change)
-
-        else:
-            # 减小音量
-            db_change = 20 * math.log10(max(volume_factor, 0.01))
-            result = audio.apply_gain(db_change)
+        """增强的音量调整，带动态范围压缩（在 NumPy 数组上向量化处理）"""
+        samples = self.apply_volume_dynamics(segment_to_array(audio), audio.frame_rate, volume, log_callback)
+        return array_to_segment(samples, audio.frame_rate)
 
-        log_callback(f"音量调整完成: {volume}%")
-        return result
-
-    def _convert_to_final_format(self, temp_path, output_path, log_callback):
-        """转换为最终格式"""
+    def _convert_to_final_format(self, audio, sample_rate, output_path, log_callback, output_format=None,
+                                 quality_preset=None):
+        """转换为最终格式，返回输出文件路径（扩展名由输出格式决定，原始MP3会被替换或删除）"""
         try:
-            # 加载临时文件
-            audio = AudioSegment.from_wav(temp_path)
+            format_key = output_format or self.output_format
+            fmt = get_output_format(format_key)
+            preset = get_quality_preset(quality_preset or self.quality_preset)
 
-            # 应用最后的质量优化
-            audio = audio.set_frame_rate(self.default_sample_rate)
+            # 应用最后的质量优化（直接一次重采样到输出格式的采样率）
+            target_rate = fmt.get("sample_rate") or preset["output_sample_rate"] or self.default_sample_rate
+            if sample_rate != target_rate:
+                audio = self.codec.resample(audio, sample_rate, target_rate, preset["res_type"])
 
             # 保存处理后的文件
-            processed_path = output_path.replace(".mp3", "_processed.mp3")
-
-            # 使用最高质量参数导出
-            audio.export(processed_path, format="mp3",
-                         bitrate=self.output_bitrate,
-                         codec="libmp3lame",
-                         parameters=[
-                             "-q:a", "0",  # VBR最高质量
-                             "-joint_stereo", "1",
-                             "-reservoir", "1",
-                             "-b:a", "320k"  # 确保比特率
-                         ])
+            base_path = os.path.splitext(output_path)[0]
+            final_path = base_path + fmt["extension"]
+            processed_path = base_path + "_processed" + fmt["extension"]
+
+            self.codec.encode_with_format(audio, target_rate, processed_path, fmt)
 
             # 替换原始文件
-            os.remove(output_path)
-            os.rename(processed_path, output_path)
+            os.replace(processed_path, final_path)
+            if final_path != output_path and os.path.exists(output_path):
+                os.remove(output_path)
 
-            log_callback("音频格式转换完成")
+            log_callback(f"音频格式转换完成（{fmt['label']}）")
+            return final_path
 
         except Exception as e:
             log_callback(f"格式转换失败: {str(e)}")
@@ -0,0 +1,193 @@
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# MPEG音频帧头查表：比特率（kbps）按 (版本, 层) 区分，采样率按版本区分
+_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+
+def parse_mp3_frame_header(header):
+    """解析4字节MPEG音频帧头，返回 (帧长度, 每帧采样数, 采样率)，无效时返回 None"""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = (header[2] >> 4) & 0x0F
+    sample_rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    version = {0: 2.5, 2: 2, 3: 1}[version_bits]
+    layer = 4 - layer_bits
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+
+    samples = 1152 if (layer == 2 or version == 1) else 576
+    return samples // 8 * bitrate // sample_rate + padding, samples, sample_rate
+
+
+def _skip_id3v2(data):
+    """返回ID3v2标签之后的偏移量"""
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+class AudioVerifier:
+    """
+    下载音频的完整性校验：检查MP3帧头链是否完整并计算可解码时长（其他格式解码文件尾部）
+    每个文件都有硬性截止时间，缺失或损坏的文件返回失败原因而不是无限等待
+    """
+
+    def __init__(self, timeout=10.0, min_duration=0.05, max_workers=4, poll_interval=0.2):
+        self.timeout = timeout
+        self.min_duration = min_duration
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+
+    def verify(self, path, deadline=None):
+        """校验单个文件，返回 (是否通过, 失败原因, 时长秒数)"""
+        deadline = deadline or time.time() + self.timeout
+
+        # 文件可能仍在写入：在截止时间内等待其出现且大小稳定
+        last_size = -1
+        while True:
+            size = os.path.getsize(path) if os.path.exists(path) else -1
+            if size > 0 and (size == last_size or time.time() - os.path.getmtime(path) > 1.0):
+                break
+            if time.time() >= deadline:
+                if size <= 0:
+                    return False, "文件不存在或为空", 0.0
+                break
+            last_size = size
+            time.sleep(self.poll_interval)
+
+        if not path.lower().endswith(".mp3"):
+            return self.check_with_soundfile(path)
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            return False, f"无法读取: {str(e)}", 0.0
+
+        return self.check_mp3_bytes(data)
+
+    def check_with_soundfile(self, path):
+        """非MP3格式（WAV/FLAC/OGG）：读取头部时长并解码末尾数据以发现截断"""
+        import soundfile as sf
+
+        try:
+            with sf.SoundFile(path) as f:
+                duration = f.frames / f.samplerate if f.samplerate else 0.0
+                if f.seekable() and f.frames > 0:
+                    f.seek(max(0, f.frames - 1024))
+                    f.read(1024, dtype="float32")
+        except Exception as e:
+            return False, f"无法解码: {str(e)}", 0.0
+
+        if duration < self.min_duration:
+            return False, f"可解码时长过短（{duration:.2f}秒）", duration
+        return True, "", duration
+
+    def check_mp3_bytes(self, data):
+        """逐帧遍历MP3数据，检查是否截断并计算可解码时长"""
+        offset = _skip_id3v2(data)
+        end = len(data)
+        # ID3v1 标签位于文件末尾128字节
+        if end - offset >= 128 and data[end - 128:end - 125] == b"TAG":
+            end -= 128
+
+        # 查找第一个有效帧（允许前面有少量填充）
+        search_limit = min(end, offset + 4096)
+        while offset < search_limit:
+            if parse_mp3_frame_header(data[offset:offset + 4]):
+                break
+            offset += 1
+        else:
+            return False, "未找到有效的MP3帧头", 0.0
+
+        frames = 0
+        total_samples = 0
+        sample_rate = None
+        while offset + 4 <= end:
+            header = parse_mp3_frame_header(data[offset:offset + 4])
+            if header is None:
+                break
+            frame_length, samples, rate = header
+            if offset + frame_length > end:
+                return False, f"文件被截断（第{frames + 1}帧不完整）", total_samples / (sample_rate or rate)
+            sample_rate = sample_rate or rate
+            total_samples += samples
+            frames += 1
+            offset += frame_length
+
+        if frames == 0:
+            return False, "没有可解码的MP3帧", 0.0
+
+        duration = total_samples / sample_rate
+        if duration < self.min_duration:
+            return False, f"可解码时长过短（{duration:.2f}秒）", duration
+
+        # 帧链在文件结束前中断，且剩余数据较多时视为损坏
+        if end - offset > 1024:
+            return False, f"第{frames + 1}帧后数据损坏（剩余{end - offset}字节无法解析）", duration
+
+        return True, "", duration
+
+    def verify_many(self, paths):
+        """
+        并行校验多个文件，返回 {路径: (是否通过, 失败原因, 时长)}；
+        截止时间前没能开始校验的文件"是否通过"为 None（未校验，不代表损坏）
+        """
+        results = {}
+        if not paths:
+            return results
+
+        started = {}
+
+        def verify(path):
+            # 每个文件的截止时间从该文件实际开始校验时计算
+            started[path] = time.time()
+            return self.verify(path, started[path] + self.timeout)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {path: executor.submit(verify, path) for path in paths}
+            # 整体截止时间：所有文件按工作线程数分轮、每轮最多 timeout 秒
+            rounds = math.ceil(len(futures) / self.max_workers)
+            wait(futures.values(), timeout=rounds * self.timeout + 1.0)
+            for path, future in futures.items():
+                if future.done():
+                    try:
+                        results[path] = future.result()
+                    except Exception as e:
+                        results[path] = (False, f"校验出错: {str(e)}", 0.0)
+                elif path in started:
+                    results[path] = (False, "校验超时", 0.0)
+                else:
+                    # 排在卡住的校验之后、还没有开始：没有检查过，不能判定为损坏
+                    future.cancel()
+                    results[path] = (None, "未能在截止时间内开始校验", 0.0)
+        finally:
+            # 不等待可能卡住的校验线程，保证整体耗时有上限
+            executor.shutdown(wait=False)
+
+        return results
@@ -0,0 +1,142 @@
+import numpy as np
+
+from core.dsp import apply_dynamics, rational_ratio, resample_poly
+
+
+class OverlapAddStream:
+    """
+    分块流式处理的一级：输入按 block 个采样分块，每块两侧各带 context 个采样的上下文交给 transform，
+    只保留块本身对应的输出，相邻块在边界处交叉淡化 overlap 个输入采样对应的长度后拼接
+    transform((channels, n)) 返回约 n*ratio 个采样的 (channels, m) 数组；内存占用只与块长有关
+    align 大于 1 时块长与上下文取其整数倍（多相重采样按 down 对齐可避免块间的小数采样偏移）
+    """
+
+    def __init__(self, transform, ratio, block, context, overlap, align=1):
+        self.transform = transform
+        self.ratio = ratio
+        self.block = -(-block // align) * align
+        self.context = -(-max(context, overlap // 2) // align) * align
+        self.fade = max(2, int(round(overlap * ratio)))
+        self._buffer = None
+        self._buffer_start = 0  # _buffer[:, 0] 在整个输入中的位置
+        self._next = 0  # 下一块的起始位置（输入采样）
+        self._tail = None  # 上一块越过边界的输出，等待与下一块交叉淡化
+
+    def feed(self, data):
+        """追加输入，返回已经可以输出的部分（可能为空）"""
+        self._append(data)
+        outputs = []
+        while self._end() >= self._next + self.block + self.context:
+            outputs.append(self._process(final=False))
+        return _concat(outputs, self._channels())
+
+    def flush(self):
+        """输入结束：处理剩余部分并返回全部剩余输出"""
+        if self._buffer is None:
+            return np.zeros((1, 0), dtype=np.float32)
+        if self._end() > self._next:
+            return self._process(final=True)
+        tail, self._tail = self._tail, None
+        return tail if tail is not None else np.zeros((self._channels(), 0), dtype=np.float32)
+
+    def _channels(self):
+        return self._buffer.shape[0] if self._buffer is not None else 1
+
+    def _end(self):
+        return self._buffer_start + (self._buffer.shape[1] if self._buffer is not None else 0)
+
+    def _append(self, data):
+        data = np.asarray(data, dtype=np.float32)
+        if data.ndim == 1:
+            data = data[np.newaxis, :]
+        if self._buffer is None:
+            self._buffer = data.copy()
+        elif data.shape[1]:
+            self._buffer = np.concatenate((self._buffer, data), axis=1)
+
+    def _process(self, final):
+        start = max(0, self._next - self.context)
+        stop = self._end() if final else self._next + self.block + self.context
+        out = self.transform(self._buffer[:, start - self._buffer_start:stop - self._buffer_start])
+        out = out if out.ndim > 1 else out[np.newaxis, :]
+
+        half = self.fade // 2
+        lead = int(round((self._next - start) * self.ratio))
+        pos = max(0, lead - half) if self._tail is not None else lead
+        cut = out.shape[1] if final else min(out.shape[1], lead + int(round(self.block * self.ratio)) - half)
+
+        pieces = []
+        if self._tail is not None:
+            # 两次处理在重叠区域的结果线性交叉淡化
+            n = min(self._tail.shape[1], max(0, out.shape[1] - pos))
+            weights = ((np.arange(n, dtype=np.float32) + 0.5) / max(n, 1))
+            pieces.append(self._tail[:, :n] * (1.0 - weights) + out[:, pos:pos + n] * weights)
+            pos += n
+        pieces.append(out[:, pos:max(pos, cut)])
+        self._tail = None if final else out[:, cut:cut + self.fade].copy()
+
+        self._next += self.block
+        # 丢弃之后不再需要的输入
+        keep_from = max(0, self._next - self.context)
+        if keep_from > self._buffer_start:
+            self._buffer = self._buffer[:, keep_from - self._buffer_start:].copy()
+            self._buffer_start = keep_from
+        return _concat(pieces, out.shape[0])
+
+
+class MapStream:
+    """逐块独立的处理（如混缩为单声道），不需要上下文"""
+
+    def __init__(self, func):
+        self.func = func
+
+    def feed(self, data):
+        return self.func(data)
+
+    def flush(self):
+        return None
+
+
+def resample_stream(orig_sr, target_sr, block):
+    """流式多相重采样"""
+    up, down = rational_ratio(target_sr / orig_sr, max_denominator=1000)
+    return OverlapAddStream(lambda segment: resample_poly(segment, up, down), up / down,
+                            block, context=2048, overlap=256, align=down)
+
+
+def dynamics_stream(sr, block, **kwargs):
+    """
+    流式动态处理（参数同 dsp.apply_dynamics）：上下文覆盖压缩器窗口与限幅器的前瞻/释放范围，
+    且块边界与 apply_dynamics 的内部分块对齐，因此结果与整段处理一致
+    """
+    lookahead_ms = kwargs.get("lookahead_ms", 5.0)
+    dynamics_block = max(16, int(sr * lookahead_ms / 1000.0))
+    spans = (kwargs.get("release_ms", 60.0) + 2 * kwargs.get("compressor_window_ms", 20.0)) / lookahead_ms
+    context = (int(np.ceil(spans)) + 8) * dynamics_block
+    return OverlapAddStream(lambda segment: apply_dynamics(segment.copy(), sr, **kwargs), 1.0,
+                            block, context=context, overlap=2 * dynamics_block, align=dynamics_block)
+
+
+def run_pipeline(blocks, stages, write):
+    """把输入块依次送入各级处理，输出交给 write；输入结束后逐级冲洗"""
+    for data in blocks:
+        for stage in stages:
+            data = stage.feed(data)
+        if data is not None and data.shape[-1]:
+            write(data)
+
+    for index, stage in enumerate(stages):
+        data = stage.flush()
+        if data is None:
+            continue
+        for later in stages[index + 1:]:
+            data = later.feed(data)
+        if data is not None and data.shape[-1]:
+            write(data)
+
+
+def _concat(pieces, channels):
+    pieces = [piece for piece in pieces if piece.shape[1]]
+    if not pieces:
+        return np.zeros((channels, 0), dtype=np.float32)
+    return pieces[0] if len(pieces) == 1 else np.concatenate(pieces, axis=1)
@@ -6,15 +6,25 @@ from webdriver_manager.chrome import ChromeDriverManager
 from webdriver_manager.microsoft import EdgeChromiumDriverManager
 from webdriver_manager.firefox import GeckoDriverManager
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
 import os
-import glob
 import time
 
+from core.adaptive_limiter import get_limiter
+from core.endpoints import resolve_endpoints
+from core.page_waits import (FILL_AND_CLICK_SCRIPT, SELECT_OPTION_SCRIPT, WaitLedger, poll_rounding,
+                             snapshot_downloads, timed_script, wait_for_download, wait_until)
+
+# yukumo 页面上的元素
+YUKUMO_TEXT_INPUT = "#__BVID__21"
+YUKUMO_VOICE_SELECT = "#__BVID__22"
+YUKUMO_DOWNLOAD_BUTTON = '//*[@id="home-main"]/div[2]/div[2]/div/button[2]'
+
 
 class BrowserManager:
+    def __init__(self):
+        self.endpoints = resolve_endpoints()
+        self.wait_ledger = WaitLedger()
+
     def init_driver(self, download_dir, browser_type, log_callback):
         """初始化浏览器驱动"""
         normalized_dir = os.path.normpath(download_dir)
@@ -115,44 +125,53 @@ class BrowserManager:
                                  firefox_profile=firefox_profile)
 
     def download_audio(self, driver, text, line_num, clean_name, voice_value, output_dir, log_callback):
-        """下载单个音频文件"""
+        """下载单个音频文件；并发数、行间隔与连续失败时的熔断由 yukumo 的自适应限速器决定"""
+        with get_limiter("yukumo").request(log_callback) as call:
+            path = self._download_audio(driver, text, line_num, clean_name, voice_value, output_dir, log_callback)
+            if path is None:
+                call.fail()
+            return path
+
+    def _download_audio(self, driver, text, line_num, clean_name, voice_value, output_dir, log_callback):
         try:
-            # 确保声种已选择
-            if not hasattr(driver, 'voice_selected') or not driver.voice_selected:
-                self.select_voice_type(driver, voice_value, log_callback)
-                driver.voice_selected = True
-
-            # 确保在正确页面
-            if driver.current_url != "https://www.yukumo.net/#/":
-                driver.get("https://www.yukumo.net/#/")
-
-            # 输入文本
-            wait = WebDriverWait(driver, 20)
-            input_field = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "#__BVID__21")))
-            input_field.clear()
-            input_field.send_keys(text)
-            time.sleep(0.5)
+            # 确保声种已选择：voice_selected 记录当前页面上已选择的声种，
+            # 声种不同或页面已离开（如片假名转换）时重新打开页面并选择
+            saved = 0.0
+            if (getattr(driver, 'voice_selected', None) != voice_value
+                    or driver.current_url != self.endpoints["yukumo"]):
+                selected = self.select_voice_type(driver, voice_value, log_callback)
+                if selected is None:
+                    # 未选中时页面保持默认声种，不能继续下载，按失败处理（由重试队列换会话重试）
+                    driver.voice_selected = None
+                    log_callback(f"第{line_num}行未能选择声种 {voice_value}，跳过下载")
+                    return None
+                saved += selected
+                driver.voice_selected = voice_value
 
             # 记录下载前的文件
-            existing_files = set(glob.glob(os.path.join(output_dir, '*.mp3')))
-
-            # 点击下载
-            download_btn = driver.find_element(By.XPATH, '//*[@id="home-main"]/div[2]/div[2]/div/button[2]')
-            download_btn.click()
-
-            # 等待新文件出现
-            new_file = None
-            end_time = time.time() + 30
-            while time.time() < end_time:
-                time.sleep(1)
-                current_files = set(glob.glob(os.path.join(output_dir, '*.mp3')))
-                new_files = current_files - existing_files
-                if new_files:
-                    new_file = new_files.pop()
-                    break
-
-            if not new_file:
+            existing_files = snapshot_downloads(output_dir)
+
+            # 一次脚本调用完成输入文本与点击下载（输入框尚未可用时重试）
+            timing = {}
+            wait_until(
+                lambda: timed_script(driver, FILL_AND_CLICK_SCRIPT, YUKUMO_TEXT_INPUT, text, YUKUMO_DOWNLOAD_BUTTON,
+                                     timing=timing),
+                20, description="输入框"
+            )
+
+            # 等待新文件下载完成
+            download_start = time.monotonic()
+            try:
+                new_file = wait_for_download(output_dir, existing_files)
+            except TimeoutError:
+                log_callback(f"第{line_num}行等待下载超时")
                 return None
+            download_elapsed = time.monotonic() - download_start
+
+            # 原先：输入后固定等待0.5秒、逐元素操作共5次往返（现为1次）、每秒检查一次下载目录
+            saved += 0.5 + 4 * timing.get("rtt", 0.0) + poll_rounding(download_elapsed, 1.0)
+            self.wait_ledger.record("synthesis", line_num, saved)
+            log_callback(f"第{line_num}行下载等待 {download_elapsed:.2f} 秒，比固定等待节省约 {saved:.2f} 秒")
 
             # 重命名文件
             new_filename = f"{line_num}-{clean_name}.mp3"
@@ -173,43 +192,26 @@ class BrowserManager:
         except Exception as e:
             log_callback(f"下载音频时出错: {str(e)}")
             if hasattr(driver, 'voice_selected'):
-                driver.voice_selected = False
+                driver.voice_selected = None
             return None
 
     def select_voice_type(self, driver, voice_value, log_callback):
-        """选择声种"""
+        """
+        选择声种：打开页面后一次脚本调用完成选择并返回选中的值（下拉框或选项尚未加载时重试）
+        成功时返回比原先固定等待节省的秒数，失败时返回 None
+        """
         try:
-            driver.get("https://www.yukumo.net/#/")
-            wait = WebDriverWait(driver, 20)
-
-            # 等待页面加载
-            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "#__BVID__21")))
-
-            # 点击下拉框
-            dropdown = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "#__BVID__22")))
-            dropdown.click()
-
-            # 选择选项
-            option_selector = f"option[value='{voice_value}']"
-            option = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, option_selector)))
-            option.click()
-
-            # 关闭下拉框
-            dropdown.click()
-            time.sleep(1)
-
-            # 验证选择
-            selected_value = driver.execute_script("return document.querySelector('#__BVID__22').value;")
-            if selected_value == voice_value:
-                log_callback(f"声种选择成功: {voice_value}")
-                return True
-
-            # 备用方法：直接设置值
-            script = f"document.querySelector('#__BVID__22').value = '{voice_value}';"
-            driver.execute_script(script)
-            log_callback(f"使用JavaScript设置声种: {voice_value}")
-            return True
+            driver.get(self.endpoints["yukumo"])
+            timing = {}
+            wait_until(
+                lambda: timed_script(driver, SELECT_OPTION_SCRIPT, YUKUMO_VOICE_SELECT, voice_value,
+                                     timing=timing) == voice_value,
+                20, description=f"声种选项 {voice_value}"
+            )
+            log_callback(f"声种选择成功: {voice_value}")
+            # 原先：关闭下拉框后固定等待1秒，等待、点击与验证共7次往返（现为1次）
+            return 1.0 + 6 * timing.get("rtt", 0.0)
 
         except Exception as e:
             log_callback(f"选择声种失败: {str(e)}")
-            return False
\ No newline at end of file
+            return None
\ No newline at end of file
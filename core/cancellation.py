@@ -0,0 +1,96 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ConversionCancelled(BaseException):
+    """转换已被取消；与 asyncio.CancelledError 一样继承 BaseException，不会被各处的 except Exception 吞掉"""
+
+
+class CancellationToken:
+    """
+    一次转换的取消令牌：cancel() 唤醒所有可中断的等待，并执行登记的清理回调（如关闭浏览器），
+    使正在进行的 Selenium 调用立即失败返回
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._next_id = 0
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = list(self._callbacks.values()), {}
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def add_callback(self, callback):
+        """登记取消时执行的清理回调，返回注销函数；已取消时立即执行"""
+        with self._lock:
+            if not self._event.is_set():
+                callback_id = self._next_id
+                self._next_id += 1
+                self._callbacks[callback_id] = callback
+                return lambda: self._callbacks.pop(callback_id, None)
+        try:
+            callback()
+        except Exception:
+            pass
+        return lambda: None
+
+    def wait(self, seconds):
+        """等待 seconds 秒，期间被取消则立即返回 True"""
+        return self._event.wait(seconds)
+
+
+_current_token = contextvars.ContextVar("cancellation_token", default=None)
+
+
+@contextmanager
+def use_token(token):
+    """在当前线程（上下文）中启用取消令牌"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def current_token():
+    return _current_token.get()
+
+
+def check_cancelled():
+    """当前转换已取消时抛出 ConversionCancelled；没有令牌（同步调用）时不做任何事"""
+    token = _current_token.get()
+    if token is not None and token.cancelled:
+        raise ConversionCancelled()
+
+
+def cancellable_sleep(seconds):
+    """可被取消的 time.sleep：取消时立即抛出 ConversionCancelled"""
+    token = _current_token.get()
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        raise ConversionCancelled()
+
+
+def on_cancel(callback):
+    """为当前转换登记取消时的清理回调，返回注销函数；没有令牌时不登记"""
+    token = _current_token.get()
+    if token is None:
+        return lambda: None
+    return token.add_callback(callback)
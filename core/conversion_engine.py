@@ -2,162 +2,972 @@ import time
 import os
 import threading
 import re
+import shutil
+import queue
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 
 from core.browser_manager import BrowserManager
-from core.audio_processor import AudioProcessor
-from services.text_processor import TextProcessor
+from core.audio_processor import AudioProcessor, DEFAULT_QUALITY_PRESET, get_quality_preset
+from core.audio_verifier import AudioVerifier
+from core.audio_codec import DEFAULT_OUTPUT_FORMAT, get_output_format
+from core.throughput_tracker import ThroughputTracker, ThroughputHistory
+from core.render_manifest import RenderManifest
+from core.work_queue import WorkQueue, default_worker_id
+from core.endpoints import DEFAULT_ENDPOINTS, resolve_endpoints
+from core.replay import InteractionCapture
+from core.driver_pool import DriverPool
+from core.retry_queue import RetryQueue
+from core.memory_governor import MemoryGovernor
+from core.adaptive_limiter import limiter_summaries
+from core.cancellation import ConversionCancelled, cancellable_sleep, on_cancel
+from core.script_reader import ScriptReader
+from core.segmenter import DEFAULT_MAX_SEGMENT_CHARS, crossfade_concat, split_like, split_text
+from core.utils import link_or_copy
+from services.text_processor import AUTO_MODE, TextProcessor
 from services.translation_service import TranslationService
 
 
 class ConversionEngine:
+    # 分片模式下写入工作队列、供所有工作进程共享的任务参数
+    SHARD_JOB_KEYS = ("input_file", "output_dir", "mode", "voice_type", "speed", "volume",
+                      "pitch", "output_format", "stretch_algorithm", "preserve_formants", "quality_preset",
+                      "generate_lrc", "lrc_segments", "browser_type")
+    # 参数相同的音频每批交给 AudioProcessor 处理的数量
+    AUDIO_BATCH_SIZE = 8
+    # 流式读取输入时每读到多少行就开始转换、合成这一批（增量渲染需要全部行的哈希，仍先读完整个文件）
+    STREAM_BATCH_LINES = 20
+    LINK_METHOD_LABELS = {"hardlink": "硬链接", "reflink": "写时复制", "copy": "复制"}
+
     def __init__(self):
         self.browser_manager = BrowserManager()
         self.audio_processor = AudioProcessor()
+        self.audio_verifier = AudioVerifier()
         self.text_processor = TextProcessor()
         self.translation_service = TranslationService()
+        # 条件等待节省的时间：浏览器与文本转换共用一个记录
+        self.wait_ledger = self.browser_manager.wait_ledger
+        self.text_processor.wait_ledger = self.wait_ledger
+        self._cancel_hooks = {}  # id(driver) -> 注销取消回调的函数
+
+    def configure_endpoints(self, params):
+        """
+        按 params["endpoints"] 设置远程服务地址：替身服务器基地址字符串或 {服务名: URL}
+        未提供时使用环境变量 YUKKURI_ENDPOINT_BASE，均未设置则访问真实网站
+        """
+        endpoints = resolve_endpoints(params.get("endpoints"))
+        self.browser_manager.endpoints = endpoints
+        self.text_processor.endpoints = endpoints
+        self.translation_service.endpoints = endpoints
+
+        overridden = {name: url for name, url in endpoints.items() if url != DEFAULT_ENDPOINTS[name]}
+        if overridden:
+            params["log_callback"]("使用替代服务地址: " + ", ".join(f"{k}={v}" for k, v in overridden.items()))
+        return endpoints
+
+    def open_driver(self, params):
+        """
+        初始化浏览器；params 中提供 driver_pool 时从共享池借用已预热的浏览器，
+        下载先落在该浏览器专用的目录（params["download_dir"]），再移动到输出目录
+        转换被取消时浏览器立即关闭，使正在等待页面元素或下载的 WebDriver 调用马上失败返回
+        """
+        pool = params.get("driver_pool")
+        if pool is None:
+            driver = self.browser_manager.init_driver(
+                params["output_dir"], params["browser_type"], params["log_callback"]
+            )
+        else:
+            driver = pool.acquire(params["stop_flag"], params["log_callback"])
+            if driver is None:
+                raise Exception("等待浏览器时任务已被停止")
+            params["download_dir"] = pool.download_dir(driver)
+        if driver is not None:
+            self._cancel_hooks[id(driver)] = on_cancel(driver.quit)
+        return driver
+
+    def close_driver(self, driver, params, recycle=False):
+        """关闭浏览器，或把借用的浏览器归还给共享池（recycle 为真时池中的该浏览器也关闭，不再借出）"""
+        pool = params.get("driver_pool")
+        self._cancel_hooks.pop(id(driver), lambda: None)()
+        try:
+            if pool is None:
+                driver.quit()
+            else:
+                pool.release(driver, recycle=recycle)
+        except:
+            pass
+
+    def admit_stage(self, params, stage):
+        """按内存预算调度器（params["memory_governor"]）进入合成/音频阶段；未配置时不做限制"""
+        governor = params.get("memory_governor")
+        if governor is None:
+            return nullcontext()
+        return governor.admit(stage, params["stop_flag"], params["log_callback"], params.get("memory_usage"))
 
     def run_conversion(self, params):
+        """执行一次完整转换，成功完成时返回 True"""
+        driver = None
+        capture = None
+        # 内存预算：使用共享的调度器（任务服务器），或按 memory_budget_mb 为本次转换创建
+        own_governor = None
+        if params.get("memory_governor") is None and params.get("memory_budget_mb"):
+            own_governor = params["memory_governor"] = MemoryGovernor(params["memory_budget_mb"])
+        params["memory_usage"] = {}
+        params["deduplicated"] = {"lines": 0, "remote_calls": 0}
+        params["synthesized_lines"] = {}
+        self.wait_ledger.clear()
         try:
             params["log_callback"]("开始转换过程...")
+            self.configure_endpoints(params)
+            # 录制或回放远程交互（params 中的 record_path / replay_path）
+            capture = InteractionCapture.from_params(self, params)
             mode = params["mode"]
 
-            # 读取输入文件
-            with open(params["input_file"], "r", encoding="utf-8") as f:
-                original_lines = [line.strip() for line in f.readlines() if line.strip()]
+            # 逐行惰性读取并验证输入：读到一批就开始转换、合成，未通过验证的行报告文件中的行号后跳过
+            reader = ScriptReader(params["input_file"], mode, self.text_processor, params["log_callback"])
+            original_lines = reader.lines
+            line_overrides = reader.overrides
 
-            if not original_lines:
-                params["log_callback"]("错误: 输入文件为空")
-                return
-
-            # 验证输入语言
-            validation_result, error_msg = self.text_processor.validate_input_language(
-                original_lines, mode
+            # 吞吐统计（历史基线用于估计剩余时间；流式读取时总行数按已读字节估计，随读取更新）
+            tracker = ThroughputTracker(
+                0, mode,
+                history=ThroughputHistory(params.get("history_path"))
             )
-            if not validation_result:
-                params["log_callback"](f"语言验证失败: {error_msg}")
+
+            # 增量渲染：对比上次渲染的清单，只重新生成新增或修改过的行
+            manifest = None
+            line_keys = []
+            reused_files = {}
+            reused_texts = {}
+            batch_lines = self.STREAM_BATCH_LINES
+            if params.get("incremental"):
+                reader.read_all()
+                if self.input_rejected(reader, params["log_callback"]):
+                    return
+                manifest, line_keys, reused_files, reused_texts = self.prepare_incremental(
+                    original_lines, params, line_overrides
+                )
+                render_count = sum(1 for idx in reader.valid_indices() if idx not in reused_files)
+                params["log_callback"](
+                    f"增量渲染: 复用 {len(reused_files)} 行，需重新生成 {render_count} 行"
+                )
+                batch_lines = None
+
+            render_indices = []
+            line_results = {}
+            converted_texts = dict(reused_texts)
+            queued = 0  # 已读到、需要生成的行数
+            conversion_failed = {}  # 文本转换失败的批次中的行 -> 原因
+            rendered = 0  # 已交给合成的行数
+            deduplicated_before = params["deduplicated"]["lines"]
+            for batch in reader.batches(batch_lines):
+                batch = [idx for idx in reader.valid_indices(batch) if idx not in reused_files]
+                queued += len(batch)
+                linked = params["deduplicated"]["lines"] - deduplicated_before
+                tracker.total_lines = queued - linked + reader.estimated_total() - len(original_lines)
+                if not batch:
+                    continue
+                if params["stop_flag"]():
+                    break
+
+                if driver is None:
+                    # 初始化浏览器
+                    driver = self.open_driver(params)
+
+                # 处理文本
+                render_lines = [original_lines[i] for i in batch]
+                try:
+                    with tracker.stage("text"):
+                        katakana_lines, _ = self.convert_text(
+                            driver, mode, render_lines, params["log_callback"], params
+                        )
+                    if not katakana_lines:
+                        raise ValueError("无法获取有效的片假名文本")
+                except Exception as e:
+                    # 之前的批次已经合成：只把这一批记为转换失败，其余行照常生成，字幕仍按行号对齐
+                    params["log_callback"](
+                        f"第{batch[0] + 1}-{batch[-1] + 1}行文本转换失败，跳过这一批: {str(e)}"
+                    )
+                    for idx in batch:
+                        conversion_failed[idx] = f"文本转换失败: {str(e)}"
+                    queued -= len(batch)
+                    render_indices.extend(batch)
+                    continue
+                for position, idx in enumerate(batch[:len(katakana_lines)]):
+                    converted_texts[idx] = katakana_lines[position]
+
+                # 下载音频（但不立即生成LRC）
+                if not rendered:
+                    tracker.start_lines()
+                self.download_audio_files(
+                    driver, katakana_lines, render_lines, params, tracker,
+                    line_indices=batch, line_results=line_results,
+                    line_overrides=[line_overrides[i] for i in batch],
+                    progress_offset=rendered - linked
+                )
+                render_indices.extend(batch)
+                rendered += len(batch)
+
+            if reader.finished and self.input_rejected(reader, params["log_callback"]):
                 return
 
-            # 初始化浏览器
-            driver = self.browser_manager.init_driver(
-                params["output_dir"],
-                params["browser_type"],
-                params["log_callback"]
-            )
+            # 按原始行号合并复用的音频与新生成的音频
+            files_by_index = dict(reused_files)
+            files_by_index.update(line_results)
 
-            # 处理文本
-            katakana_lines = []
-            japanese_lines = []
+            # 下载失败或未通过完整性校验的行进入延迟重试队列：排到最后、按退避时间等待后
+            # 换一个新的浏览器会话重新合成，仍失败的行写入失败报告（结果始终按原始行号对应）
+            retry_queue = RetryQueue(params.get("verify_retries", 2), params.get("retry_base_delay", 2.0))
+            for idx, reason in list(reader.invalid.items()) + list(conversion_failed.items()):
+                if idx not in files_by_index:
+                    retry_queue.fail(idx, reason, retryable=False)
+            if not params["stop_flag"]():
+                for idx in render_indices:
+                    if idx in files_by_index or idx in conversion_failed:
+                        continue
+                    if converted_texts.get(idx):
+                        retry_queue.fail(idx, "下载失败")
+                    else:
+                        retry_queue.fail(idx, "转换后的文本为空", retryable=False)
+            for idx in self.verify_audio_files(files_by_index, params["log_callback"]):
+                del files_by_index[idx]
+                retry_queue.fail(idx, "音频校验未通过")
+
+            retry_round = 0
+            # 重试的行重新合成，不再链接到本次已合成的同内容音频（可能正是未通过校验的那个）
+            params["synthesized_lines"] = {}
+            while retry_queue.pending() and not params["stop_flag"]():
+                wait = retry_queue.wait_time()
+                if wait > 0:
+                    params["log_callback"](f"{wait:.1f} 秒后重试失败的行")
+                    self._sleep_unless_stopped(wait, params["stop_flag"])
+                    if params["stop_flag"]():
+                        break
+                due = retry_queue.take_due()
+                if not due:
+                    continue
 
-            if mode == "中文Yukkuri":
-                katakana_lines = self.text_processor.convert_chinese_to_katakana(
-                    driver, original_lines, params["log_callback"]
+                retry_round += 1
+                params["log_callback"](
+                    f"重新合成 {len(due)} 个失败的行（第{retry_round}轮）: {[idx + 1 for idx in due]}"
                 )
-            elif mode == "英文Yukkuri":
-                katakana_lines = self.text_processor.convert_english_to_katakana(
+                # 使用新的浏览器会话（共享池中换成另一个已预热的浏览器或新启动的浏览器），避免沿用出错的页面状态
+                if driver is not None:
+                    self.close_driver(driver, params, recycle=True)
+                    driver = None
+                driver = self.open_driver(params)
+
+                # 重试的行计入同一个进度与剩余时间估计
+                retry_results = {}
+                tracker.total_lines += len(due)
+                if tracker.lines_start_time is None:
+                    tracker.start_lines()
+                self.download_audio_files(
                     driver,
-                    original_lines,
-                    params["log_callback"]  # Add log_callback argument
-                )
-            elif mode == "日文Yukkuri":
-                katakana_lines = original_lines
-                params["log_callback"]("日文模式：直接使用原文本")
-            elif mode == "中文翻译日文Yukkuri":
-                japanese_lines = self.translation_service.translate_chinese_to_japanese(
-                    original_lines, params["log_callback"]
+                    [converted_texts.get(idx, original_lines[idx]) for idx in due],
+                    [original_lines[idx] for idx in due],
+                    params, tracker, line_indices=due, line_results=retry_results,
+                    line_overrides=[line_overrides[idx] for idx in due],
+                    progress_offset=tracker.completed_lines
                 )
-                katakana_lines = japanese_lines
+                failed_verify = set(self.verify_audio_files(retry_results, params["log_callback"]))
+                for idx in due:
+                    if idx in retry_results and idx not in failed_verify:
+                        files_by_index[idx] = retry_results[idx]
+                        retry_queue.succeed(idx)
+                    else:
+                        retry_queue.fail(idx, "音频校验未通过" if idx in retry_results else "下载失败")
 
-            if not katakana_lines:
-                params["log_callback"]("错误: 无法获取有效的片假名文本")
-                return
+            self.write_failure_report(retry_queue, original_lines, params)
 
-            # 下载音频（但不立即生成LRC）
-            downloaded_audio_files = self.download_audio_files(
-                driver, katakana_lines, original_lines, params
-            )
-
-            # 等待所有音频处理完成（关键修复点）
-            processed_audio_files = []
-            for audio_file in downloaded_audio_files:
-                # 确保音频已处理完成
-                while not os.path.exists(audio_file) or os.path.getsize(audio_file) == 0:
-                    time.sleep(0.5)
-                processed_audio_files.append(audio_file)
-                params["log_callback"](f"已确认音频处理完成: {os.path.basename(audio_file)}")
+            ordered_indices = sorted(files_by_index)
+            processed_audio_files = [files_by_index[i] for i in ordered_indices]
+            lrc_lines = [original_lines[i] for i in ordered_indices]
+            japanese_lines = []
+            if mode == "中文翻译日文Yukkuri":
+                japanese_lines = [converted_texts.get(i, original_lines[i]) for i in ordered_indices]
 
             # 现在所有音频都已处理完毕，生成LRC文件
             if params["generate_lrc"] and processed_audio_files:
+                marks = params.get("segment_marks", {})
                 self.generate_lrc_files(
-                    original_lines, processed_audio_files,
-                    japanese_lines, mode, params
+                    lrc_lines, processed_audio_files,
+                    japanese_lines, mode, params,
+                    segment_marks=[marks.get(i) for i in ordered_indices]
                 )
 
+            if manifest is not None:
+                manifest.save([
+                    {
+                        "index": idx,
+                        "key": line_keys[idx],
+                        "file": os.path.basename(files_by_index[idx]),
+                        "text": converted_texts.get(idx, original_lines[idx]),
+                        "segments": params.get("segment_marks", {}).get(idx),
+                    }
+                    for idx in ordered_indices
+                ])
+
             # 完成
-            params["progress_callback"](100, f"完成 {len(downloaded_audio_files)}/{len(original_lines)}")
-            params["log_callback"](f"转换完成！成功下载 {len(downloaded_audio_files)}/{len(original_lines)} 个音频文件")
+            params["result"] = {"lines": len(original_lines), "succeeded": len(processed_audio_files),
+                                "failed": [idx + 1 for idx in sorted(retry_queue.permanent)]}
+            params["progress_callback"](100, f"完成 {len(processed_audio_files)}/{len(original_lines)}")
+            params["log_callback"](f"转换完成！成功下载 {len(processed_audio_files)}/{len(original_lines)} 个音频文件")
+            output_bytes = sum(os.path.getsize(path) for path in processed_audio_files if os.path.exists(path))
+            params["log_callback"](f"输出音频总大小: {output_bytes / (1024 * 1024):.2f} MB")
+            deduplicated = params["deduplicated"]
+            if deduplicated["lines"]:
+                params["result"]["deduplicated"] = dict(deduplicated)
+                params["log_callback"](
+                    f"重复行去重: {deduplicated['lines']} 行复用了相同内容的音频，"
+                    f"节省 {deduplicated['remote_calls']} 次远程合成请求"
+                )
+            params["log_callback"](tracker.summary())
+            wait_summary = self.wait_ledger.summary()
+            if wait_summary:
+                params["result"]["wait_saved"] = {
+                    "total": round(self.wait_ledger.total(), 2),
+                    "lines": self.wait_ledger.per_line("synthesis"),
+                }
+                params["log_callback"](wait_summary)
+            for summary in limiter_summaries():
+                params["log_callback"](summary)
+            if params.get("memory_governor") is not None:
+                params["result"]["memory"] = params["memory_governor"].report(params["memory_usage"])
+                params["log_callback"](params["memory_governor"].summary(params["memory_usage"]))
+
+            try:
+                tracker.save()
+            except OSError as e:
+                params["log_callback"](f"保存吞吐历史失败: {str(e)}")
+            return True
 
+        except ConversionCancelled:
+            params["log_callback"]("转换已被用户停止")
         except Exception as e:
             params["log_callback"](f"转换过程出错: {str(e)}")
         finally:
             if driver:
+                self.close_driver(driver, params)
+            if capture:
                 try:
-                    driver.quit()
-                except:
-                    pass
+                    capture.finish()
+                except OSError as e:
+                    params["log_callback"](f"保存远程交互存档失败: {str(e)}")
+            self.close_segment_pool(params)
+            self.close_text_driver(params)
+            if own_governor is not None:
+                own_governor.close()
+                params.pop("memory_governor", None)
             params["status_callback"]("转换完成")
 
-    def download_audio_files(self, driver, katakana_lines, original_lines, params):
-        downloaded_audio_files = []
+    def run_batch(self, params, input_files, file_callback=None):
+        """
+        依次转换多个输入文件，所有文件共用同一个浏览器（声种相同且页面未离开时不重新选择）
+        每个文件输出到 output_dir/<文件名>/；file_callback(序号, 结果) 在每个文件开始和结束时调用
+        返回每个文件的结果：{"input_file", "output_dir", "status", "lines", "succeeded", "elapsed"}
+        """
+        pool = params.get("driver_pool")
+        own_pool = pool is None
+        if own_pool:
+            pool = DriverPool(self.browser_manager, params["output_dir"], 1, params["browser_type"])
+
+        results = []
+        used_names = set()
+        start = time.time()
+        try:
+            for position, input_file in enumerate(input_files):
+                # 不同文件夹中的同名文件输出到不同子目录
+                base_name = name = os.path.splitext(os.path.basename(input_file))[0]
+                suffix = 2
+                while name in used_names:
+                    name = f"{base_name}-{suffix}"
+                    suffix += 1
+                used_names.add(name)
+                result = {
+                    "input_file": input_file,
+                    "output_dir": os.path.join(params["output_dir"], name),
+                    "status": "running",
+                    "lines": 0,
+                    "succeeded": 0,
+                    "elapsed": 0.0,
+                }
+                results.append(result)
+                if params["stop_flag"]():
+                    result["status"] = "skipped"
+                    continue
+
+                if file_callback:
+                    file_callback(position, result)
+                params["log_callback"](f"批量转换 [{position + 1}/{len(input_files)}]: {input_file}")
+                os.makedirs(result["output_dir"], exist_ok=True)
+                file_params = dict(params, input_file=input_file, output_dir=result["output_dir"],
+                                   driver_pool=pool)
+                file_start = time.time()
+                ok = self.run_conversion(file_params)
+
+                result.update(file_params.get("result", {}))
+                result["elapsed"] = time.time() - file_start
+                if params["stop_flag"]():
+                    result["status"] = "stopped"
+                else:
+                    result["status"] = "done" if ok else "failed"
+                if file_callback:
+                    file_callback(position, result)
+        finally:
+            launches = pool.launches
+            if own_pool:
+                pool.close()
+
+        done = [r for r in results if r["status"] == "done"]
+        params["log_callback"](
+            f"批量转换结束: 成功 {len(done)}/{len(input_files)} 个文件，"
+            f"音频 {sum(r['succeeded'] for r in results)}/{sum(r['lines'] for r in results)} 行，"
+            f"耗时 {time.time() - start:.1f} 秒，浏览器启动 {launches} 次"
+        )
+        return results
+
+    def _sleep_unless_stopped(self, seconds, stop_flag, interval=0.2):
+        end_time = time.time() + seconds
+        while not stop_flag() and time.time() < end_time:
+            cancellable_sleep(min(interval, max(0.0, end_time - time.time())))
+
+    def write_failure_report(self, retry_queue, original_lines, params):
+        """永久失败的行写入 <输入文件名>_failed_lines.txt；全部成功时删除旧的报告"""
+        base_name = os.path.splitext(os.path.basename(params["input_file"]))[0]
+        report_path = os.path.join(params["output_dir"], f"{base_name}_failed_lines.txt")
+        report = retry_queue.report(original_lines)
+        if not report:
+            if os.path.exists(report_path):
+                os.remove(report_path)
+            return None
+
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        params["log_callback"](
+            f"{len(retry_queue.permanent)} 行重试后仍然失败: {[idx + 1 for idx in sorted(retry_queue.permanent)]}，"
+            f"详见 {report_path}"
+        )
+        return report_path
+
+    def verify_audio_files(self, files_by_index, log_callback):
+        """并行校验音频文件，返回未通过校验的行号列表（从0开始，已排序）；未能校验的文件保留并提示"""
+        results = self.audio_verifier.verify_many(list(files_by_index.values()))
+        failed_indices = []
+        for idx in sorted(files_by_index):
+            ok, reason, duration = results[files_by_index[idx]]
+            if ok:
+                log_callback(f"已确认音频完整: {os.path.basename(files_by_index[idx])}（{duration:.2f}秒）")
+            elif ok is None:
+                log_callback(f"第{idx + 1}行音频未校验（{reason}），保留下载的文件")
+            else:
+                log_callback(f"第{idx + 1}行音频校验失败: {reason}")
+                failed_indices.append(idx)
+        return failed_indices
+
+    def convert_text(self, driver, mode, original_lines, log_callback, params=None):
+        """按模式把原文转换为可合成的文本，返回 (片假名/日文行, 日文翻译行)"""
+        katakana_lines = []
+        japanese_lines = []
+
+        if mode == AUTO_MODE:
+            katakana_lines = self.convert_mixed_text(driver, original_lines, log_callback, params or {})
+        elif mode == "中文Yukkuri":
+            katakana_lines = self.text_processor.convert_chinese_to_katakana(
+                driver, original_lines, log_callback
+            )
+        elif mode == "英文Yukkuri":
+            # 英文逐行请求转换网站，重复的行只转换一次
+            unique_lines = list(dict.fromkeys(original_lines))
+            converted = self.text_processor.convert_english_to_katakana(
+                driver,
+                unique_lines,
+                log_callback  # Add log_callback argument
+            )
+            katakana_by_line = dict(zip(unique_lines, converted))
+            for line in original_lines:
+                if line not in katakana_by_line:
+                    break
+                katakana_lines.append(katakana_by_line[line])
+            if len(unique_lines) < len(original_lines):
+                log_callback(f"重复的英文行只转换一次，节省 {len(original_lines) - len(unique_lines)} 次远程请求")
+        elif mode == "日文Yukkuri":
+            katakana_lines = original_lines
+            log_callback("日文模式：直接使用原文本")
+        elif mode == "中文翻译日文Yukkuri":
+            japanese_lines = self.translation_service.translate_chinese_to_japanese(
+                original_lines, log_callback
+            )
+            katakana_lines = japanese_lines
+
+        return katakana_lines, japanese_lines
+
+    def convert_mixed_text(self, driver, original_lines, log_callback, params):
+        """
+        自动识别模式：逐行识别语言并按语言分组，各组用对应模式的转换并行进行（翻译与日文原文不占用浏览器；
+        中文与英文都需要网页转换时，英文使用第二个浏览器 params["text_driver"]，用完由 close_text_driver 关闭），
+        结果按原顺序合并；某一组转换失败时该组的行留空，按转换失败报告
+        """
+        chinese_mode = params.get("auto_chinese_mode") or "中文Yukkuri"
+        groups = {}
+        for position, line in enumerate(original_lines):
+            groups.setdefault(self.text_processor.detect_line_mode(line, chinese_mode), []).append(position)
+        groups.pop(None, None)
+        labels = {"中文Yukkuri": "中文", "中文翻译日文Yukkuri": "中文（翻译）", "英文Yukkuri": "英文", "日文Yukkuri": "日文"}
+        log_callback("自动识别: " + "，".join(f"{labels[mode]} {len(positions)} 行" for mode, positions in groups.items()))
+
+        # 同一个浏览器上的转换只能依次进行
+        browser_modes = [mode for mode in ("中文Yukkuri", "英文Yukkuri") if mode in groups]
+        lanes = [([mode], None) for mode in groups if mode not in browser_modes]
+        if len(browser_modes) > 1 and params.get("output_dir"):
+            text_driver = params.get("text_driver")
+            if text_driver is None:
+                try:
+                    text_driver = params["text_driver"] = self.browser_manager.init_driver(
+                        params["output_dir"], params["browser_type"], log_callback
+                    )
+                    self._cancel_hooks[id(text_driver)] = on_cancel(text_driver.quit)
+                except Exception as e:
+                    log_callback(f"启动英文转换用的浏览器失败，中文与英文依次转换: {str(e)}")
+            if text_driver is not None:
+                lanes += [(["中文Yukkuri"], driver), (["英文Yukkuri"], text_driver)]
+                browser_modes = []
+        if browser_modes:
+            lanes.append((browser_modes, driver))
+
+        def convert(modes, lane_driver):
+            results = {}
+            for mode in modes:
+                lines = [original_lines[position] for position in groups[mode]]
+                try:
+                    results[mode], _ = self.convert_text(lane_driver, mode, lines, log_callback)
+                except Exception as e:
+                    log_callback(f"自动识别: {labels[mode]}行转换失败: {str(e)}")
+            return results
+
+        converted = {}
+        if len(lanes) == 1:
+            converted = convert(*lanes[0])
+        elif lanes:
+            # 工作线程沿用当前的取消令牌
+            with ThreadPoolExecutor(max_workers=len(lanes)) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, convert, *lane) for lane in lanes]
+                for future in futures:
+                    converted.update(future.result())
+
+        katakana_lines = [""] * len(original_lines)
+        for mode, lines in converted.items():
+            for position, text in zip(groups[mode], lines):
+                katakana_lines[position] = text
+        return katakana_lines
+
+    def close_text_driver(self, params):
+        driver = params.pop("text_driver", None)
+        if driver is not None:
+            self._cancel_hooks.pop(id(driver), lambda: None)()
+            try:
+                driver.quit()
+            except:
+                pass
+
+    def input_rejected(self, reader, log_callback):
+        """读完的输入为空或没有一行通过语言验证时报告并返回 True"""
+        if not reader.lines:
+            log_callback("错误: 输入文件为空")
+            return True
+        if len(reader.invalid) == len(reader.lines):
+            log_callback(f"语言验证失败: {len(reader.lines)} 行全部未通过验证，请检查文本内容")
+            return True
+        return False
+
+    def line_params(self, params, overrides):
+        """应用某一行参数覆盖后的转换参数"""
+        return dict(params, **overrides) if overrides else params
+
+    def audio_filename(self, idx, original_line, extension=".mp3"):
+        """与 BrowserManager.download_audio 一致的输出文件名（idx从0开始）"""
+        return f"{idx + 1}-{self.text_processor.sanitize_filename(original_line)[:50]}{extension}"
+
+    def render_settings(self, params):
+        """影响音频结果的全部设置（包括质量预设），用于增量渲染的行哈希"""
+        quality_preset = params.get("quality_preset") or DEFAULT_QUALITY_PRESET
+        preset = get_quality_preset(quality_preset)
+        settings = (
+            params["mode"], params["voice_type"],
+            params["speed"], params["volume"], params["pitch"],
+            params.get("output_format") or preset["output_format"] or self.audio_processor.output_format,
+            params.get("stretch_algorithm") or preset["stretch_algorithm"] or self.audio_processor.stretch_algorithm,
+            bool(params.get("preserve_formants")),
+            quality_preset,
+        )
+        if params["mode"] == AUTO_MODE:
+            settings += (params.get("auto_chinese_mode") or "中文Yukkuri",)
+        return settings
+
+    def prepare_incremental(self, original_lines, params, line_overrides=None):
+        """
+        读取上次渲染的清单并复用未修改的行（行参数覆盖计入各行的哈希）
+        返回 (清单, 各行哈希, {行号: 复用的文件路径}, {行号: 已转换的文本})
+        """
+        base_name = os.path.splitext(os.path.basename(params["input_file"]))[0]
+        manifest = RenderManifest(params["output_dir"], base_name).load()
+
+        line_keys = [
+            RenderManifest.line_key(line, *self.render_settings(
+                self.line_params(params, line_overrides[idx] if line_overrides else None)))
+            for idx, line in enumerate(original_lines)
+        ]
+        reuse, stale_files = manifest.plan(line_keys)
+
+        # 先删除已失效的旧音频，再把复用的音频移动到新行号
+        for stale_file in stale_files:
+            if os.path.exists(stale_file):
+                try:
+                    os.remove(stale_file)
+                    params["log_callback"](f"删除过期音频: {os.path.basename(stale_file)}")
+                except OSError as e:
+                    params["log_callback"](f"删除过期音频失败: {str(e)}")
+
+        target_names = {
+            idx: self.audio_filename(idx, original_lines[idx], os.path.splitext(entry["file"])[1])
+            for idx, entry in reuse.items()
+        }
+        reused_files = manifest.relocate(reuse, target_names, params["log_callback"])
+        reused_texts = {idx: entry.get("text", original_lines[idx]) for idx, entry in reuse.items()}
+        # 复用的分段合成行保留逐段字幕时间
+        params.setdefault("segment_marks", {}).update(
+            {idx: entry["segments"] for idx, entry in reuse.items() if entry.get("segments")}
+        )
+
+        # 新增或修改的行若与某个复用的行哈希相同（重复的行），直接链接该行的音频
+        source_by_key = {}
+        for idx in sorted(reused_files):
+            source_by_key.setdefault(line_keys[idx], idx)
+        for idx, key in enumerate(line_keys):
+            source = source_by_key.get(key)
+            if idx in reused_files or source is None:
+                continue
+            path = self.link_duplicate(reused_files[source], source, idx, original_lines[idx], params)
+            if path:
+                reused_files[idx] = path
+                reused_texts[idx] = reused_texts[source]
+                self.count_deduplicated(reused_texts[source], params)
+        return manifest, line_keys, reused_files, reused_texts
+
+    def download_audio_files(self, driver, katakana_lines, original_lines, params, tracker=None,
+                             line_indices=None, line_results=None, line_overrides=None, progress_offset=0):
+        """
+        逐行下载并处理音频
+        line_indices 为各行在原始文件中的行号（从0开始，默认与位置一致），
+        line_results 若提供则写入 {行号: 音频路径}，line_overrides 为各行的参数覆盖，
+        progress_offset 为分批调用时之前各批已完成的行数（进度按 tracker 的总行数显示）
+        各行按 (声种, 语速, 音量, 音程) 分组：每组只选择一次声种，下载的音频每 AUDIO_BATCH_SIZE 个
+        一批交给 AudioProcessor 处理；转换后文本与参数都相同的重复行只合成、处理一次，
+        其余各行由该音频链接生成自己的文件（params["synthesized_lines"] 存在时，
+        与之前各批合成过的行相同的行也直接链接）；返回的音频列表仍按行的顺序排列
+        """
+        download_dir = params.get("download_dir") or params["output_dir"]
         total_lines = min(len(original_lines), len(katakana_lines))
+        if line_indices is None:
+            line_indices = list(range(total_lines))
+        if tracker is None:
+            tracker = ThroughputTracker(total_lines, params.get("mode"),
+                                        history=ThroughputHistory(params.get("history_path")))
+            tracker.start_lines()
 
+        synthesized = params.get("synthesized_lines")
+        processed_by_position = {}
+        groups = {}
+        first_positions = {}
+        duplicates = {}  # 首次出现的位置 -> 重复行的位置
+        earlier = 0  # 与之前各批相同、已直接链接的行数
         for idx in range(total_lines):
-            if params["stop_flag"]():
-                params["log_callback"]("转换已被用户停止")
+            settings = self.line_params(params, line_overrides[idx] if line_overrides else None)
+            key = (settings["voice_type"], settings["speed"], settings["volume"], settings["pitch"])
+            if katakana_lines[idx]:
+                line_key = (katakana_lines[idx],) + key
+                if synthesized and line_key in synthesized and line_key not in first_positions:
+                    source_index, source = synthesized[line_key]
+                    path = self.link_duplicate(source, source_index, line_indices[idx], original_lines[idx], params)
+                    if path:
+                        processed_by_position[idx] = path
+                        if line_results is not None:
+                            line_results[line_indices[idx]] = path
+                        self.count_deduplicated(katakana_lines[idx], params)
+                        earlier += 1
+                        continue
+                first = first_positions.setdefault(line_key, idx)
+                if first != idx:
+                    duplicates.setdefault(first, []).append(idx)
+                    continue
+            groups.setdefault(key, []).append(idx)
+        if len(groups) > 1:
+            params["log_callback"](f"按声种与音频参数分为 {len(groups)} 组处理")
+        duplicate_count = sum(len(positions) for positions in duplicates.values()) + earlier
+        if duplicate_count:
+            params["log_callback"](f"{duplicate_count} 行与前面的行内容和参数相同，只合成一次")
+            total_lines -= duplicate_count
+            tracker.total_lines = max(0, tracker.total_lines - duplicate_count)
+        line_keys = {idx: key for key, idx in first_positions.items()}
+        progress_total = max(tracker.total_lines, progress_offset + total_lines)
+
+        done = 0
+
+        def process_pending(pending, speed, volume, pitch):
+            """处理一批参数相同的音频"""
+            with self.admit_stage(params, "audio"), tracker.stage("audio"):
+                outputs = self.audio_processor.process_batch(
+                    [path for _, path in pending],
+                    speed,
+                    volume,
+                    pitch,
+                    params["log_callback"],
+                    params.get("output_format"),
+                    params.get("stretch_algorithm"),
+                    params.get("preserve_formants", False),
+                    params.get("streaming"),
+                    params.get("quality_preset")
+                )
+
+            for (idx, audio_file_path), processed_audio in zip(pending, outputs):
+                line_index = line_indices[idx]
+                if processed_audio:
+                    processed_by_position[idx] = processed_audio
+                    params["log_callback"](f"第{line_index + 1}行处理成功")
+                else:
+                    processed_by_position[idx] = audio_file_path
+                    params["log_callback"](f"第{line_index + 1}行下载成功（未处理）")
+
+                if line_results is not None:
+                    line_results[line_index] = processed_by_position[idx]
+                if synthesized is not None and idx in line_keys:
+                    synthesized[line_keys[idx]] = (line_index, processed_by_position[idx])
+
+                for duplicate in duplicates.get(idx, []):
+                    path = self.link_duplicate(processed_by_position[idx], line_index, line_indices[duplicate],
+                                               original_lines[duplicate], params)
+                    if path:
+                        processed_by_position[duplicate] = path
+                        if line_results is not None:
+                            line_results[line_indices[duplicate]] = path
+                        self.count_deduplicated(katakana_lines[duplicate], params)
+
+            tracker.line_done(len(pending))
+            warning = tracker.check_slowdown()
+            if warning:
+                params["log_callback"](warning)
+
+        stopped = False
+        for (voice_type, speed, volume, pitch), positions in groups.items():
+            pending = []
+            for idx in positions:
+                if params["stop_flag"]():
+                    params["log_callback"]("转换已被用户停止")
+                    stopped = True
+                    break
+
+                # 更新进度
+                progress = ((progress_offset + done) / progress_total) * 100
+                params["progress_callback"](progress, tracker.format_progress(progress_offset + done + 1,
+                                                                              progress_total))
+
+                original_line = original_lines[idx]
+                katakana_line = katakana_lines[idx]
+
+                if not katakana_line:
+                    params["log_callback"](f"跳过第{idx + 1}行（空文本）")
+                    tracker.line_done()
+                    done += 1
+                    continue
+
+                # 下载音频
+                line_index = line_indices[idx]
+                with self.admit_stage(params, "synthesis"), tracker.stage("synthesis"):
+                    audio_file_path = self.synthesize_line(
+                        driver, katakana_line, line_index,
+                        self.text_processor.sanitize_filename(original_line)[:50],
+                        voice_type, download_dir, params
+                    )
+
+                if audio_file_path and download_dir != params["output_dir"]:
+                    # 共享浏览器的下载目录与任务输出目录不同（可能不在同一磁盘）
+                    target = os.path.join(params["output_dir"], os.path.basename(audio_file_path))
+                    shutil.move(audio_file_path, target)
+                    audio_file_path = target
+
+                done += 1
+                if audio_file_path:
+                    pending.append((idx, audio_file_path))
+                    if len(pending) >= self.AUDIO_BATCH_SIZE:
+                        process_pending(pending, speed, volume, pitch)
+                        pending = []
+                else:
+                    tracker.line_done()
+
+            # 已下载的音频（包括停止前下载的）都处理完再结束
+            if pending:
+                process_pending(pending, speed, volume, pitch)
+            if stopped:
                 break
 
-            # 更新进度
-            progress = (idx / total_lines) * 100
-            params["progress_callback"](progress, f"{idx + 1}/{total_lines}")
+        return [processed_by_position[idx] for idx in sorted(processed_by_position)]
 
-            original_line = original_lines[idx]
-            katakana_line = katakana_lines[idx]
+    def link_duplicate(self, source, source_index, line_index, original_line, params):
+        """
+        把第 source_index 行的音频生成为第 line_index 行的文件（硬链接，不支持时写时复制或复制），
+        分段合成的字幕时间一并复用；失败时返回 None（该行按下载失败处理）
+        """
+        target = os.path.join(os.path.dirname(source),
+                              self.audio_filename(line_index, original_line, os.path.splitext(source)[1]))
+        try:
+            method = link_or_copy(source, target)
+        except OSError as e:
+            params["log_callback"](f"第{line_index + 1}行复用重复音频失败: {str(e)}")
+            return None
+        marks = params.setdefault("segment_marks", {})
+        if source_index in marks:
+            marks[line_index] = marks[source_index]
+        params["log_callback"](
+            f"第{line_index + 1}行与第{source_index + 1}行相同，{self.LINK_METHOD_LABELS[method]}复用音频"
+        )
+        return target
 
-            if not katakana_line:
-                params["log_callback"](f"跳过第{idx + 1}行（空文本）")
-                continue
+    def count_deduplicated(self, text, params):
+        """记录一行因去重而省去的远程合成请求（分段合成的行每段一次）"""
+        deduplicated = params.setdefault("deduplicated", {"lines": 0, "remote_calls": 0})
+        deduplicated["lines"] += 1
+        deduplicated["remote_calls"] += len(
+            split_text(text, params.get("max_segment_chars") or DEFAULT_MAX_SEGMENT_CHARS)) or 1
 
-            # 下载音频
-            audio_file_path = self.browser_manager.download_audio(
-                driver, katakana_line, idx + 1,
-                self.text_processor.sanitize_filename(original_line)[:50],
-                params["voice_type"],
-                params["output_dir"],
-                params["log_callback"]
+    def synthesize_line(self, driver, text, line_index, clean_name, voice_type, download_dir, params):
+        """
+        合成一行：超过 max_segment_chars 个字符的行在标点处切分，各段并行合成后交叉淡化拼接为一个音频，
+        各段的文本与起始位置（占总时长的比例）记录在 params["segment_marks"][行号]，用于字幕的逐段时间
+        """
+        segments = split_text(text, params.get("max_segment_chars") or DEFAULT_MAX_SEGMENT_CHARS)
+        if len(segments) <= 1:
+            return self.browser_manager.download_audio(
+                driver, text, line_index + 1, clean_name, voice_type, download_dir, params["log_callback"]
             )
 
-            if audio_file_path:
-                # 处理音频
-                processed_audio = self.audio_processor.process_audio(
-                    audio_file_path,
-                    params["speed"],
-                    params["volume"],
-                    params["pitch"],
-                    params["log_callback"]
+        params["log_callback"](f"第{line_index + 1}行过长（{len(text)} 字），分为 {len(segments)} 段合成")
+        paths = self.synthesize_segments(driver, segments, line_index, clean_name, voice_type,
+                                         download_dir, params)
+        try:
+            if not all(paths):
+                params["log_callback"](f"第{line_index + 1}行有 {paths.count(None)} 段合成失败")
+                return None
+
+            codec = self.audio_processor.codec
+            first, sr = codec.decode(paths[0])
+            clips = [first] + [codec.decode(path, sample_rate=sr)[0] for path in paths[1:]]
+            audio, fractions = crossfade_concat(clips, sr, params.get("segment_crossfade", 0.03))
+            output_path = os.path.join(download_dir, f"{line_index + 1}-{clean_name}.mp3")
+            # 先写临时文件再替换：旧文件可能是其他行的硬链接，不能原地改写
+            temp_path = os.path.join(download_dir, f".joined-{line_index + 1}-{clean_name}.mp3")
+            codec.encode_with_format(audio, sr, temp_path, get_output_format(DEFAULT_OUTPUT_FORMAT))
+            os.replace(temp_path, output_path)
+            params.setdefault("segment_marks", {})[line_index] = [segments, fractions]
+            return output_path
+        except Exception as e:
+            params["log_callback"](f"第{line_index + 1}行拼接分段音频失败: {str(e)}")
+            return None
+        finally:
+            for path in paths:
+                if path and os.path.exists(path):
+                    os.remove(path)
+
+    def synthesize_segments(self, driver, segments, line_index, clean_name, voice_type, download_dir, params):
+        """
+        用当前浏览器和分段专用的浏览器池（最多 segment_workers 个浏览器）并行合成各段，
+        返回与 segments 对应的音频路径（失败为 None）；使用共享浏览器池时只用当前浏览器依次合成，
+        避免多个任务互相等待对方占用的浏览器
+        """
+        workers = min(len(segments), max(1, params.get("segment_workers", 2)))
+        pool = None
+        if workers > 1 and params.get("driver_pool") is None:
+            pool = params.get("segment_pool")
+            if pool is None:
+                pool = params["segment_pool"] = DriverPool(
+                    self.browser_manager, params["output_dir"], workers - 1, params["browser_type"],
+                    params.get("memory_governor")
                 )
+        else:
+            workers = 1
 
-                if processed_audio:
-                    downloaded_audio_files.append(processed_audio)
-                    params["log_callback"](f"第{idx + 1}行处理成功")
-                else:
-                    downloaded_audio_files.append(audio_file_path)
-                    params["log_callback"](f"第{idx + 1}行下载成功（未处理）")
+        pending = queue.SimpleQueue()
+        for position in range(len(segments)):
+            pending.put(position)
+        paths = [None] * len(segments)
+
+        def work(own_driver):
+            if own_driver is None:
+                segment_driver = pool.acquire(params["stop_flag"], params["log_callback"])
+                if segment_driver is None:
+                    return
+                segment_dir = pool.download_dir(segment_driver)
+                unregister = on_cancel(segment_driver.quit)
+            else:
+                segment_driver, segment_dir, unregister = own_driver, download_dir, lambda: None
+            try:
+                while not params["stop_flag"]():
+                    try:
+                        position = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    paths[position] = self.browser_manager.download_audio(
+                        segment_driver, segments[position], line_index + 1,
+                        f"{clean_name}.part{position + 1}", voice_type, segment_dir, params["log_callback"]
+                    )
+            finally:
+                unregister()
+                if own_driver is None:
+                    pool.release(segment_driver)
+
+        if workers == 1:
+            work(driver)
+            return paths
 
-            time.sleep(1)
+        # 工作线程沿用当前的取消令牌
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, work, driver if k == 0 else None)
+                       for k in range(workers)]
+            for future in futures:
+                future.result()
+        return paths
 
-        return downloaded_audio_files
+    def close_segment_pool(self, params):
+        pool = params.pop("segment_pool", None)
+        if pool is not None:
+            pool.close()
 
-    def generate_lrc_files(self, original_lines, audio_files, japanese_lines, mode, params):
+    def segment_sub_lines(self, text_lines, marks):
+        """
+        字幕的逐段时间：marks 为与 text_lines 对应的 [各段文本, 各段起始比例]（未分段为 None），
+        返回 {行位置: [(起始比例, 显示文本)]}；显示文本与合成文本不同时在原文的标点处按比例切分
+        """
+        sub_lines = {}
+        for position, (line, mark) in enumerate(zip(text_lines, marks)):
+            if not mark:
+                continue
+            segments, fractions = mark
+            if "".join(segments).replace(" ", "") == line.replace(" ", ""):
+                pieces = segments
+            else:
+                pieces = split_like(line, [len(segment) for segment in segments])
+            if pieces:
+                sub_lines[position] = list(zip(fractions, pieces))
+        return sub_lines
+
+    def generate_lrc_files(self, original_lines, audio_files, japanese_lines, mode, params, segment_marks=None):
+        """segment_marks 为与各行对应的分段信息；params["lrc_segments"] 为真时为分段合成的行写入逐段时间"""
         base_name = os.path.splitext(os.path.basename(params["input_file"]))[0]
+        if not params.get("lrc_segments") or not segment_marks or not any(segment_marks):
+            segment_marks = None
+
+        def sub_lines(text_lines):
+            return self.segment_sub_lines(text_lines, segment_marks) if segment_marks else None
 
         if mode == "中文翻译日文Yukkuri":
             # 中文LRC
@@ -167,7 +977,8 @@ class ConversionEngine:
                 base_name,
                 params["output_dir"],
                 "_chinese",
-                params["log_callback"]
+                params["log_callback"],
+                sub_lines(original_lines[:len(audio_files)])
             )
             # 日文LRC
             self.text_processor.generate_combined_lrc_file(
@@ -176,7 +987,8 @@ class ConversionEngine:
                 base_name,
                 params["output_dir"],
                 "_japanese",
-                params["log_callback"]
+                params["log_callback"],
+                sub_lines(japanese_lines[:len(audio_files)])
             )
         else:
             # 单个LRC
@@ -186,5 +998,250 @@ class ConversionEngine:
                 base_name,
                 params["output_dir"],
                 "",
-                params["log_callback"]
-            )
\ No newline at end of file
+                params["log_callback"],
+                sub_lines(original_lines[:len(audio_files)])
+            )
+
+    def prepare_sharded_job(self, params, queue_path, range_size=20):
+        """分片模式第一步：读取并转换全部文本，按行号区间写入共享工作队列"""
+        driver = None
+        try:
+            self.configure_endpoints(params)
+            mode = params["mode"]
+            reader = ScriptReader(params["input_file"], mode, self.text_processor, params["log_callback"])
+            original_lines = reader.read_all()
+            line_overrides = reader.overrides
+            if self.input_rejected(reader, params["log_callback"]):
+                return False
+            # 未通过验证的行不转换，转换后文本留空（工作进程跳过，合并时报告为缺失）
+            valid_indices = reader.valid_indices()
+
+            # 只有需要网页转换的模式才启动浏览器
+            if mode in ("中文Yukkuri", "英文Yukkuri", AUTO_MODE):
+                driver = self.browser_manager.init_driver(
+                    params["output_dir"], params["browser_type"], params["log_callback"]
+                )
+
+            valid_katakana, valid_japanese = self.convert_text(
+                driver, mode, [original_lines[idx] for idx in valid_indices], params["log_callback"], params
+            )
+            if not valid_katakana:
+                params["log_callback"]("错误: 无法获取有效的片假名文本")
+                return False
+            katakana_lines = [""] * len(original_lines)
+            japanese_lines = [""] * len(original_lines) if valid_japanese else []
+            for position, idx in enumerate(valid_indices[:len(valid_katakana)]):
+                katakana_lines[idx] = valid_katakana[position]
+                if valid_japanese:
+                    japanese_lines[idx] = valid_japanese[position]
+
+            job = {key: params.get(key) for key in self.SHARD_JOB_KEYS}
+            job["japanese_lines"] = japanese_lines
+            job["line_overrides"] = line_overrides
+            job["max_segment_chars"] = params.get("max_segment_chars")
+
+            queue = WorkQueue(queue_path, params.get("lease_seconds", 120))
+            queue.create_job(job, original_lines, katakana_lines, range_size)
+            params["log_callback"](
+                f"已创建分片任务: {len(original_lines)} 行，每个区间 {range_size} 行，队列文件 {queue_path}"
+            )
+            return True
+
+        except Exception as e:
+            params["log_callback"](f"创建分片任务出错: {str(e)}")
+            return False
+        finally:
+            if driver:
+                try:
+                    driver.quit()
+                except:
+                    pass
+            self.close_text_driver(params)
+
+    def run_shard_worker(self, queue_path, params, worker_id=None, poll_interval=5):
+        """
+        分片模式工作进程：循环领取区间并合成、处理音频，直到队列全部完成
+        params 中未提供（为 None）的任务参数使用队列中记录的值
+        """
+        worker_id = worker_id or default_worker_id()
+        queue = WorkQueue(queue_path, params.get("lease_seconds", 120))
+        worker_params = dict(queue.job())
+        worker_params.update({key: value for key, value in params.items() if value is not None})
+        self.configure_endpoints(worker_params)
+
+        output_dir = worker_params["output_dir"]
+        # 每个工作进程使用独立的下载目录，避免多个浏览器同时下载时互相抢占新文件
+        worker_dir = os.path.join(output_dir, f".shard-{worker_id}")
+        os.makedirs(worker_dir, exist_ok=True)
+        governor = None
+        if worker_params.get("memory_budget_mb"):
+            governor = worker_params["memory_governor"] = MemoryGovernor(worker_params["memory_budget_mb"])
+        range_params = dict(worker_params, output_dir=worker_dir)
+        line_overrides = worker_params.get("line_overrides") or []
+
+        driver = None
+        completed_ranges = 0
+        try:
+            while not worker_params["stop_flag"]():
+                claimed = queue.claim(worker_id)
+                if claimed is None:
+                    if queue.is_finished():
+                        break
+                    # 其他进程持有的租约可能过期，稍后重试
+                    self._sleep_unless_stopped(poll_interval, worker_params["stop_flag"])
+                    continue
+
+                range_id, start, end = claimed
+                worker_params["log_callback"](f"[{worker_id}] 领取区间 {start + 1}-{end}")
+                rows = queue.lines(start, end)
+
+                if driver is None:
+                    driver = self.browser_manager.init_driver(
+                        worker_dir, worker_params["browser_type"], worker_params["log_callback"]
+                    )
+
+                line_results = {}
+                # 续租一直持续到提交完成（校验也可能耗时较长）
+                stop_heartbeat = threading.Event()
+                heartbeat = threading.Thread(
+                    target=self._renew_lease_loop,
+                    args=(queue, range_id, worker_id, stop_heartbeat, worker_params["log_callback"]),
+                    daemon=True
+                )
+                heartbeat.start()
+                try:
+                    try:
+                        completed = self._complete_range(
+                            queue, range_id, worker_id, rows, driver, range_params, line_overrides,
+                            line_results, output_dir
+                        )
+                    finally:
+                        stop_heartbeat.set()
+                        heartbeat.join()
+                except Exception as e:
+                    # 放弃本区间（计入领取次数，多次出错后不再领取），换一个浏览器继续处理其他区间
+                    worker_params["log_callback"](f"[{worker_id}] 区间 {start + 1}-{end} 处理出错: {str(e)}")
+                    queue.release(range_id, worker_id, error=str(e) or type(e).__name__)
+                    self._discard_files(line_results.values())
+                    try:
+                        driver.quit()
+                    except:
+                        pass
+                    driver = None
+                    continue
+
+                if completed is None:
+                    queue.release(range_id, worker_id)
+                    break
+                if not completed:
+                    self._discard_files(line_results.values())
+                    worker_params["log_callback"](
+                        f"[{worker_id}] 区间 {start + 1}-{end} 的租约已过期，已被其他进程接管，丢弃本区间结果"
+                    )
+                    continue
+                completed_ranges += 1
+                worker_params["log_callback"](
+                    f"[{worker_id}] 区间 {start + 1}-{end} 完成（{len(line_results)}/{len(rows)} 行成功）"
+                )
+
+        finally:
+            if driver:
+                try:
+                    driver.quit()
+                except:
+                    pass
+            self.close_segment_pool(range_params)
+            try:
+                os.rmdir(worker_dir)
+            except OSError:
+                pass
+            if governor is not None:
+                worker_params["log_callback"](f"[{worker_id}] {governor.summary()}")
+                governor.close()
+
+        worker_params["log_callback"](f"[{worker_id}] 工作进程结束，共完成 {completed_ranges} 个区间")
+        return completed_ranges
+
+    def _complete_range(self, queue, range_id, worker_id, rows, driver, range_params, line_overrides,
+                        line_results, output_dir):
+        """
+        合成、校验并提交一个区间；返回 True（已提交）、False（租约已被接管）或 None（用户停止）
+        提交时确认仍持有租约后才把音频移动到共享输出目录，不覆盖新领取者的文件
+        """
+        self.download_audio_files(
+            driver, [row[2] for row in rows], [row[1] for row in rows], range_params,
+            line_indices=[row[0] for row in rows], line_results=line_results,
+            line_overrides=[line_overrides[row[0]] if row[0] < len(line_overrides) else {}
+                            for row in rows]
+        )
+        if range_params["stop_flag"]():
+            return None
+
+        # 未通过完整性校验的行不提交，合并时会报告为缺失
+        for idx in self.verify_audio_files(line_results, range_params["log_callback"]):
+            self._discard_files([line_results.pop(idx)])
+
+        results = {idx: os.path.basename(path) for idx, path in line_results.items()}
+
+        def publish():
+            for path in line_results.values():
+                os.replace(path, os.path.join(output_dir, os.path.basename(path)))
+
+        marks = range_params.get("segment_marks", {})
+        segment_marks = {idx: marks[idx] for idx in results if marks.get(idx)}
+        return queue.complete(range_id, worker_id, results, publish, segment_marks)
+
+    def _discard_files(self, paths):
+        for path in list(paths):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _renew_lease_loop(self, queue, range_id, worker_id, stop_event, log_callback):
+        """处理区间期间定期续租"""
+        interval = max(1.0, queue.lease_seconds / 3.0)
+        while not stop_event.wait(interval):
+            try:
+                if not queue.renew(range_id, worker_id):
+                    log_callback(f"[{worker_id}] 区间租约已失效，可能已被其他进程接管")
+                    return
+            except Exception as e:
+                log_callback(f"[{worker_id}] 续租失败: {str(e)}")
+
+    def merge_sharded_job(self, queue_path, params, wait=True, poll_interval=5):
+        """分片模式最后一步：等待全部区间完成后按行号顺序汇总结果并生成LRC"""
+        queue = WorkQueue(queue_path)
+        job = queue.job()
+        merge_params = dict(job)
+        merge_params.update({key: value for key, value in params.items() if value is not None})
+
+        while not queue.is_finished():
+            if not wait or merge_params["stop_flag"]():
+                merge_params["log_callback"](f"分片任务尚未完成: {queue.status()}")
+                return False
+            self._sleep_unless_stopped(poll_interval, merge_params["stop_flag"])
+
+        rows = queue.lines()
+        results = queue.results()
+        ordered_indices = sorted(results)
+        audio_files = [os.path.join(merge_params["output_dir"], results[idx]) for idx in ordered_indices]
+        lrc_lines = [rows[idx][1] for idx in ordered_indices]
+        japanese_lines = job.get("japanese_lines") or []
+        if japanese_lines:
+            japanese_lines = [japanese_lines[idx] for idx in ordered_indices if idx < len(japanese_lines)]
+
+        for start, end, attempts, error in queue.failed_ranges():
+            merge_params["log_callback"](f"区间 {start + 1}-{end} 失败（领取{attempts}次）: {error}")
+        missing = [idx + 1 for idx in range(len(rows)) if idx not in results]
+        if missing:
+            merge_params["log_callback"](f"以下行未能生成音频: {missing}")
+
+        if merge_params["generate_lrc"] and audio_files:
+            marks = queue.segment_marks()
+            self.generate_lrc_files(lrc_lines, audio_files, japanese_lines, merge_params["mode"], merge_params,
+                                    segment_marks=[marks.get(idx) for idx in ordered_indices])
+
+        merge_params["log_callback"](f"分片任务合并完成！成功 {len(audio_files)}/{len(rows)} 行")
+        return True
+
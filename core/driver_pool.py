@@ -0,0 +1,138 @@
+import glob
+import os
+import threading
+
+
+class DriverPool:
+    """
+    多个任务共享的浏览器驱动池：驱动按需创建并在任务之间保持预热，最多同时存在 size 个
+    每个驱动使用独立的下载目录（root_dir/.driver-<n>），下载完成后由引擎移动到任务的输出目录
+    """
+
+    def __init__(self, browser_manager, root_dir, size=1, browser_type="自动检测", memory_governor=None):
+        self.browser_manager = browser_manager
+        self.memory_governor = memory_governor
+        self.root_dir = root_dir
+        self.size = size
+        self.browser_type = browser_type
+        self._condition = threading.Condition()
+        self._idle = []
+        self._free_slots = list(range(size))
+        self._slots = {}
+        self._in_use = set()
+        self._closed = False
+        self._download_dirs = set()
+        self.launches = 0
+
+    def acquire(self, stop_flag=None, log_callback=None, poll_interval=0.5):
+        """
+        借出一个驱动：优先复用空闲的已预热驱动，池未满时新建，否则等待归还
+        内存超出 memory_governor 的预算时不再启动新的浏览器，而是等待已有的浏览器归还
+        stop_flag() 为真时放弃等待并返回 None
+        """
+        log_callback = log_callback or (lambda message: None)
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("浏览器驱动池已关闭")
+                if self._idle:
+                    driver = self._idle.pop()
+                    break
+                if self._free_slots and not (self._slots and self.memory_governor
+                                             and self.memory_governor.over_budget()):
+                    slot = self._free_slots.pop(0)
+                    driver = None
+                    break
+                if stop_flag and stop_flag():
+                    return None
+                self._condition.wait(poll_interval)
+
+            if driver is not None:
+                self._in_use.add(id(driver))
+
+        if driver is None:
+            download_dir = os.path.join(self.root_dir, f".driver-{slot}")
+            os.makedirs(download_dir, exist_ok=True)
+            self._download_dirs.add(download_dir)
+            log_callback(f"浏览器池: 启动第{slot + 1}个浏览器")
+            try:
+                driver = self.browser_manager.init_driver(download_dir, self.browser_type, log_callback)
+            except Exception:
+                with self._condition:
+                    self._free_slots.append(slot)
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self._slots[id(driver)] = (slot, download_dir)
+                self.launches += 1
+                self._in_use.add(id(driver))
+        else:
+            log_callback(f"浏览器池: 复用已预热的第{self._slots[id(driver)][0] + 1}个浏览器")
+
+        # 声种由 download_audio 按 driver.voice_selected 判断是否需要重新选择；清理上次残留的下载文件
+        for leftover in glob.glob(os.path.join(self.download_dir(driver), "*.mp3")):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+        return driver
+
+    def download_dir(self, driver):
+        return self._slots[id(driver)][1]
+
+    def release(self, driver, recycle=False):
+        """
+        归还驱动；已失效（无法响应）的驱动直接关闭，其位置留给新驱动
+        recycle 为真时（如该驱动上的行失败需要重试）也直接关闭，下次借出的是其他驱动或新启动的驱动
+        """
+        healthy = False
+        if not recycle:
+            try:
+                driver.current_url
+                healthy = True
+            except Exception:
+                pass
+
+        with self._condition:
+            self._in_use.discard(id(driver))
+            keep = healthy and not self._closed
+            if keep:
+                self._idle.append(driver)
+            else:
+                slot, _ = self._slots.pop(id(driver))
+                self._free_slots.append(slot)
+            self._condition.notify()
+
+        if not keep:
+            self._quit(driver)
+
+    def close(self):
+        """关闭全部空闲驱动并删除空的下载目录；仍被借出的驱动在归还时关闭"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for driver in idle:
+            self._quit(driver)
+        for download_dir in self._download_dirs:
+            try:
+                os.rmdir(download_dir)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._condition:
+            return {
+                "size": self.size,
+                "started": len(self._slots),
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "launches": self.launches,
+            }
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        self._slots.pop(id(driver), None)
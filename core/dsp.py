@@ -0,0 +1,288 @@
+from fractions import Fraction
+
+import numpy as np
+
+
+def _sliding_energy(x, length):
+    """长度为 length 的滑动窗口能量（用于归一化互相关），一次性向量化计算"""
+    squared = np.concatenate(([0.0], np.cumsum(x.astype(np.float64) ** 2)))
+    return squared[length:] - squared[:-length]
+
+
+def _best_match(x, energy, template, start, count):
+    """在 x 中起点为 [start, start+count) 的窗口里找与 template 归一化互相关最大的位置"""
+    length = len(template)
+    start = min(max(start, 0), len(energy) - count)
+    score = np.correlate(x[start:start + count + length - 1], template, mode="valid")
+    score /= np.sqrt(energy[start:start + count] + 1e-9)
+    return start + int(np.argmax(score))
+
+
+def _wsola_positions(x, n_frames, frame_length, synthesis_hop, rate, tolerance, origin, decimation):
+    """
+    为每个输出帧在原信号中选取分析位置；第 k 帧的理想位置为 origin + (k-1)*synthesis_hop*rate
+    在理想位置 ±tolerance 范围内寻找与上一帧自然延续最相似（归一化互相关最大）的片段。
+    先在抽取 decimation 倍的信号上粗搜索，再在原采样率下 ±decimation 范围内精确定位
+    """
+    energy = _sliding_energy(x, frame_length)
+
+    coarse = x[:len(x) // decimation * decimation].reshape(-1, decimation).mean(axis=1)
+    coarse_length = frame_length // decimation
+    coarse_energy = _sliding_energy(coarse, coarse_length)
+    coarse_count = 2 * (tolerance // decimation) + 1
+
+    positions = np.empty(n_frames, dtype=np.int64)
+    # 第0帧的后半窗恰好覆盖原信号开头，使输出开头不被淡入
+    positions[0] = origin - synthesis_hop
+    for k in range(1, n_frames):
+        natural = positions[k - 1] + synthesis_hop
+        ideal = origin + int(round((k - 1) * synthesis_hop * rate))
+
+        candidate = natural // decimation
+        template = coarse[candidate:candidate + coarse_length]
+        if decimation > 1:
+            found = _best_match(coarse, coarse_energy, template,
+                                (ideal - tolerance) // decimation, coarse_count) * decimation
+            positions[k] = _best_match(x, energy, x[natural:natural + frame_length],
+                                       found - decimation, 2 * decimation + 1)
+        else:
+            positions[k] = _best_match(x, energy, template, ideal - tolerance, coarse_count)
+
+    return positions
+
+
+def overlap_add_half(frames, hop):
+    """按半帧跳距叠加 (n_frames, 2*hop) 的已加窗帧"""
+    n_frames = frames.shape[0]
+    out = np.zeros((n_frames + 1) * hop, dtype=frames.dtype)
+    out[:n_frames * hop] += frames[:, :hop].reshape(-1)
+    out[hop:] += frames[:, hop:].reshape(-1)
+    return out
+
+
+def hann_window(length):
+    """周期汉宁窗：在半帧跳距下叠加恒为1"""
+    return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(length) / length)).astype(np.float32)
+
+
+def wsola_time_stretch(y, rate, sr, frame_ms=30.0, tolerance_ms=10.0):
+    """
+    WSOLA（波形相似叠加）时间伸缩，保持音高改变时长
+    rate > 1 加快（时长变为 1/rate），与 librosa.effects.time_stretch 的 rate 含义一致
+    多声道输入 (channels, n) 使用同一组分析位置，保持声道间相位一致
+    """
+    y = np.asarray(y, dtype=np.float32)
+    if rate == 1.0 or y.shape[-1] == 0:
+        return y.copy()
+
+    frame_length = max(64, int(sr * frame_ms / 1000.0) // 2 * 2)
+    synthesis_hop = frame_length // 2
+    tolerance = max(1, int(sr * tolerance_ms / 1000.0))
+
+    channels = y if y.ndim > 1 else y[np.newaxis, :]
+    n_samples = channels.shape[1]
+    output_length = int(round(n_samples / rate))
+    # 多算一帧：输出从第0帧的后半窗开始，避免开头淡入
+    n_frames = output_length // synthesis_hop + 3
+
+    # 前端补零保证第0帧和搜索范围不越界，尾部补足最远搜索范围
+    origin = tolerance + synthesis_hop
+    needed = origin + int(np.ceil(n_frames * synthesis_hop * rate)) + frame_length + 2 * tolerance
+    padded = np.pad(channels, ((0, 0), (origin, max(0, needed - origin - n_samples))))
+
+    mono = padded.mean(axis=0) if padded.shape[0] > 1 else padded[0]
+    # 44.1k/48k 下粗搜索约在 11-12kHz 采样率上进行
+    decimation = max(1, sr // 11025)
+    positions = _wsola_positions(mono, n_frames, frame_length, synthesis_hop, rate, tolerance, origin,
+                                 decimation)
+
+    window = hann_window(frame_length)
+    index = positions[:, np.newaxis] + np.arange(frame_length)
+    result = np.stack([
+        overlap_add_half(padded[channel][index] * window, synthesis_hop)
+        for channel in range(padded.shape[0])
+    ])[:, synthesis_hop:synthesis_hop + output_length]
+
+    return result if y.ndim > 1 else result[0]
+
+
+def _kaiser_sinc_table(up, down, zero_crossings=16, beta=8.6):
+    """
+    生成多相低通滤波器系数表 (up, 2*half_width)
+    截止频率取输入、输出奈奎斯特频率中较低者，避免降采样时混叠
+    """
+    cutoff = min(1.0, up / down)
+    half_width = int(np.ceil(zero_crossings / cutoff))
+    phases = np.arange(up)[:, np.newaxis] / up
+    offsets = phases + half_width - 1 - np.arange(2 * half_width)[np.newaxis, :]
+    window = np.kaiser(2 * half_width + 1, beta)
+    # 对窗函数按实际偏移线性插值，保证每个相位都使用对称窗
+    window_values = np.interp(offsets, np.arange(-half_width, half_width + 1), window, left=0.0, right=0.0)
+    table = cutoff * np.sinc(cutoff * offsets) * window_values
+    return table.astype(np.float32), half_width
+
+
+def resample_poly(y, up, down, block_size=65536):
+    """
+    有理数倍率多相重采样（输出长度约为 len(y) * up / down），一次完成，无需分步
+    支持 (n,) 或 (channels, n) 输入；按块向量化计算以限制内存
+    """
+    y = np.asarray(y, dtype=np.float32)
+    if up == down:
+        return y.copy()
+
+    table, half_width = _kaiser_sinc_table(up, down)
+    channels = y if y.ndim > 1 else y[np.newaxis, :]
+    n_out = int(np.ceil(channels.shape[1] * up / down))
+    padded = np.pad(channels, ((0, 0), (half_width, half_width + 1)))
+    taps = np.arange(2 * half_width)
+
+    result = np.empty((channels.shape[0], n_out), dtype=np.float32)
+    for block_start in range(0, n_out, block_size):
+        m = np.arange(block_start, min(block_start + block_size, n_out), dtype=np.int64)
+        base, phase = np.divmod(m * down, up)
+        coefficients = table[phase]
+        index = base[:, np.newaxis] + 1 + taps
+        for channel in range(channels.shape[0]):
+            result[channel, m] = np.einsum("ij,ij->i", padded[channel][index], coefficients)
+
+    return result if y.ndim > 1 else result[0]
+
+
+def rational_ratio(factor, max_denominator=256):
+    """把浮点倍率近似为分数，返回 (up, down)"""
+    ratio = Fraction(factor).limit_denominator(max_denominator)
+    return ratio.numerator, ratio.denominator
+
+
+def _cepstral_envelope(magnitude, lifter):
+    """倒谱平滑得到频谱包络（magnitude 为 (frames, bins) 的幅度谱）"""
+    cepstrum = np.fft.irfft(np.log(magnitude + 1e-7), axis=-1)
+    cepstrum[:, lifter:-lifter] = 0.0
+    return np.exp(np.fft.rfft(cepstrum, axis=-1).real)
+
+
+def restore_formants(y, factor, sr, frame_ms=46.0, lifter_ms=1.5):
+    """
+    修正变调后的共振峰：音高改变 factor 倍时频谱包络也被拉伸了 factor 倍，
+    逐帧用倒谱包络把包络映射回原来的位置（频率 f 处的目标包络取当前包络在 f*factor 处的值）
+    """
+    y = np.asarray(y, dtype=np.float32)
+    channels = y if y.ndim > 1 else y[np.newaxis, :]
+
+    frame_length = max(256, int(sr * frame_ms / 1000.0) // 4 * 4)
+    hop = frame_length // 4
+    lifter = max(2, int(sr * lifter_ms / 1000.0))
+    window = hann_window(frame_length)
+    bins = np.arange(frame_length // 2 + 1)
+    warped_bins = np.clip(bins * factor, 0, bins[-1])
+
+    n_samples = channels.shape[1]
+    n_frames = int(np.ceil((n_samples + frame_length) / hop))
+    padded = np.pad(channels, ((0, 0), (frame_length, n_frames * hop + frame_length - n_samples)))
+    index = (np.arange(n_frames) * hop)[:, np.newaxis] + np.arange(frame_length)
+
+    # 汉宁窗分析+合成，四分之一帧跳距下窗平方和为常数 1.5
+    result = np.empty_like(channels)
+    for channel in range(channels.shape[0]):
+        spectrum = np.fft.rfft(padded[channel][index] * window, axis=-1)
+        envelope = _cepstral_envelope(np.abs(spectrum), lifter)
+        target = np.stack([np.interp(warped_bins, bins, frame) for frame in envelope])
+        gain = np.clip(target / (envelope + 1e-7), 0.0, 8.0)
+        frames = np.fft.irfft(spectrum * gain, frame_length, axis=-1).astype(np.float32) * window
+
+        out = np.zeros(padded.shape[1], dtype=np.float32)
+        for offset in range(4):
+            segment = frames[offset::4].reshape(-1)
+            start = offset * hop
+            out[start:start + len(segment)] += segment
+        result[channel] = out[frame_length:frame_length + n_samples] / 1.5
+
+    return result if y.ndim > 1 else result[0]
+
+
+def resample_pitch(y, factor, sr, preserve_formants=False):
+    """
+    通过一次多相重采样改变音高（时长同时变为 1/factor，与变速播放相同）
+    preserve_formants 为 True 时再修正频谱包络，减轻"花栗鼠"/"低沉"音色
+    """
+    up, down = rational_ratio(1.0 / factor)
+    shifted = resample_poly(y, up, down)
+    if preserve_formants:
+        shifted = restore_formants(shifted, factor, sr)
+    return shifted
+
+
+def _block_view(audio, block):
+    """把 (channels, n) 补零到 block 的整数倍后返回 (channels, n_blocks, block) 视图所需的数组"""
+    n_blocks = -(-audio.shape[1] // block)
+    padded = np.zeros((audio.shape[0], n_blocks * block), dtype=np.float32)
+    padded[:, :audio.shape[1]] = audio
+    return padded.reshape(audio.shape[0], n_blocks, block)
+
+
+def _sliding_min(values, behind, ahead):
+    """values[i-behind : i+ahead+1] 范围内的滑动最小值（向量化：错位数组逐个取最小）"""
+    padded = np.pad(values, (behind, ahead), mode="edge")
+    result = padded[:len(values)].copy()
+    for offset in range(1, behind + ahead + 1):
+        np.minimum(result, padded[offset:offset + len(values)], out=result)
+    return result
+
+
+def _apply_block_gain(channels, block_gain, block):
+    """
+    把逐块增益转换为逐采样增益曲线并原地相乘
+    块边界处取相邻两块的较小值，块内线性插值，因此任何采样点的增益都不超过所在块的增益
+    """
+    boundaries = np.minimum(np.concatenate(([block_gain[0]], block_gain)),
+                            np.concatenate((block_gain, [block_gain[-1]])))
+    positions = np.arange(channels.shape[1], dtype=np.float32) / block
+    curve = np.interp(positions, np.arange(len(boundaries), dtype=np.float32), boundaries).astype(np.float32)
+    channels *= curve
+
+
+def apply_dynamics(audio, sr, gain=1.0, limit=0.95, lookahead_ms=5.0, release_ms=60.0,
+                   compressor_threshold_db=None, compressor_ratio=4.0, compressor_window_ms=20.0):
+    """
+    一次完成的动态处理（原地修改 float32 数组，(n,) 或 (channels, n)，各声道共用同一条增益曲线）：
+    1. 线性增益
+    2. 可选压缩器：按块计算RMS电平，高于阈值的部分按 ratio 压缩，增益在窗口内平滑
+    3. 前瞻限幅器：块峰值超过 limit 的位置提前降低增益，并保持 release_ms 后再恢复，不产生削波失真
+    所有步骤都以块为单位向量化计算，不在Python中逐采样循环
+    """
+    if audio.dtype != np.float32:
+        raise TypeError("apply_dynamics 需要 float32 数组")
+    channels = audio if audio.ndim > 1 else audio[np.newaxis, :]
+    if channels.shape[1] == 0:
+        return audio
+
+    if gain != 1.0:
+        channels *= np.float32(gain)
+
+    block = max(16, int(sr * lookahead_ms / 1000.0))
+
+    if compressor_threshold_db is not None and compressor_ratio > 1.0:
+        blocks = _block_view(channels, block)
+        rms = np.sqrt(np.mean(np.square(blocks), axis=(0, 2)) + 1e-12)
+        level_db = 20.0 * np.log10(rms)
+        reduction_db = np.minimum(0.0, (compressor_threshold_db - level_db) * (1.0 - 1.0 / compressor_ratio))
+        # 滑动平均平滑增益变化，避免逐块跳变
+        width = max(1, int(round(compressor_window_ms / lookahead_ms)))
+        if width > 1:
+            kernel = np.ones(width) / width
+            reduction_db = np.convolve(np.pad(reduction_db, (width // 2, width - 1 - width // 2), mode="edge"),
+                                       kernel, mode="valid")
+        _apply_block_gain(channels, (10.0 ** (reduction_db / 20.0)).astype(np.float32), block)
+
+    peaks = np.abs(_block_view(channels, block)).max(axis=(0, 2))
+    if peaks.max() > limit:
+        required = np.minimum(1.0, limit / np.maximum(peaks, 1e-12)).astype(np.float32)
+        hold = max(1, int(round(release_ms / lookahead_ms)))
+        # 提前一块开始降低增益（前瞻），峰值过后保持 hold 块再恢复（释放）
+        _apply_block_gain(channels, _sliding_min(required, hold, 1), block)
+        # 块内插值保证不超过所需增益，这里仅消除浮点误差
+        np.clip(channels, -limit, limit, out=channels)
+
+    return audio
+
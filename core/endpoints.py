@@ -0,0 +1,41 @@
+import os
+
+# 远程服务地址；可整体指向本地替身服务器（standin/server.py）以便离线压测与性能分析
+DEFAULT_ENDPOINTS = {
+    "yukumo": "https://www.yukumo.net/#/",
+    "ltool": "https://www.ltool.net/chinese_simplified_and_traditional_characters_pinyin_to_katakana_converter_in_simplified_chinese.php",
+    "sljfaq": "https://www.sljfaq.org/cgi/e2k_ja.cgi",
+    "translation": "https://api.mymemory.translated.net/get",
+}
+
+# 替身服务器上对应的路径
+STANDIN_PATHS = {
+    "yukumo": "/yukumo/#/",
+    "ltool": "/ltool/",
+    "sljfaq": "/sljfaq/e2k_ja.cgi",
+    "translation": "/translation/get",
+}
+
+# 未在参数中指定时，从该环境变量读取替身服务器地址，例如 http://127.0.0.1:8765
+ENDPOINTS_ENV = "YUKKURI_ENDPOINT_BASE"
+
+
+def resolve_endpoints(config=None):
+    """
+    返回 {服务名: URL}
+    config 可以是替身服务器的基地址字符串（所有服务都指向它），也可以是只覆盖部分服务的字典；
+    为 None 时使用环境变量 YUKKURI_ENDPOINT_BASE，未设置则使用真实网站
+    """
+    if config is None:
+        config = os.environ.get(ENDPOINTS_ENV) or None
+
+    endpoints = dict(DEFAULT_ENDPOINTS)
+    if isinstance(config, str):
+        base = config.rstrip("/")
+        endpoints.update({name: base + path for name, path in STANDIN_PATHS.items()})
+    elif config:
+        unknown = set(config) - set(DEFAULT_ENDPOINTS)
+        if unknown:
+            raise ValueError(f"未知的服务名: {', '.join(sorted(unknown))}")
+        endpoints.update(config)
+    return endpoints
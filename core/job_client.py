@@ -0,0 +1,62 @@
+import json
+
+import requests
+
+
+class JobClient:
+    """本地任务服务器（core/job_server.py）的客户端"""
+
+    def __init__(self, base_url, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def health(self):
+        response = requests.get(f"{self.base_url}/health", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def submit(self, lines, settings, name=None, output_dir=None, priority=0):
+        """提交任务，返回任务摘要（含 id）"""
+        payload = dict(settings, lines=lines, name=name, output_dir=output_dir, priority=priority)
+        response = requests.post(f"{self.base_url}/jobs", json=payload, timeout=self.timeout)
+        if response.status_code != 201:
+            raise Exception(response.json().get("error", f"HTTP {response.status_code}"))
+        return response.json()
+
+    def status(self, job_id):
+        response = requests.get(f"{self.base_url}/jobs/{job_id}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def cancel(self, job_id):
+        requests.delete(f"{self.base_url}/jobs/{job_id}", timeout=self.timeout)
+
+    def events(self, job_id, last_event_id=0):
+        """
+        逐个产出 (事件类型, 数据) 直到任务结束；连接中断时从最后收到的事件续传
+        服务器的保活消息产出为 ("ping", None)，便于调用方定期检查停止标志
+        """
+        while True:
+            headers = {"Last-Event-ID": str(last_event_id)}
+            try:
+                with requests.get(f"{self.base_url}/jobs/{job_id}/events", headers=headers,
+                                  stream=True, timeout=(self.timeout, 60)) as response:
+                    response.raise_for_status()
+                    kind, data = None, None
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line.startswith("id: "):
+                            last_event_id = int(line[4:])
+                        elif line.startswith("event: "):
+                            kind = line[7:]
+                        elif line.startswith("data: "):
+                            data = json.loads(line[6:])
+                        elif line.startswith(":"):
+                            yield "ping", None
+                        elif line == "" and kind:
+                            if kind == "end":
+                                return
+                            yield kind, data
+                            kind, data = None, None
+            except (requests.ConnectionError, requests.Timeout):
+                # 服务器仍在运行但连接中断时续传；服务器已停止则向上报告
+                self.health()
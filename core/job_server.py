@@ -0,0 +1,465 @@
+"""
+本地任务服务器：多个客户端（GUI 或脚本）通过HTTP提交转换任务，共享一组预热的浏览器与音频处理线程
+
+    python -m core.job_server --port 8770 --workers 2
+
+接口（JSON）：
+    POST   /jobs                  提交任务 {"lines"|"text", "mode", "voice_type", "speed", ..., "priority", "name", "output_dir"}
+    GET    /jobs                  任务列表
+    GET    /jobs/<id>             任务状态、进度与结果文件
+    GET    /jobs/<id>/events      进度与日志的服务器推送事件流（SSE，支持 Last-Event-ID 续传）
+    GET    /jobs/<id>/files/<名>  下载结果文件
+    DELETE /jobs/<id>             取消任务
+    GET    /health                队列长度、浏览器池状态与内存占用
+
+output_dir 必须位于 --root 之内，除非启动时指定了 --allow-external-output
+"""
+import argparse
+import itertools
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from core.audio_codec import OUTPUT_FORMATS
+from core.audio_processor import DEFAULT_QUALITY_PRESET, QUALITY_PRESETS, STRETCH_ALGORITHMS
+from core.async_engine import AsyncConversionEngine
+from core.driver_pool import DriverPool
+from core.memory_governor import MemoryGovernor
+from services.text_processor import AUTO_CHINESE_MODES, AUTO_MODE
+
+DEFAULT_PORT = 8770
+DEFAULT_ROOT = os.path.join(os.path.expanduser("~"), ".yukkuri_converter", "jobs")
+MODES = ("中文Yukkuri", "英文Yukkuri", "日文Yukkuri", "中文翻译日文Yukkuri", AUTO_MODE)
+
+# 客户端可以设置的任务参数及默认值
+JOB_DEFAULTS = {
+    "mode": "日文Yukkuri",
+    "auto_chinese_mode": "中文Yukkuri",  # 自动识别模式中中文行的转换方式
+    "voice_type": "aqtk1-f1",
+    "speed": 100,
+    "volume": 100,
+    "pitch": 100,
+    "quality_preset": DEFAULT_QUALITY_PRESET,
+    "output_format": None,  # None 表示由质量预设决定
+    "stretch_algorithm": None,
+    "preserve_formants": False,
+    "generate_lrc": True,
+    "lrc_segments": False,
+    "incremental": False,
+}
+
+
+class Job:
+    """单个转换任务的状态；事件（日志、进度、状态）按序号保存，供轮询与SSE续传"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+    def __init__(self, job_id, settings, lines, name, output_dir, priority):
+        self.id = job_id
+        self.settings = settings
+        self.lines = lines
+        self.name = name
+        self.output_dir = output_dir
+        self.priority = priority
+        self.status = self.QUEUED
+        self.progress = 0.0
+        self.progress_text = ""
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = False
+        self.result = None
+        self.events = []
+        self.condition = threading.Condition()
+
+    def emit(self, kind, data):
+        with self.condition:
+            self.events.append((len(self.events) + 1, kind, data))
+            self.condition.notify_all()
+
+    def events_after(self, last_id, timeout):
+        """返回序号大于 last_id 的事件；没有新事件时最多等待 timeout 秒"""
+        with self.condition:
+            if len(self.events) <= last_id and self.status not in self.FINISHED:
+                self.condition.wait(timeout)
+            return self.events[last_id:]
+
+    def set_status(self, status):
+        self.status = status
+        if status == self.RUNNING:
+            self.started = time.time()
+        elif status in self.FINISHED:
+            self.finished = time.time()
+        self.emit("status", {"status": status})
+
+    def files(self):
+        if not os.path.isdir(self.output_dir):
+            return []
+        return sorted(name for name in os.listdir(self.output_dir)
+                      if not name.startswith(".") and os.path.isfile(os.path.join(self.output_dir, name)))
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "priority": self.priority,
+            "lines": len(self.lines),
+            "progress": round(self.progress, 1),
+            "progress_text": self.progress_text,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+    def details(self):
+        data = self.summary()
+        data.update({
+            "settings": self.settings,
+            "output_dir": self.output_dir,
+            "files": self.files() if self.status in self.FINISHED else [],
+            "result": self.result,
+            "log": [event[2]["message"] for event in self.events if event[1] == "log"][-50:],
+        })
+        return data
+
+
+class JobServer(ThreadingHTTPServer):
+    """
+    按优先级排队执行任务（priority 越大越先执行，相同优先级先到先执行）
+    workers 个工作线程各持有一个 ConversionEngine（经 asyncio 调度层执行，取消后一秒内结束），
+    共享同一个浏览器池；librosa 在启动时预热一次
+    memory_budget_mb 为进程树（含浏览器与 ffmpeg）的内存预算，超出时暂停新的行进入合成/音频阶段
+    allow_external_output 为 False 时拒绝 root_dir 之外的 output_dir（客户端不能借此写入任意目录）
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, root_dir=DEFAULT_ROOT, workers=1,
+                 browser_type="自动检测", endpoints=None, max_finished_jobs=200, log_callback=print,
+                 memory_budget_mb=None, allow_external_output=False):
+        super().__init__((host, port), _Handler)
+        self.root_dir = root_dir
+        self.allow_external_output = allow_external_output
+        self.endpoints = endpoints
+        self.max_finished_jobs = max_finished_jobs
+        self.log_callback = log_callback
+        os.makedirs(root_dir, exist_ok=True)
+
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+        self.queue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+        self.engines = [AsyncConversionEngine() for _ in range(workers)]
+        self.memory_governor = MemoryGovernor(memory_budget_mb)
+        self.driver_pool = DriverPool(self.engines[0].engine.browser_manager, root_dir, workers, browser_type,
+                                      self.memory_governor)
+        self.workers = []
+
+    def start_workers(self):
+        self._warm_up()
+        for engine in self.engines:
+            worker = threading.Thread(target=self._worker_loop, args=(engine,), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def _warm_up(self):
+        """提前完成 librosa/numba 的首次编译，避免第一个任务承担这部分开销"""
+        import numpy as np
+        try:
+            import librosa
+            tone = np.sin(np.linspace(0, 2000 * np.pi, 22050)).astype(np.float32)
+            librosa.effects.time_stretch(tone, rate=1.2)
+            librosa.effects.pitch_shift(tone, sr=22050, n_steps=1)
+        except Exception as e:
+            self.log_callback(f"音频处理预热失败: {str(e)}")
+
+    def submit(self, request):
+        """校验请求并加入队列，返回 Job"""
+        lines = request.get("lines")
+        if lines is None:
+            lines = str(request.get("text", "")).splitlines()
+        lines = [str(line).strip() for line in lines if str(line).strip()]
+        if not lines:
+            raise ValueError("任务文本为空")
+
+        settings = {key: request.get(key, default) for key, default in JOB_DEFAULTS.items()}
+        if settings["mode"] not in MODES:
+            raise ValueError(f"未知的转换模式: {settings['mode']}")
+        if settings["auto_chinese_mode"] not in AUTO_CHINESE_MODES:
+            raise ValueError(f"未知的中文行转换方式: {settings['auto_chinese_mode']}")
+        if settings["quality_preset"] not in QUALITY_PRESETS:
+            raise ValueError(f"未知的质量预设: {settings['quality_preset']}")
+        if settings["output_format"] is not None and settings["output_format"] not in OUTPUT_FORMATS:
+            raise ValueError(f"未知的输出格式: {settings['output_format']}")
+        if settings["stretch_algorithm"] is not None and settings["stretch_algorithm"] not in STRETCH_ALGORITHMS:
+            raise ValueError(f"未知的变速算法: {settings['stretch_algorithm']}")
+        for key, low, high in (("speed", 50, 300), ("volume", 0, 300), ("pitch", 20, 200)):
+            settings[key] = int(settings[key])
+            if not low <= settings[key] <= high:
+                raise ValueError(f"{key} 超出范围 {low}-{high}")
+
+        job_id = uuid.uuid4().hex[:12]
+        name = re.sub(r'[\\/*?:"<>|]', "", str(request.get("name") or f"job-{job_id}"))[:80] or f"job-{job_id}"
+        output_dir = self._output_dir(request.get("output_dir")) or os.path.join(self.root_dir, job_id, "out")
+        job = Job(job_id, settings, lines, name, output_dir, int(request.get("priority", 0)))
+
+        with self.jobs_lock:
+            self.jobs[job_id] = job
+            self._prune_finished()
+        self.queue.put((-job.priority, next(self.sequence), job_id))
+        job.emit("status", {"status": job.status, "queue_position": self.queue.qsize()})
+        self.log_callback(f"任务 {job_id} 已排队（{len(lines)} 行，优先级 {job.priority}）")
+        return job
+
+    def _output_dir(self, output_dir):
+        """解析客户端指定的输出目录（符号链接、".." 均展开后再检查）"""
+        if not output_dir:
+            return None
+        if not isinstance(output_dir, str):
+            raise ValueError("output_dir 必须是字符串")
+        resolved = os.path.realpath(output_dir)
+        root = os.path.realpath(self.root_dir)
+        if not self.allow_external_output:
+            try:
+                inside = os.path.commonpath([resolved, root]) == root
+            except ValueError:
+                # Windows 上位于不同盘符
+                inside = False
+            if not inside:
+                raise ValueError(f"输出目录必须位于任务工作目录 {root} 之内")
+        return resolved
+
+    def cancel(self, job):
+        job.cancel_requested = True
+        if job.status == Job.QUEUED:
+            job.set_status(Job.CANCELLED)
+
+    def _prune_finished(self):
+        finished = sorted((job for job in self.jobs.values() if job.status in Job.FINISHED),
+                          key=lambda job: job.finished)
+        for job in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job.id]
+
+    def _worker_loop(self, engine):
+        while True:
+            _, _, job_id = self.queue.get()
+            with self.jobs_lock:
+                job = self.jobs.get(job_id)
+            if job is None or job.status != Job.QUEUED:
+                continue
+            self._run_job(engine, job)
+
+    def _run_job(self, engine, job):
+        job_dir = os.path.join(self.root_dir, job.id)
+        os.makedirs(job_dir, exist_ok=True)
+        os.makedirs(job.output_dir, exist_ok=True)
+        # 输入文件名决定LRC文件名
+        input_file = os.path.join(job_dir, f"{job.name}.txt")
+        with open(input_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(job.lines))
+
+        def log(message):
+            job.emit("log", {"message": message, "time": time.time()})
+
+        def progress(value, text):
+            job.progress, job.progress_text = value, text
+            job.emit("progress", {"progress": value, "text": text})
+
+        params = dict(job.settings)
+        params.update({
+            "input_file": input_file,
+            "output_dir": job.output_dir,
+            "browser_type": self.driver_pool.browser_type,
+            "driver_pool": self.driver_pool,
+            "memory_governor": self.memory_governor,
+            "endpoints": self.endpoints,
+            "log_callback": log,
+            "progress_callback": progress,
+            "status_callback": lambda text: None,
+            "stop_flag": lambda: job.cancel_requested,
+        })
+
+        job.set_status(Job.RUNNING)
+        self.log_callback(f"任务 {job.id} 开始执行")
+        try:
+            ok = engine.run_conversion_blocking(params)
+        except Exception as e:
+            log(f"任务执行出错: {str(e)}")
+            ok = False
+        job.result = params.get("result")
+
+        if job.cancel_requested:
+            job.set_status(Job.CANCELLED)
+        else:
+            job.set_status(Job.DONE if ok else Job.FAILED)
+        self.log_callback(f"任务 {job.id} 结束: {job.status}")
+
+    def health(self):
+        with self.jobs_lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        rss = self.memory_governor.rss(max_age=1.0)
+        return {
+            "jobs": counts,
+            "queued": self.queue.qsize(),
+            "drivers": self.driver_pool.stats(),
+            "memory": {
+                "rss_mb": round(rss / 1048576, 1) if rss is not None else None,
+                "budget_mb": self.memory_governor.budget / 1048576 if self.memory_governor.budget else None,
+                "throttled": self.memory_governor.throttled,
+                "stages": self.memory_governor.report(),
+            },
+        }
+
+    def shutdown_all(self):
+        self.shutdown()
+        self.driver_pool.close()
+        self.memory_governor.close()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "YukkuriJobServer/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _job(self, job_id):
+        with self.server.jobs_lock:
+            job = self.server.jobs.get(job_id)
+        if job is None:
+            self._send_json(404, {"error": "任务不存在"})
+        return job
+
+    def do_GET(self):
+        parts = [unquote(part) for part in urlsplit(self.path).path.strip("/").split("/") if part]
+        if parts == ["health"]:
+            return self._send_json(200, self.server.health())
+        if parts == ["jobs"]:
+            with self.server.jobs_lock:
+                jobs = sorted(self.server.jobs.values(), key=lambda job: job.submitted)
+            return self._send_json(200, [job.summary() for job in jobs])
+        if len(parts) >= 2 and parts[0] == "jobs":
+            job = self._job(parts[1])
+            if job is None:
+                return
+            if len(parts) == 2:
+                return self._send_json(200, job.details())
+            if parts[2:] == ["events"]:
+                return self._stream_events(job)
+            if len(parts) == 4 and parts[2] == "files":
+                return self._send_file(job, parts[3])
+        self._send_json(404, {"error": "接口不存在"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path.rstrip("/") != "/jobs":
+            return self._send_json(404, {"error": "接口不存在"})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+            job = self.server.submit(request)
+        except (ValueError, TypeError) as e:
+            return self._send_json(400, {"error": str(e)})
+        self._send_json(201, job.summary())
+
+    def do_DELETE(self):
+        parts = [part for part in urlsplit(self.path).path.strip("/").split("/") if part]
+        if len(parts) != 2 or parts[0] != "jobs":
+            return self._send_json(404, {"error": "接口不存在"})
+        job = self._job(parts[1])
+        if job is not None:
+            self.server.cancel(job)
+            self._send_json(200, job.summary())
+
+    def _stream_events(self, job):
+        """SSE：先补发 Last-Event-ID 之后的事件，再持续推送直到任务结束"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        last_id = int(self.headers.get("Last-Event-ID") or 0)
+        try:
+            while True:
+                events = job.events_after(last_id, timeout=2)
+                for event_id, kind, data in events:
+                    payload = json.dumps(data, ensure_ascii=False)
+                    self.wfile.write(f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n".encode("utf-8"))
+                    last_id = event_id
+                if not events:
+                    # 保活注释行，避免代理或客户端超时
+                    self.wfile.write(b": keep-alive\n\n")
+                self.wfile.flush()
+                if job.status in Job.FINISHED and last_id >= len(job.events):
+                    self.wfile.write(b"event: end\ndata: {}\n\n")
+                    self.wfile.flush()
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def _send_file(self, job, name):
+        if name not in job.files():
+            return self._send_json(404, {"error": "文件不存在"})
+        path = os.path.join(job.output_dir, name)
+        with open(path, "rb") as f:
+            data = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Yukkuri音频转换本地任务服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="任务工作目录（未指定输出目录的任务结果也放在这里）")
+    parser.add_argument("--workers", type=int, default=1, help="并行执行的任务数（即共享浏览器数量）")
+    parser.add_argument("--browser", default="自动检测", choices=["自动检测", "Chrome", "Edge", "Firefox"])
+    parser.add_argument("--endpoints", default=None, help="替身服务器基地址（默认访问真实网站）")
+    parser.add_argument("--memory-budget", type=int, default=None,
+                        help="内存预算（MB，含浏览器与ffmpeg子进程），超出时暂停新的行")
+    parser.add_argument("--allow-external-output", action="store_true",
+                        help="允许任务把结果写到 --root 之外的 output_dir")
+    args = parser.parse_args(argv)
+
+    def log(message):
+        print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+    server = JobServer(args.host, args.port, args.root, args.workers, args.browser, args.endpoints,
+                       log_callback=log, memory_budget_mb=args.memory_budget,
+                       allow_external_output=args.allow_external_output)
+    server.start_workers()
+    log(f"任务服务器已启动: http://{args.host}:{server.server_address[1]}（{args.workers} 个工作线程）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown_all()
+
+
+if __name__ == "__main__":
+    main()
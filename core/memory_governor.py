@@ -0,0 +1,215 @@
+import itertools
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+def _proc_children(pid):
+    """Linux 下不依赖 psutil 递归列出子进程"""
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        return []
+    for child in list(children):
+        children.extend(_proc_children(child))
+    return children
+
+
+def _proc_rss(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def process_tree_rss():
+    """
+    本进程及全部子进程（浏览器、浏览器驱动、ffmpeg）的常驻内存总和（字节）
+    优先使用 psutil；未安装时在 Linux 下读取 /proc，其他平台返回 None
+    """
+    try:
+        import psutil
+    except ImportError:
+        if not os.path.exists("/proc/self/status"):
+            return None
+        pid = os.getpid()
+        return sum(_proc_rss(p) for p in [pid] + _proc_children(pid))
+
+    process = psutil.Process()
+    total = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total
+
+
+# 阶段名（与 ThroughputTracker 的阶段一致）对应的显示名称
+STAGE_LABELS = {"synthesis": "合成", "audio": "音频处理"}
+
+
+class MemoryGovernor:
+    """
+    内存预算调度：定期统计进程树的常驻内存，超出预算时暂停新的行进入合成/音频阶段，
+    直到内存回落（至少允许一个阶段在执行，避免全部等待）；同时记录各阶段的内存峰值：
+    进程树RSS峰值，以及 tracemalloc 统计的 Python 侧分配峰值（多个阶段并发时为近似值）
+    tracemalloc 会明显拖慢音频处理，因此只对抽样的阶段开启：每个阶段的前 trace_first 次及之后每 trace_every 次
+    多个任务共用一个调度器时，各任务传入自己的 usage 字典单独统计
+    """
+
+    def __init__(self, budget_mb=None, poll_interval=0.5, trace_python=True, trace_first=3, trace_every=10,
+                 rss_reader=process_tree_rss):
+        self.budget = budget_mb * 1024 * 1024 if budget_mb else None
+        self.poll_interval = poll_interval
+        self.rss_reader = rss_reader
+        self.condition = threading.Condition()
+        self.running = {}  # 执行中的阶段: 编号 -> (阶段名, usage)
+        self.stage_peaks = {}  # 阶段名 -> {"rss": 字节, "python": 字节, "count": 次数}
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+        self.peak_rss = 0
+        self._ids = itertools.count()
+        self._last_rss = None
+        self._last_sample = 0.0
+        self.trace_python = trace_python
+        self.trace_first = trace_first
+        self.trace_every = trace_every
+        self._stage_counts = {}
+        self._tracing = 0  # 正在抽样统计的阶段数
+        # 外部已经开启 tracemalloc 时每个阶段都统计，且不由这里停止
+        self._external_tracing = tracemalloc.is_tracing()
+
+        # 后台采样，记录阶段执行过程中的RSS峰值
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+        self._sampler.start()
+
+    def _sample_loop(self):
+        while not self._stopped.wait(self.poll_interval):
+            rss = self.rss()
+            with self.condition:
+                if rss is not None:
+                    for stage, usage in self.running.values():
+                        self._record(self.stage_peaks, stage, rss=rss)
+                        if usage is not None:
+                            self._record(usage, stage, rss=rss)
+                self.condition.notify_all()
+
+    @staticmethod
+    def _record(peaks_by_stage, stage, rss=0, python=0, count=0):
+        peaks = peaks_by_stage.setdefault(stage, {"rss": 0, "python": 0, "count": 0})
+        peaks["rss"] = max(peaks["rss"], rss)
+        peaks["python"] = max(peaks["python"], python)
+        peaks["count"] += count
+
+    def rss(self, max_age=0.0):
+        """进程树RSS（字节）；max_age 秒内的读数直接复用，无法读取时返回 None"""
+        now = time.time()
+        if self._last_rss is None or now - self._last_sample > max_age:
+            self._last_rss = self.rss_reader()
+            self._last_sample = now
+            if self._last_rss is not None:
+                self.peak_rss = max(self.peak_rss, self._last_rss)
+        return self._last_rss
+
+    def over_budget(self):
+        if self.budget is None:
+            return False
+        rss = self.rss(max_age=self.poll_interval / 2)
+        return rss is not None and rss > self.budget
+
+    @contextmanager
+    def admit(self, stage, stop_flag=None, log_callback=None, usage=None):
+        """进入一个阶段：超出预算且已有阶段在执行时等待，退出时记录该阶段的内存峰值"""
+        waited_since = None
+        with self.condition:
+            while self.running and self.over_budget():
+                if stop_flag and stop_flag():
+                    break
+                if waited_since is None:
+                    waited_since = time.time()
+                    self.throttled += 1
+                    if log_callback:
+                        log_callback(f"内存占用 {self._last_rss / 1048576:.0f}MB 超出预算 "
+                                     f"{self.budget / 1048576:.0f}MB，暂停新的{STAGE_LABELS.get(stage, stage)}任务")
+                self.condition.wait(self.poll_interval)
+            if waited_since is not None:
+                self.throttled_seconds += time.time() - waited_since
+            entry = next(self._ids)
+            self.running[entry] = (stage, usage)
+            traced = self._start_trace(stage)
+
+        python_start = 0
+        if traced:
+            python_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            python_peak = tracemalloc.get_traced_memory()[1] - python_start if traced else 0
+            rss = self.rss() or 0
+            with self.condition:
+                del self.running[entry]
+                if traced:
+                    self._stop_trace()
+                self._record(self.stage_peaks, stage, rss, python_peak, 1)
+                if usage is not None:
+                    self._record(usage, stage, rss, python_peak, 1)
+                self.condition.notify_all()
+
+    def _start_trace(self, stage):
+        """决定本次阶段是否统计 Python 分配（调用时持有 self.condition）"""
+        if self._external_tracing:
+            return True
+        count = self._stage_counts.get(stage, 0)
+        self._stage_counts[stage] = count + 1
+        if not self.trace_python or (count >= self.trace_first and count % self.trace_every):
+            return False
+        if self._tracing == 0:
+            tracemalloc.start()
+        self._tracing += 1
+        return True
+
+    def _stop_trace(self):
+        if self._external_tracing:
+            return
+        self._tracing -= 1
+        if self._tracing == 0:
+            tracemalloc.stop()
+
+    def report(self, usage=None):
+        """各阶段的内存峰值（MB）；usage 为某个任务的统计，默认为全部任务"""
+        with self.condition:
+            return {
+                stage: {
+                    "rss_mb": round(peaks["rss"] / 1048576, 1),
+                    "python_mb": round(peaks["python"] / 1048576, 1),
+                    "count": peaks["count"],
+                }
+                for stage, peaks in (self.stage_peaks if usage is None else usage).items()
+            }
+
+    def summary(self, usage=None):
+        parts = [f"{STAGE_LABELS.get(stage, stage)} RSS峰值 {data['rss_mb']:.0f}MB / "
+                 f"Python分配峰值 {data['python_mb']:.1f}MB"
+                 for stage, data in sorted(self.report(usage).items())]
+        text = "内存统计: " + ("，".join(parts) if parts else "无")
+        if self.peak_rss:
+            text += f"；进程树峰值 {self.peak_rss / 1048576:.0f}MB"
+        if self.budget is not None:
+            text += (f"（预算 {self.budget / 1048576:.0f}MB，限流 {self.throttled} 次，"
+                     f"共等待 {self.throttled_seconds:.1f} 秒）")
+        return text
+
+    def close(self):
+        self._stopped.set()
@@ -0,0 +1,166 @@
+import glob
+import math
+import os
+import threading
+import time
+
+from core.cancellation import cancellable_sleep
+
+# 条件轮询间隔（秒）：页面条件每次检查是一个 WebDriver 往返，下载文件只检查本地目录
+POLL_INTERVAL = 0.05
+DOWNLOAD_POLL_INTERVAL = 0.1
+# 浏览器下载中的临时文件后缀（Chrome / Firefox）
+PARTIAL_SUFFIXES = (".crdownload", ".part")
+
+# 定位器以 "/" 开头时按 XPath 查找，否则按 CSS 选择器
+_FIND = """
+function find(locator) {
+  if (locator.charAt(0) === '/') {
+    return document.evaluate(locator, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+  }
+  return document.querySelector(locator);
+}
+"""
+
+# 一次往返完成：填写输入框（通过原生 setter 并触发 input/change 事件，使 Vue 等框架的绑定同步更新）并点击按钮；
+# 元素尚未出现或不可用时不做任何事并返回 false，可以安全地重复调用；点击前在 window 上做标记，
+# 表单提交跳转后的新页面没有该标记，据此区分结果页与提交前的旧页面
+FILL_AND_CLICK_SCRIPT = _FIND + """
+var input = find(arguments[0]), button = find(arguments[2]);
+if (!input || !button || input.disabled || button.disabled) { return false; }
+var proto = input.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+Object.getOwnPropertyDescriptor(proto, 'value').set.call(input, arguments[1]);
+input.dispatchEvent(new Event('input', {bubbles: true}));
+input.dispatchEvent(new Event('change', {bubbles: true}));
+window.__yukkuriSubmitted = true;
+button.click();
+return true;
+"""
+
+# 一次往返完成下拉框选择并返回选中后的值；下拉框或选项尚未出现时返回 null
+SELECT_OPTION_SCRIPT = _FIND + """
+var select = find(arguments[0]), value = arguments[1];
+if (!select) { return null; }
+for (var i = 0; i < select.options.length; i++) {
+  if (select.options[i].value === value) {
+    select.value = value;
+    select.dispatchEvent(new Event('change', {bubbles: true}));
+    return select.value;
+  }
+}
+return null;
+"""
+
+# 读取元素文本：元素不存在、要求可见而不可见、或要求新页面而仍是提交前的页面时返回 null，
+# 否则返回 [文本]（文本为空时也是真值）
+READ_TEXT_SCRIPT = _FIND + """
+if (arguments[2] && window.__yukkuriSubmitted) { return null; }
+var element = find(arguments[0]);
+if (!element) { return null; }
+if (arguments[1] && !(element.offsetWidth || element.offsetHeight || element.getClientRects().length)) { return null; }
+return [element.innerText];
+"""
+
+
+def wait_until(condition, timeout, poll_interval=POLL_INTERVAL, description="条件"):
+    """
+    反复检查 condition()，返回第一个真值；条件中抛出的异常（如页面跳转中执行脚本失败）视为尚未满足
+    超时抛出 TimeoutError（附最后一次异常），等待可被取消
+    """
+    end_time = time.monotonic() + timeout
+    last_error = None
+    while True:
+        try:
+            value = condition()
+            if value:
+                return value
+        except Exception as e:
+            last_error = e
+        remaining = end_time - time.monotonic()
+        if remaining <= 0:
+            detail = f"：{last_error}" if last_error is not None else ""
+            raise TimeoutError(f"等待{description}超时（{timeout}秒）{detail}")
+        cancellable_sleep(min(poll_interval, remaining))
+
+
+def timed_script(driver, script, *args, timing=None):
+    """执行一次脚本；timing 若提供则记录本次往返耗时（timing["rtt"]）"""
+    start = time.monotonic()
+    result = driver.execute_script(script, *args)
+    if timing is not None:
+        timing["rtt"] = time.monotonic() - start
+    return result
+
+
+def snapshot_downloads(directory, pattern="*.mp3"):
+    return set(glob.glob(os.path.join(directory, pattern)))
+
+
+def wait_for_download(directory, existing, timeout=30, pattern="*.mp3"):
+    """
+    等待目录中出现 existing 之外的新文件并且下载完成：没有对应的浏览器临时文件、非空、
+    连续两次检查大小不变；返回文件路径，超时抛出 TimeoutError
+    """
+    sizes = {}
+
+    def finished():
+        for path in snapshot_downloads(directory, pattern) - existing:
+            if any(os.path.exists(path + suffix) for suffix in PARTIAL_SUFFIXES):
+                continue
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            if size > 0 and sizes.get(path) == size:
+                return path
+            sizes[path] = size
+        return None
+
+    return wait_until(finished, timeout, DOWNLOAD_POLL_INTERVAL, "下载完成")
+
+
+def poll_rounding(elapsed, interval, check_first=False):
+    """按固定间隔轮询时，条件满足后到被发现之前多等的时间（check_first：第一次检查不等待，如 WebDriverWait）"""
+    rounded = math.ceil(elapsed / interval) * interval
+    return (rounded if check_first else max(interval, rounded)) - elapsed
+
+
+class WaitLedger:
+    """
+    按阶段与行号累计条件等待相对原先固定等待节省的时间（秒，估计值）：
+    省去的固定 sleep + 按固定间隔轮询多等的时间 + 合并掉的 WebDriver 往返次数 × 实测往返耗时
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._saved = {}
+
+    def record(self, stage, line_num, seconds):
+        with self._lock:
+            key = (stage, line_num)
+            self._saved[key] = self._saved.get(key, 0.0) + max(0.0, seconds)
+
+    def clear(self):
+        with self._lock:
+            self._saved = {}
+
+    def per_line(self, stage):
+        """{行号: 节省的秒数}"""
+        with self._lock:
+            return {line_num: round(seconds, 3) for (name, line_num), seconds in self._saved.items()
+                    if name == stage}
+
+    def total(self, stage=None):
+        with self._lock:
+            return sum(seconds for (name, _), seconds in self._saved.items() if stage is None or name == stage)
+
+    def summary(self):
+        synthesis = self.per_line("synthesis")
+        parts = []
+        if synthesis:
+            parts.append(f"合成 {len(synthesis)} 行共 {sum(synthesis.values()):.1f} 秒"
+                         f"（平均每行 {sum(synthesis.values()) / len(synthesis):.2f} 秒）")
+        text = self.total("text")
+        if text:
+            parts.append(f"文本转换 {text:.1f} 秒")
+        return f"条件等待比固定等待节省约: {'，'.join(parts)}" if parts else None
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+
+
+class RenderManifest:
+    """记录上次渲染的逐行信息，用于增量重新渲染"""
+
+    VERSION = 1
+
+    def __init__(self, output_dir, base_name):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, f".{base_name}.render.json")
+        self.entries = []
+
+    @staticmethod
+    def line_key(line, *settings):
+        """根据行文本与渲染设置（模式、声种、音频参数、输出格式等）计算哈希"""
+        payload = json.dumps([line] + list(settings), ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def load(self):
+        """读取清单文件，不存在或格式不符时视为空清单"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.entries = []
+            return self
+
+        if data.get("version") != self.VERSION:
+            self.entries = []
+        else:
+            self.entries = data.get("lines", [])
+        return self
+
+    def save(self, entries):
+        """写入本次渲染的结果（先写临时文件再替换）"""
+        self.entries = entries
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "lines": entries}, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.path)
+
+    def plan(self, keys):
+        """
+        对比新旧行哈希，返回 (可复用的旧条目映射 {新行号: 旧条目}, 需要删除的旧文件列表)
+        行号均从0开始；文件已丢失的旧条目不会被复用
+        """
+        available = {}
+        for entry in self.entries:
+            file_path = os.path.join(self.output_dir, entry["file"])
+            if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+                available.setdefault(entry["key"], []).append(entry)
+
+        reuse = {}
+        # 优先复用行号也未改变的条目，其余按出现顺序分配
+        for idx, key in enumerate(keys):
+            candidates = available.get(key, [])
+            for candidate in candidates:
+                if candidate["index"] == idx:
+                    reuse[idx] = candidate
+                    candidates.remove(candidate)
+                    break
+
+        for idx, key in enumerate(keys):
+            if idx in reuse:
+                continue
+            candidates = available.get(key, [])
+            if candidates:
+                reuse[idx] = candidates.pop(0)
+
+        reused_files = {entry["file"] for entry in reuse.values()}
+        stale_files = [
+            os.path.join(self.output_dir, entry["file"])
+            for entry in self.entries
+            if entry["file"] not in reused_files
+        ]
+        return reuse, stale_files
+
+    def relocate(self, reuse, target_names, log_callback):
+        """
+        把复用的旧文件重命名为新行号对应的文件名
+        分两步进行（先改为临时名再改为目标名），避免行号移动时互相覆盖
+        返回 {新行号: 新文件路径}
+        """
+        staged = {}
+        for idx, entry in reuse.items():
+            source = os.path.join(self.output_dir, entry["file"])
+            if entry["file"] == target_names[idx]:
+                staged[idx] = source
+                continue
+            temp_path = os.path.join(self.output_dir, f".reuse-{idx}-{entry['file']}")
+            os.replace(source, temp_path)
+            staged[idx] = temp_path
+
+        relocated = {}
+        for idx, temp_path in staged.items():
+            target = os.path.join(self.output_dir, target_names[idx])
+            if temp_path != target:
+                os.replace(temp_path, target)
+                log_callback(f"复用第{reuse[idx]['index'] + 1}行音频为第{idx + 1}行: {target_names[idx]}")
+            relocated[idx] = target
+        return relocated
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zipfile
+
+from core.cancellation import cancellable_sleep
+
+
+class InteractionArchive:
+    """
+    远程交互存档（zip）：interactions.json 记录每次请求的输入、结果与耗时，
+    合成的音频按内容哈希存为 audio/<sha256>.mp3（相同音频只存一份，不再压缩）
+    """
+
+    VERSION = 1
+    INDEX_NAME = "interactions.json"
+
+    def __init__(self, path):
+        self.path = path
+        self.records = []
+        self.audio = {}
+        self.lock = threading.Lock()
+        self._by_key = {}
+        self._cursors = {}
+
+    @staticmethod
+    def request_key(kind, *inputs):
+        payload = json.dumps([kind] + list(inputs), ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def load(self):
+        """读取存档；音频按需从zip中读取"""
+        with zipfile.ZipFile(self.path) as archive:
+            data = json.loads(archive.read(self.INDEX_NAME).decode("utf-8"))
+        if data.get("version") != self.VERSION:
+            raise ValueError(f"不支持的回放存档版本: {data.get('version')}")
+        self.records = data["records"]
+        self._by_key = {}
+        for record in self.records:
+            self._by_key.setdefault(record["key"], []).append(record)
+        self._cursors = {}
+        return self
+
+    def add(self, kind, inputs, elapsed, result=None, audio=None, error=None):
+        """追加一条交互记录（audio 为音频字节）"""
+        record = {
+            "kind": kind,
+            "key": self.request_key(kind, *inputs),
+            "inputs": list(inputs),
+            "elapsed": round(elapsed, 4),
+            "result": result,
+            "error": error,
+        }
+        if audio is not None:
+            digest = hashlib.sha256(audio).hexdigest()
+            record["audio"] = f"audio/{digest}.mp3"
+            with self.lock:
+                self.audio[record["audio"]] = audio
+        with self.lock:
+            self.records.append(record)
+            self._by_key.setdefault(record["key"], []).append(record)
+
+    def save(self):
+        """写入zip（先写临时文件再替换）"""
+        temp_path = self.path + ".tmp"
+        with self.lock:
+            records = list(self.records)
+            audio = dict(self.audio)
+        with zipfile.ZipFile(temp_path, "w") as archive:
+            archive.writestr(
+                self.INDEX_NAME,
+                json.dumps({"version": self.VERSION, "records": records}, ensure_ascii=False),
+                compress_type=zipfile.ZIP_DEFLATED
+            )
+            for name, data in audio.items():
+                archive.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+        os.replace(temp_path, self.path)
+
+    def take(self, kind, *inputs):
+        """
+        按记录顺序取出与请求匹配的交互；同一请求出现多次时依次返回，用完后重复返回最后一条
+        没有记录时返回 None
+        """
+        key = self.request_key(kind, *inputs)
+        with self.lock:
+            matches = self._by_key.get(key)
+            if not matches:
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            return matches[min(cursor, len(matches) - 1)]
+
+    def read_audio(self, record):
+        with zipfile.ZipFile(self.path) as archive:
+            return archive.read(record["audio"])
+
+
+class _ReplayDriver:
+    """回放模式下代替浏览器驱动的占位对象"""
+
+    def quit(self):
+        pass
+
+
+class InteractionCapture:
+    """
+    在 ConversionEngine 的服务对象上安装录制或回放钩子（替换实例方法，finish 时恢复）
+    录制：调用真实服务，保存片假名转换、翻译结果和下载的音频字节及各自耗时
+    回放：不访问任何网站，按存档返回结果；time_scale 为 1 时按原始耗时等待，为 0 时尽快返回
+    """
+
+    # 回放时存档中缺少记录的处理：翻译接口与原实现一致返回空字符串，其余抛出异常
+    MISSING_RESULTS = {"translation": ""}
+
+    def __init__(self, engine, archive, replay=False, time_scale=1.0, log_callback=None):
+        self.engine = engine
+        self.archive = archive
+        self.replay = replay
+        self.time_scale = time_scale
+        self.log_callback = log_callback or (lambda message: None)
+        self._patched = []
+
+    @classmethod
+    def from_params(cls, engine, params):
+        """
+        按 params 创建：replay_path 指定回放存档，record_path 指定录制存档（二者互斥）
+        replay_speed 为 "original"（默认，按原始耗时）、"fast"（不等待）或耗时倍率
+        """
+        if params.get("replay_path"):
+            speed = params.get("replay_speed", "original")
+            time_scale = {"original": 1.0, "fast": 0.0}.get(speed, speed)
+            archive = InteractionArchive(params["replay_path"]).load()
+            return cls(engine, archive, replay=True, time_scale=float(time_scale),
+                       log_callback=params["log_callback"]).install()
+        if params.get("record_path"):
+            return cls(engine, InteractionArchive(params["record_path"]),
+                       log_callback=params["log_callback"]).install()
+        return None
+
+    def install(self):
+        wrap = self._replayed if self.replay else self._recorded
+        text_processor = self.engine.text_processor
+        self._patch(text_processor, "convert_chinese_to_katakana",
+                    wrap("ltool", text_processor.convert_chinese_to_katakana, lambda driver, lines, log: [lines]))
+        self._patch(text_processor, "convert_english_to_katakana",
+                    wrap("sljfaq", text_processor.convert_english_to_katakana, lambda driver, lines, log: [lines]))
+
+        translation_service = self.engine.translation_service
+        self._patch(translation_service, "translate_with_api",
+                    wrap("translation", translation_service.translate_with_api, lambda text: [text]))
+
+        browser_manager = self.engine.browser_manager
+        if self.replay:
+            self._patch(browser_manager, "init_driver", lambda download_dir, browser_type, log: _ReplayDriver())
+            self._patch(browser_manager, "download_audio", self._replayed_download)
+        else:
+            self._patch(browser_manager, "download_audio", self._recorded_download(browser_manager.download_audio))
+
+        if self.replay:
+            self.log_callback(f"回放远程交互: {self.archive.path}（{len(self.archive.records)}条记录，"
+                              f"耗时倍率 {self.time_scale:g}）")
+        else:
+            self.log_callback(f"录制远程交互到: {self.archive.path}")
+        return self
+
+    def finish(self):
+        """恢复原方法；录制模式下写入存档"""
+        for target, name in self._patched:
+            delattr(target, name)
+        self._patched = []
+        if not self.replay:
+            self.archive.save()
+            self.log_callback(f"已保存{len(self.archive.records)}条远程交互记录: {self.archive.path}")
+
+    def _patch(self, target, name, replacement):
+        setattr(target, name, replacement)
+        self._patched.append((target, name))
+
+    def _wait(self, record):
+        if self.time_scale > 0 and record["elapsed"] > 0:
+            # 按原速回放时单次等待可达十几秒，停止转换时须立即返回
+            cancellable_sleep(record["elapsed"] * self.time_scale)
+
+    def _recorded(self, kind, method, inputs_of):
+        def recorded(*args):
+            start = time.time()
+            try:
+                result = method(*args)
+            except Exception as e:
+                self.archive.add(kind, inputs_of(*args), time.time() - start, error=str(e))
+                raise
+            self.archive.add(kind, inputs_of(*args), time.time() - start, result=result)
+            return result
+        return recorded
+
+    def _replayed(self, kind, method, inputs_of):
+        def replayed(*args):
+            record = self.archive.take(kind, *inputs_of(*args))
+            if record is None:
+                if kind in self.MISSING_RESULTS:
+                    return self.MISSING_RESULTS[kind]
+                raise Exception(f"回放存档中没有该{kind}请求的记录")
+            self._wait(record)
+            if record["error"] is not None:
+                raise Exception(record["error"])
+            return record["result"]
+        return replayed
+
+    def _recorded_download(self, method):
+        def recorded(driver, text, line_num, clean_name, voice_value, output_dir, log_callback):
+            start = time.time()
+            path = method(driver, text, line_num, clean_name, voice_value, output_dir, log_callback)
+            elapsed = time.time() - start
+            audio = None
+            if path and os.path.exists(path):
+                with open(path, "rb") as f:
+                    audio = f.read()
+            self.archive.add("yukumo", [voice_value, text], elapsed, result=bool(audio), audio=audio)
+            return path
+        return recorded
+
+    def _replayed_download(self, driver, text, line_num, clean_name, voice_value, output_dir, log_callback):
+        """与 BrowserManager.download_audio 相同的输出文件名与返回值"""
+        record = self.archive.take("yukumo", voice_value, text)
+        if record is None:
+            log_callback(f"回放存档中没有第{line_num}行的音频记录")
+            return None
+        self._wait(record)
+        if not record.get("audio"):
+            return None
+
+        new_path = os.path.join(output_dir, f"{line_num}-{clean_name}.mp3")
+        with open(new_path, "wb") as f:
+            f.write(self.archive.read_audio(record))
+        return new_path
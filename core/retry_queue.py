@@ -0,0 +1,64 @@
+import random
+import time
+
+
+class RetryQueue:
+    """
+    失败行的延迟重试队列：失败的行排到队尾，按指数退避（带随机抖动）到期后再重试，
+    超过重试次数或不可重试的行记为永久失败；所有状态按原始行号记录
+    """
+
+    def __init__(self, max_retries=2, base_delay=2.0, max_delay=30.0, jitter=0.2, clock=time.time):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.clock = clock
+        self.attempts = {}  # 行号 -> 已失败次数
+        self.reasons = {}  # 行号 -> 最近一次失败原因
+        self._due = {}  # 行号 -> 可以重试的时间
+        self.permanent = set()
+
+    def fail(self, index, reason, retryable=True):
+        """记录一次失败，返回该行是否还会重试"""
+        self.attempts[index] = self.attempts.get(index, 0) + 1
+        self.reasons[index] = reason
+        if not retryable or self.attempts[index] > self.max_retries:
+            self._due.pop(index, None)
+            self.permanent.add(index)
+            return False
+
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.attempts[index] - 1))
+        delay *= 1.0 + random.uniform(-self.jitter, self.jitter)
+        self._due[index] = self.clock() + delay
+        return True
+
+    def succeed(self, index):
+        self._due.pop(index, None)
+        self.permanent.discard(index)
+        self.reasons.pop(index, None)
+
+    def pending(self):
+        return bool(self._due)
+
+    def wait_time(self):
+        """距离最早一行可以重试还需等待的秒数"""
+        if not self._due:
+            return 0.0
+        return max(0.0, min(self._due.values()) - self.clock())
+
+    def take_due(self, window=1.0):
+        """取出所有已到期（或 window 秒内即将到期）的行（按行号排序），减少重试轮数"""
+        now = self.clock() + window
+        due = sorted(index for index, when in self._due.items() if when <= now)
+        for index in due:
+            del self._due[index]
+        return due
+
+    def report(self, original_lines):
+        """永久失败行的报告文本（行号从1开始），没有失败时返回空字符串"""
+        rows = [
+            f"第{index + 1}行\t{self.reasons.get(index, '')}\t尝试{self.attempts.get(index, 0)}次\t{original_lines[index]}"
+            for index in sorted(self.permanent)
+        ]
+        return "\n".join(rows)
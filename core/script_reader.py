@@ -0,0 +1,109 @@
+import os
+
+BOM = "\ufeff"
+
+
+class ScriptReader:
+    """
+    逐行惰性读取输入文本：去掉空行、解析行首的参数覆盖（如 "[voice=aqtk2-rm speed=130]"）、
+    按模式逐行验证语言，读到的行即可交给后续流程，不必等整个文件读完并验证
+    结果按读取顺序累积在 lines / overrides / numbers（文件中的行号，从1开始）中，
+    未通过验证的行记录在 invalid（{行号(从0开始): 原因}），仍占用自己的行号以保持输出文件编号不变
+    """
+
+    def __init__(self, path, mode, text_processor, log_callback):
+        self.path = path
+        self.text_processor = text_processor
+        self.log_callback = log_callback
+        self.validate = text_processor.line_validator(mode)
+        self.lines = []
+        self.overrides = []
+        self.numbers = []
+        self.invalid = {}
+        self.finished = False
+        self.bytes_read = 0
+        self.file_size = os.path.getsize(path)
+        self._iterator = None
+        self._batched = 0
+
+    def __iter__(self):
+        """依次返回新读到的行号（从0开始）；可以多次调用，从上次停下的位置继续"""
+        if self._iterator is None:
+            self._iterator = self._read()
+        return self._iterator
+
+    def _read(self):
+        with open(self.path, "rb") as f:
+            for number, raw in enumerate(f, 1):
+                self.bytes_read += len(raw)
+                try:
+                    line = raw.decode("utf-8")
+                except UnicodeDecodeError as e:
+                    line = raw.decode("utf-8", errors="replace")
+                    error = f"不是有效的UTF-8文本（第{e.start + 1}个字节）"
+                else:
+                    error = None
+                if number == 1:
+                    line = line.lstrip(BOM)
+                line = line.strip()
+                if not line:
+                    continue
+
+                text, values, errors = self.text_processor.parse_line_overrides(line)
+                for override_error in errors:
+                    self.log_callback(f"第{number}行参数无效，已忽略: {override_error}")
+                if not text:
+                    self.log_callback(f"第{number}行只有参数没有文本，已跳过")
+                    continue
+
+                idx = len(self.lines)
+                self.lines.append(text)
+                self.overrides.append(values)
+                self.numbers.append(number)
+                error = error or self.validate(text)
+                if error:
+                    self.invalid[idx] = f"语言验证失败（文件第{number}行）: {error}"
+                    self.log_callback(f"第{number}行语言验证失败，已跳过: {error}")
+                yield idx
+        self.finished = True
+
+        overridden = sum(1 for values in self.overrides if values)
+        if overridden:
+            self.log_callback(f"{overridden} 行使用了单独的声种/音频参数")
+        if self.invalid and len(self.invalid) < len(self.lines):
+            self.log_callback(
+                f"{len(self.invalid)} 行未通过语言验证（文件第 {[self.numbers[i] for i in sorted(self.invalid)]} 行），"
+                f"其余 {len(self.lines) - len(self.invalid)} 行继续转换"
+            )
+
+    def batches(self, size=None):
+        """
+        按 size 行一批返回行号列表（包括之前已读到、尚未分批的行）；
+        size 为空时读完整个文件后一次返回
+        """
+        for _ in self:
+            if size and len(self.lines) - self._batched >= size:
+                yield self._take()
+        if self._batched < len(self.lines):
+            yield self._take()
+
+    def _take(self):
+        batch = list(range(self._batched, len(self.lines)))
+        self._batched = len(self.lines)
+        return batch
+
+    def read_all(self):
+        """读完剩余的行，返回全部文本行"""
+        for _ in self:
+            pass
+        return self.lines
+
+    def valid_indices(self, indices=None):
+        indices = range(len(self.lines)) if indices is None else indices
+        return [idx for idx in indices if idx not in self.invalid]
+
+    def estimated_total(self):
+        """按已读字节比例估计的总行数（读完后为实际行数）"""
+        if self.finished or not self.bytes_read:
+            return len(self.lines)
+        return max(len(self.lines), round(len(self.lines) * self.file_size / self.bytes_read))
@@ -0,0 +1,88 @@
+import re
+
+import numpy as np
+
+# 可以断开长行的标点（断在标点之后），句末标点优先
+SPLIT_PUNCTUATION = "。．.！!？?、，,；;：:…・ 　"
+SENTENCE_END = "。．.！!？?"
+DEFAULT_MAX_SEGMENT_CHARS = 80
+
+_BOUNDARY_PATTERN = re.compile(f"[{re.escape(SPLIT_PUNCTUATION)}]+")
+
+
+def split_text(text, max_chars=DEFAULT_MAX_SEGMENT_CHARS):
+    """
+    把超长的行切分为不超过 max_chars 个字符的段：优先在句末标点后断开，其次在其他标点后，
+    没有可用的标点时按长度硬切；未超长的行原样返回（一段）
+    """
+    text = text.strip()
+    segments = []
+    while len(text) > max_chars:
+        window = text[:max_chars]
+        cut = _last_boundary(window, SENTENCE_END) or _last_boundary(window, SPLIT_PUNCTUATION) or max_chars
+        segments.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        segments.append(text)
+    return [segment for segment in segments if segment]
+
+
+def _last_boundary(window, marks):
+    """window 中最后一个标点之后的位置；只在后三分之二中查找，避免切出过短的段"""
+    for pos in range(len(window) - 1, len(window) // 3 - 1, -1):
+        if window[pos] in marks:
+            return pos + 1
+    return 0
+
+
+def split_like(text, weights):
+    """
+    把显示用的原文在标点处分成 len(weights) 段，各段长度尽量与 weights（各合成段的长度）成比例，
+    用于字幕的逐段时间；标点不够时返回 None
+    """
+    if len(weights) < 2:
+        return [text]
+    boundaries = [m.end() for m in _BOUNDARY_PATTERN.finditer(text) if m.end() < len(text)]
+    if len(boundaries) < len(weights) - 1:
+        return None
+
+    cuts = []
+    total = float(sum(weights))
+    acc = 0
+    for position, weight in enumerate(weights[:-1]):
+        acc += weight
+        target = len(text) * acc / total
+        # 后面每一刀至少要留一个边界
+        remaining = len(weights) - 2 - position
+        candidates = [b for b in boundaries if not cuts or b > cuts[-1]]
+        candidates = candidates[:len(candidates) - remaining] if remaining else candidates
+        cuts.append(min(candidates, key=lambda b: abs(b - target)))
+
+    pieces = [text[a:b].strip() for a, b in zip([0] + cuts, cuts + [len(text)])]
+    return pieces if all(pieces) else None
+
+
+def crossfade_concat(clips, sr, fade_seconds=0.03):
+    """
+    用短的线性交叉淡化按顺序拼接多段音频（(n,) 或 (channels, n)），
+    返回 (拼接结果, 各段在结果中的起始时间占总时长的比例)
+    """
+    clips = [np.atleast_2d(np.asarray(clip, dtype=np.float32)) for clip in clips]
+    if len({clip.shape[0] for clip in clips}) > 1:
+        clips = [clip.mean(axis=0, keepdims=True) for clip in clips]
+
+    result = clips[0]
+    starts = [0]
+    for clip in clips[1:]:
+        fade = min(int(sr * fade_seconds), result.shape[1], clip.shape[1])
+        starts.append(result.shape[1] - fade)
+        if fade:
+            weights = (np.arange(fade, dtype=np.float32) + 0.5) / fade
+            overlap = result[:, -fade:] * (1.0 - weights) + clip[:, :fade] * weights
+            result = np.concatenate((result[:, :-fade], overlap, clip[:, fade:]), axis=1)
+        else:
+            result = np.concatenate((result, clip), axis=1)
+
+    total = max(result.shape[1], 1)
+    fractions = [start / total for start in starts]
+    return (result[0] if result.shape[0] == 1 else result), fractions
@@ -0,0 +1,116 @@
+"""
+分片模式命令行入口
+
+    python -m core.shard_runner prepare --queue job.db --input script.txt --output out/ --mode 日文Yukkuri
+    python -m core.shard_runner worker --queue job.db        # 可在多台共享目录的主机上启动任意个
+    python -m core.shard_runner merge --queue job.db
+"""
+import argparse
+import sys
+import time
+
+from core.audio_codec import DEFAULT_OUTPUT_FORMAT, OUTPUT_FORMATS
+from core.audio_processor import DEFAULT_QUALITY_PRESET, QUALITY_PRESETS, STRETCH_ALGORITHMS
+from core.conversion_engine import ConversionEngine
+from services.text_processor import AUTO_CHINESE_MODES, AUTO_MODE
+
+
+def _console_params(args):
+    """命令行模式下的回调：日志与进度直接输出到终端"""
+    def log(message):
+        print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+    def progress(value, text):
+        print(f"[{time.strftime('%H:%M:%S')}] 进度 {value:5.1f}% {text}", flush=True)
+
+    return {
+        "input_file": getattr(args, "input", None),
+        "output_dir": getattr(args, "output", None),
+        "mode": getattr(args, "mode", None),
+        "auto_chinese_mode": getattr(args, "auto_chinese", None),
+        "voice_type": getattr(args, "voice", None),
+        "speed": getattr(args, "speed", None),
+        "volume": getattr(args, "volume", None),
+        "pitch": getattr(args, "pitch", None),
+        "output_format": getattr(args, "format", None),
+        "stretch_algorithm": getattr(args, "stretch", None),
+        "preserve_formants": getattr(args, "preserve_formants", None),
+        "quality_preset": getattr(args, "quality", None),
+        "generate_lrc": None if getattr(args, "no_lrc", None) is None else not args.no_lrc,
+        "lrc_segments": getattr(args, "lrc_segments", None),
+        "browser_type": getattr(args, "browser", None),
+        "lease_seconds": args.lease,
+        "memory_budget_mb": getattr(args, "memory_budget", None),
+        "endpoints": args.endpoints,
+        "log_callback": log,
+        "progress_callback": progress,
+        "status_callback": log,
+        "stop_flag": lambda: False,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Yukkuri音频转换分片模式")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prepare = subparsers.add_parser("prepare", help="转换文本并创建工作队列")
+    prepare.add_argument("--input", required=True, help="输入文本文件")
+    prepare.add_argument("--output", required=True, help="共享输出目录")
+    prepare.add_argument("--mode", default="日文Yukkuri",
+                         choices=["中文Yukkuri", "英文Yukkuri", "日文Yukkuri", "中文翻译日文Yukkuri", AUTO_MODE])
+    prepare.add_argument("--auto-chinese", default="中文Yukkuri", choices=list(AUTO_CHINESE_MODES),
+                         help=f"{AUTO_MODE} 模式中中文行的转换方式（转片假名或翻译为日文）")
+    prepare.add_argument("--voice", default="aqtk1-f1", help="声种值，例如 aqtk1-f1")
+    prepare.add_argument("--speed", type=int, default=100)
+    prepare.add_argument("--volume", type=int, default=100)
+    prepare.add_argument("--pitch", type=int, default=100)
+    prepare.add_argument("--quality", default=DEFAULT_QUALITY_PRESET, choices=list(QUALITY_PRESETS),
+                         help="质量预设（同时决定未指定时的输出格式与语速调整算法）")
+    prepare.add_argument("--format", default=None, choices=sorted(OUTPUT_FORMATS),
+                         help=f"输出格式（默认由质量预设决定，high 为 {DEFAULT_OUTPUT_FORMAT}）")
+    prepare.add_argument("--stretch", default=None, choices=sorted(STRETCH_ALGORITHMS),
+                         help="语速调整算法（默认由质量预设决定）")
+    prepare.add_argument("--preserve-formants", action="store_true", default=False,
+                         help="变调时保留共振峰")
+    prepare.add_argument("--browser", default="自动检测", choices=["自动检测", "Chrome", "Edge", "Firefox"])
+    prepare.add_argument("--no-lrc", action="store_true", default=False, help="不生成LRC字幕文件")
+    prepare.add_argument("--lrc-segments", action="store_true", default=False,
+                         help="分段合成的长句在字幕中逐段写入时间")
+    prepare.add_argument("--range-size", type=int, default=20, help="每个区间包含的行数")
+
+    worker = subparsers.add_parser("worker", help="领取区间并合成音频")
+    worker.add_argument("--worker-id", default=None, help="工作进程标识（默认自动生成）")
+    worker.add_argument("--output", default=None, help="本机上共享输出目录的路径（默认使用队列中的路径）")
+    worker.add_argument("--browser", default=None, choices=["自动检测", "Chrome", "Edge", "Firefox"])
+    worker.add_argument("--poll", type=float, default=5, help="等待其他进程租约时的轮询间隔（秒）")
+    worker.add_argument("--memory-budget", type=int, default=None,
+                        help="内存预算（MB，含浏览器与ffmpeg子进程），超出时暂停新的行")
+
+    merge = subparsers.add_parser("merge", help="等待全部区间完成并生成LRC")
+    merge.add_argument("--output", default=None, help="本机上共享输出目录的路径（默认使用队列中的路径）")
+    merge.add_argument("--no-wait", action="store_true", help="任务未完成时立即返回")
+    merge.add_argument("--poll", type=float, default=5)
+
+    for sub in (prepare, worker, merge):
+        sub.add_argument("--queue", required=True, help="SQLite工作队列文件（放在共享目录中）")
+        sub.add_argument("--lease", type=float, default=120, help="区间租约时长（秒）")
+        sub.add_argument("--endpoints", default=None,
+                         help="本地替身服务器基地址，例如 http://127.0.0.1:8765（默认访问真实网站）")
+
+    args = parser.parse_args(argv)
+    params = _console_params(args)
+    engine = ConversionEngine()
+
+    if args.command == "prepare":
+        ok = engine.prepare_sharded_job(params, args.queue, args.range_size)
+    elif args.command == "worker":
+        engine.run_shard_worker(args.queue, params, args.worker_id, args.poll)
+        ok = True
+    else:
+        ok = engine.merge_sharded_job(args.queue, params, wait=not args.no_wait, poll_interval=args.poll)
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
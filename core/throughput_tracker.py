@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _default_history_path():
+    """历史吞吐数据的默认存放位置（用户目录下）"""
+    return os.path.join(os.path.expanduser("~"), ".yukkuri_converter", "throughput_history.json")
+
+
+def _format_seconds(seconds):
+    """将秒数格式化为 HH:MM:SS 或 MM:SS"""
+    seconds = max(0, int(seconds))
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    if hours:
+        return f"{hours:d}:{minutes:02d}:{secs:02d}"
+    return f"{minutes:02d}:{secs:02d}"
+
+
+class ThroughputHistory:
+    """以JSON文件保存历史任务的逐行各阶段耗时"""
+
+    def __init__(self, path=None, max_jobs=50):
+        self.path = path or _default_history_path()
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+
+    def load(self):
+        """读取全部历史记录，文件损坏时返回空列表"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, list) else []
+        except (OSError, ValueError):
+            return []
+
+    def append(self, record):
+        """追加一条任务记录，只保留最近 max_jobs 条"""
+        with self._lock:
+            records = self.load()
+            records.append(record)
+            records = records[-self.max_jobs:]
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(records, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+
+    def baseline(self, mode=None):
+        """计算历史基线：各阶段每行耗时的中位数（秒），"wall" 为逐行处理的实际耗时"""
+        records = [r for r in self.load() if r.get("lines")]
+        if mode is not None:
+            same_mode = [r for r in records if r.get("mode") == mode]
+            records = same_mode or records
+
+        if not records:
+            return {}
+
+        per_stage = {}
+        for record in records:
+            for stage, total in record.get("stage_seconds", {}).items():
+                per_stage.setdefault(stage, []).append(total / record["lines"])
+            if record.get("wall_seconds"):
+                per_stage.setdefault("wall", []).append(record["wall_seconds"] / record["lines"])
+
+        baseline = {}
+        for stage, values in per_stage.items():
+            values.sort()
+            baseline[stage] = values[len(values) // 2]
+        return baseline
+
+
+class ThroughputTracker:
+    """记录当前任务的阶段耗时，计算实时速率、剩余时间并与历史基线比较"""
+
+    # 在逐行处理开始前一次性完成的阶段，不计入逐行速率
+    UPFRONT_STAGES = ("text",)
+
+    def __init__(self, total_lines, mode=None, history=None, slowdown_ratio=0.5, min_lines=3):
+        self.total_lines = total_lines
+        self.mode = mode
+        self.history = history or ThroughputHistory()
+        self.slowdown_ratio = slowdown_ratio
+        self.min_lines = min_lines
+
+        self.stage_seconds = {}
+        self.completed_lines = 0
+        self.start_time = time.time()
+        self.lines_start_time = None
+        self.baseline = self.history.baseline(mode)
+        self._slowdown_reported = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """统计一个阶段的耗时（可重复进入，按阶段累计）"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_stage_time(name, time.time() - start)
+
+    def add_stage_time(self, name, seconds):
+        with self._lock:
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+
+    def line_done(self, count=1):
+        with self._lock:
+            self.completed_lines += count
+
+    def start_lines(self):
+        """标记逐行处理开始（文本转换等前置阶段已结束）"""
+        self.lines_start_time = time.time()
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def lines_elapsed(self):
+        return time.time() - (self.lines_start_time or self.start_time)
+
+    def lines_per_minute(self):
+        """当前任务的实际速率（行/分钟）"""
+        elapsed = self.lines_elapsed()
+        if not self.completed_lines or elapsed <= 0:
+            return 0.0
+        return self.completed_lines * 60.0 / elapsed
+
+    def baseline_seconds_per_line(self):
+        if "wall" in self.baseline:
+            return self.baseline["wall"]
+        return sum(seconds for stage, seconds in self.baseline.items()
+                   if stage not in self.UPFRONT_STAGES and stage != "wall")
+
+    def eta_seconds(self):
+        """剩余时间估计：已有足够样本时按当前速率，否则按历史基线"""
+        remaining = max(0, self.total_lines - self.completed_lines)
+        if self.completed_lines >= self.min_lines:
+            return remaining * self.lines_elapsed() / self.completed_lines
+
+        baseline = self.baseline_seconds_per_line()
+        if baseline > 0:
+            return remaining * baseline
+        return None
+
+    def format_progress(self, current, total):
+        """生成进度文本，例如 "12/500 | 8.5行/分 | 剩余 57:24" """
+        parts = [f"{current}/{total}"]
+        rate = self.lines_per_minute()
+        if rate > 0:
+            parts.append(f"{rate:.1f}行/分")
+        eta = self.eta_seconds()
+        if eta is not None:
+            parts.append(f"剩余 {_format_seconds(eta)}")
+        return " | ".join(parts)
+
+    def check_slowdown(self):
+        """当前速率明显低于历史基线时返回提示信息（每个任务只提示一次）"""
+        if self._slowdown_reported or self.completed_lines < self.min_lines:
+            return None
+
+        baseline = self.baseline_seconds_per_line()
+        if baseline <= 0:
+            return None
+
+        current = self.lines_elapsed() / self.completed_lines
+        if current * self.slowdown_ratio > baseline:
+            self._slowdown_reported = True
+            return (f"警告: 当前吞吐量明显低于历史水平（当前 {current:.1f} 秒/行，"
+                    f"历史 {baseline:.1f} 秒/行），远程网站可能比平时慢")
+        return None
+
+    def summary(self):
+        """生成任务结束时的阶段耗时摘要"""
+        if not self.completed_lines:
+            return "未完成任何行，无吞吐统计"
+        stages = ", ".join(
+            f"{name} {seconds / self.completed_lines:.2f}秒/行"
+            for name, seconds in sorted(self.stage_seconds.items())
+        )
+        return (f"吞吐统计: 共 {self.completed_lines} 行，用时 {_format_seconds(self.elapsed())}，"
+                f"{self.lines_per_minute():.1f}行/分（{stages}）")
+
+    def save(self):
+        """把本次任务写入历史库，供以后估计剩余时间"""
+        if not self.completed_lines:
+            return
+        self.history.append({
+            "timestamp": time.time(),
+            "mode": self.mode,
+            "lines": self.completed_lines,
+            "stage_seconds": self.stage_seconds,
+            "wall_seconds": self.lines_elapsed(),
+        })
@@ -1,6 +1,10 @@
 import os
+import shutil
 import sys
 
+# Linux 的写时复制 ioctl（btrfs、XFS 等）；Python 3.12 起为 fcntl.FICLONE
+_FICLONE = 0x40049409
+
 
 def resource_path(relative_path):
     """获取资源的绝对路径（修正路径格式）"""
@@ -23,4 +27,42 @@ def get_ffmpeg_path():
 
 def get_ffprobe_path():
     """获取FFprobe路径（修正相对路径）"""
-    return resource_path('resources/ffprobe.exe')
\ No newline at end of file
+    return resource_path('resources/ffprobe.exe')
+
+
+def link_or_copy(source, target):
+    """
+    以硬链接生成与 source 内容相同的 target（不占额外空间），跨磁盘或文件系统不支持时尝试写时复制，
+    最后退回普通复制；先生成临时文件再替换，target 已存在时不会改写与它链接的其他文件
+    返回所用方式："hardlink" / "reflink" / "copy"
+    """
+    temp_path = os.path.join(os.path.dirname(target), f".link-{os.path.basename(target)}")
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(source, temp_path)
+        method = "hardlink"
+    except OSError:
+        if _reflink(source, temp_path):
+            method = "reflink"
+        else:
+            shutil.copyfile(source, temp_path)
+            method = "copy"
+    os.replace(temp_path, target)
+    return method
+
+
+def _reflink(source, target):
+    """写时复制；平台或文件系统不支持时返回 False"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), getattr(fcntl, "FICLONE", _FICLONE), src.fileno())
+        return True
+    except OSError:
+        if os.path.exists(target):
+            os.remove(target)
+        return False
\ No newline at end of file
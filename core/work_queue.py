@@ -0,0 +1,213 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+
+def default_worker_id():
+    """生成唯一的工作进程标识（主机名-进程号-随机后缀）"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class WorkQueue:
+    """
+    基于SQLite文件的分片工作队列
+    任务按行号区间切分，工作进程以限时租约领取区间，租约过期（进程崩溃）的区间会被重新领取；
+    已被领取 max_attempts 次仍未完成的区间（如每次都使工作进程出错）标记为失败，不再领取
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_LEASED = "leased"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    def __init__(self, path, lease_seconds=120, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    @contextmanager
+    def _connect(self, write=False):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            if write:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            if write:
+                conn.execute("COMMIT")
+        except Exception:
+            if write:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def create_job(self, job, original_lines, converted_lines, range_size):
+        """建立新任务：写入任务参数、逐行文本，并按 range_size 切分区间"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+        with self._connect(write=True) as conn:
+            conn.execute("CREATE TABLE job (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE lines (idx INTEGER PRIMARY KEY, original TEXT, converted TEXT)")
+            conn.execute(
+                "CREATE TABLE ranges (id INTEGER PRIMARY KEY, start INTEGER, end INTEGER, "
+                "status TEXT, owner TEXT, lease_expires REAL, attempts INTEGER DEFAULT 0, error TEXT)"
+            )
+            conn.execute("CREATE TABLE results (idx INTEGER PRIMARY KEY, file TEXT, worker TEXT, segments TEXT)")
+
+            conn.executemany(
+                "INSERT INTO job (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value, ensure_ascii=False)) for key, value in job.items()]
+            )
+            conn.executemany(
+                "INSERT INTO lines (idx, original, converted) VALUES (?, ?, ?)",
+                [(idx, original, converted_lines[idx] if idx < len(converted_lines) else "")
+                 for idx, original in enumerate(original_lines)]
+            )
+            conn.executemany(
+                "INSERT INTO ranges (start, end, status) VALUES (?, ?, ?)",
+                [(start, min(start + range_size, len(original_lines)), self.STATUS_PENDING)
+                 for start in range(0, len(original_lines), range_size)]
+            )
+
+    def job(self):
+        """读取任务参数"""
+        with self._connect() as conn:
+            return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM job")}
+
+    def lines(self, start=0, end=None):
+        """读取 [start, end) 区间的 (行号, 原文, 转换后文本)"""
+        with self._connect() as conn:
+            if end is None:
+                rows = conn.execute(
+                    "SELECT idx, original, converted FROM lines WHERE idx >= ? ORDER BY idx", (start,)
+                )
+            else:
+                rows = conn.execute(
+                    "SELECT idx, original, converted FROM lines WHERE idx >= ? AND idx < ? ORDER BY idx",
+                    (start, end)
+                )
+            return rows.fetchall()
+
+    def claim(self, worker_id):
+        """
+        领取一个待处理或租约已过期的区间
+        返回 (区间id, 起始行号, 结束行号)；没有可领取的区间时返回 None
+        """
+        now = time.time()
+        with self._connect(write=True) as conn:
+            self._fail_exhausted(conn, now)
+            row = conn.execute(
+                "SELECT id, start, end FROM ranges "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY start LIMIT 1",
+                (self.STATUS_PENDING, self.STATUS_LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+
+            conn.execute(
+                "UPDATE ranges SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (self.STATUS_LEASED, worker_id, now + self.lease_seconds, row[0])
+            )
+            return row
+
+    def _fail_exhausted(self, conn, now):
+        """把已领取 max_attempts 次、又回到可领取状态的区间标记为失败"""
+        conn.execute(
+            "UPDATE ranges SET status = ?, owner = NULL, lease_expires = NULL, "
+            "error = COALESCE(error, ?) "
+            "WHERE (status = ? OR (status = ? AND lease_expires < ?)) AND attempts >= ?",
+            (self.STATUS_FAILED, "租约多次过期（工作进程可能在处理该区间时崩溃）",
+             self.STATUS_PENDING, self.STATUS_LEASED, now, self.max_attempts)
+        )
+
+    def renew(self, range_id, worker_id):
+        """续租；租约已被其他进程接管时返回 False"""
+        with self._connect(write=True) as conn:
+            cursor = conn.execute(
+                "UPDATE ranges SET lease_expires = ? WHERE id = ? AND owner = ? AND status = ?",
+                (time.time() + self.lease_seconds, range_id, worker_id, self.STATUS_LEASED)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, range_id, worker_id, results, publish=None, segment_marks=None):
+        """
+        提交区间结果 {行号: 文件名} 并标记完成；租约已过期或区间已被其他进程重新领取时不做任何修改，返回 False
+        publish 若提供，在确认仍持有租约之后、提交之前调用（如把音频移动到共享目录）；抛出异常时数据库的修改回滚、
+        区间仍为领取状态，但 publish 已经移动的文件不会移回（输出文件名由行号决定，之后领取该区间的进程会覆盖它们）
+        segment_marks 为分段合成的行的 {行号: [各段文本, 各段起始比例]}，合并时用于字幕的逐段时间
+        """
+        segment_marks = segment_marks or {}
+        with self._connect(write=True) as conn:
+            cursor = conn.execute(
+                "UPDATE ranges SET status = ?, lease_expires = NULL "
+                "WHERE id = ? AND owner = ? AND status = ? AND lease_expires >= ?",
+                (self.STATUS_DONE, range_id, worker_id, self.STATUS_LEASED, time.time())
+            )
+            if cursor.rowcount != 1:
+                return False
+            if publish is not None:
+                publish()
+            conn.executemany(
+                "INSERT OR REPLACE INTO results (idx, file, worker, segments) VALUES (?, ?, ?, ?)",
+                [(idx, file_name, worker_id,
+                  json.dumps(segment_marks[idx], ensure_ascii=False) if segment_marks.get(idx) else None)
+                 for idx, file_name in results.items()]
+            )
+        return True
+
+    def release(self, range_id, worker_id, error=None):
+        """
+        放弃区间，使其可立即被其他进程领取：用户停止时（error 为空）不计入领取次数，
+        处理出错时记录原因，领取次数达到 max_attempts 后该区间不再被领取
+        """
+        with self._connect(write=True) as conn:
+            conn.execute(
+                "UPDATE ranges SET status = ?, owner = NULL, lease_expires = NULL, "
+                "attempts = attempts - ?, error = COALESCE(?, error) "
+                "WHERE id = ? AND owner = ? AND status = ?",
+                (self.STATUS_PENDING, 0 if error else 1, error, range_id, worker_id, self.STATUS_LEASED)
+            )
+
+    def status(self):
+        """返回各状态的区间数量"""
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM ranges GROUP BY status"))
+        return {
+            self.STATUS_PENDING: counts.get(self.STATUS_PENDING, 0),
+            self.STATUS_LEASED: counts.get(self.STATUS_LEASED, 0),
+            self.STATUS_DONE: counts.get(self.STATUS_DONE, 0),
+            self.STATUS_FAILED: counts.get(self.STATUS_FAILED, 0),
+        }
+
+    def failed_ranges(self):
+        """失败的区间 [(起始行号, 结束行号, 领取次数, 原因)]"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT start, end, attempts, error FROM ranges WHERE status = ? ORDER BY start",
+                (self.STATUS_FAILED,)
+            ).fetchall()
+
+    def is_finished(self):
+        """全部区间都已完成或失败"""
+        with self._connect(write=True) as conn:
+            self._fail_exhausted(conn, time.time())
+        counts = self.status()
+        return counts[self.STATUS_PENDING] == 0 and counts[self.STATUS_LEASED] == 0
+
+    def results(self):
+        """按行号返回所有已完成的结果 {行号: 文件名}"""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT idx, file FROM results ORDER BY idx"))
+
+    def segment_marks(self):
+        """分段合成的行的逐段信息 {行号: [各段文本, 各段起始比例]}"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT idx, segments FROM results WHERE segments IS NOT NULL")
+            return {idx: json.loads(segments) for idx, segments in rows}
@@ -2,22 +2,31 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import time
 import os
+import glob
 import threading
 
+from core.async_engine import AsyncConversionEngine
 from core.conversion_engine import ConversionEngine
+from core.audio_codec import OUTPUT_FORMATS, DEFAULT_OUTPUT_FORMAT
+from core.audio_processor import (STRETCH_ALGORITHMS, DEFAULT_STRETCH_ALGORITHM, QUALITY_PRESETS,
+                                  DEFAULT_QUALITY_PRESET)
+from core.job_client import JobClient
+from core.job_server import DEFAULT_PORT, JOB_DEFAULTS
 from core.utils import resource_path
-from services.text_processor import TextProcessor
+from services.text_processor import AUTO_MODE, TextProcessor
 
 
 class AudioConverterGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("多语言Yukkuri音频转换器")
-        self.root.geometry("850x650")
+        self.root.geometry("850x780")
         self.root.resizable(True, True)
 
         # 初始化核心组件
         self.conversion_engine = ConversionEngine()
+        # 转换在 asyncio 调度层中执行，停止后一秒内结束
+        self.async_engine = AsyncConversionEngine(self.conversion_engine)
         self.text_processor = TextProcessor()
 
         # 变量初始化
@@ -25,6 +34,9 @@ class AudioConverterGUI:
         self.download_path = tk.StringVar()
         self.conversion_mode = tk.StringVar(value="中文Yukkuri")
         self.generate_lrc = tk.BooleanVar(value=True)
+        self.lrc_segments = tk.BooleanVar(value=False)
+        self.incremental = tk.BooleanVar(value=False)
+        self.auto_translate_chinese = tk.BooleanVar(value=False)
         self.is_converting = False
         self.browser_type = tk.StringVar(value="自动检测")
 
@@ -36,6 +48,17 @@ class AudioConverterGUI:
         self.speed_var = tk.IntVar(value=100)
         self.volume_var = tk.IntVar(value=100)
         self.pitch_var = tk.IntVar(value=100)
+        self.output_format = tk.StringVar(value=OUTPUT_FORMATS[DEFAULT_OUTPUT_FORMAT]["label"])
+        self.stretch_algorithm = tk.StringVar(value=STRETCH_ALGORITHMS[DEFAULT_STRETCH_ALGORITHM])
+        self.preserve_formants = tk.BooleanVar(value=False)
+        self.quality_preset = tk.StringVar(value=QUALITY_PRESETS[DEFAULT_QUALITY_PRESET]["label"])
+
+        # 本地任务服务器（共享浏览器与音频处理），启用后本窗口只作为客户端
+        self.use_job_server = tk.BooleanVar(value=False)
+        self.job_server_url = tk.StringVar(value=f"http://127.0.0.1:{DEFAULT_PORT}")
+
+        # 批量队列：{树节点ID: 输入文件路径}，非空时按顺序转换队列中的文件
+        self.batch_items = {}
 
         # 设置UI
         self.setup_ui()
@@ -51,7 +74,7 @@ class AudioConverterGUI:
         main_frame.columnconfigure(0, weight=1)
         main_frame.columnconfigure(1, weight=1)
         main_frame.columnconfigure(2, weight=1)
-        main_frame.rowconfigure(8, weight=1)  # 增加行数以容纳新控件
+        main_frame.rowconfigure(8, weight=1)  # 日志区域随窗口伸缩
 
         # 标题
         title_label = ttk.Label(main_frame, text="多语言Yukkuri音频转换器",
@@ -65,7 +88,8 @@ class AudioConverterGUI:
         # 转换模式选择
         ttk.Label(options_frame, text="转换模式:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
         mode_combo = ttk.Combobox(options_frame, textvariable=self.conversion_mode,
-                                  values=["中文Yukkuri", "英文Yukkuri", "日文Yukkuri", "中文翻译日文Yukkuri"],
+                                  values=["中文Yukkuri", "英文Yukkuri", "日文Yukkuri", "中文翻译日文Yukkuri",
+                                          AUTO_MODE],
                                   state="readonly", width=15)
         mode_combo.grid(row=0, column=1, sticky=tk.W, padx=(0, 20))
         mode_combo.bind("<<ComboboxSelected>>", self.on_mode_changed)
@@ -85,6 +109,17 @@ class AudioConverterGUI:
         voice_combo.grid(row=0, column=5, sticky=tk.W)
         voice_combo.set(self.voice_options[0]["text"])  # 设置默认选项
 
+        # 任务服务器选项
+        ttk.Checkbutton(options_frame, text="通过本地任务服务器执行",
+                        variable=self.use_job_server).grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+        ttk.Entry(options_frame, textvariable=self.job_server_url,
+                  width=30).grid(row=1, column=2, columnspan=4, sticky=tk.W, pady=(5, 0))
+
+        # 自动识别模式中中文行的转换方式
+        ttk.Checkbutton(options_frame, text="自动识别时中文行翻译为日文",
+                        variable=self.auto_translate_chinese).grid(row=2, column=0, columnspan=4, sticky=tk.W,
+                                                                   pady=(5, 0))
+
         # 新增音频参数控制
         audio_params_frame = ttk.LabelFrame(main_frame, text="音频参数调整")
         audio_params_frame.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10, padx=5)
@@ -135,6 +170,33 @@ class AudioConverterGUI:
         pitch_entry.bind("<FocusOut>", lambda e: self.focus_out_handler(self.pitch_var, 20, 200))
         pitch_entry.bind("<Return>", lambda e: self.focus_out_handler(self.pitch_var, 20, 200))
 
+        # 输出格式选择
+        ttk.Label(audio_params_frame, text="输出格式:").grid(row=1, column=0, padx=(10, 5), pady=(5, 5), sticky=tk.W)
+        format_combo = ttk.Combobox(audio_params_frame, textvariable=self.output_format,
+                                    values=[fmt["label"] for fmt in OUTPUT_FORMATS.values()],
+                                    state="readonly", width=35)
+        format_combo.grid(row=1, column=1, columnspan=2, padx=5, pady=(5, 5), sticky=tk.W)
+
+        # 语速调整算法选择
+        ttk.Label(audio_params_frame, text="变速算法:").grid(row=1, column=3, padx=(10, 5), pady=(5, 5), sticky=tk.W)
+        stretch_combo = ttk.Combobox(audio_params_frame, textvariable=self.stretch_algorithm,
+                                     values=list(STRETCH_ALGORITHMS.values()),
+                                     state="readonly", width=28)
+        stretch_combo.grid(row=1, column=4, columnspan=4, padx=5, pady=(5, 5), sticky=tk.W)
+
+        # 变调时保留共振峰（音色不随音程变化）
+        ttk.Checkbutton(audio_params_frame, text="变调时保留共振峰（减轻尖细/低沉音色）",
+                        variable=self.preserve_formants).grid(row=2, column=0, columnspan=6, padx=(10, 5),
+                                                               pady=(0, 5), sticky=tk.W)
+
+        # 质量预设：选择后同时切换输出格式与变速算法（仍可单独修改）
+        ttk.Label(audio_params_frame, text="质量预设:").grid(row=2, column=6, padx=(10, 5), pady=(0, 5), sticky=tk.W)
+        preset_combo = ttk.Combobox(audio_params_frame, textvariable=self.quality_preset,
+                                    values=[preset["label"] for preset in QUALITY_PRESETS.values()],
+                                    state="readonly", width=16)
+        preset_combo.grid(row=2, column=7, columnspan=2, padx=5, pady=(0, 5), sticky=tk.W)
+        preset_combo.bind("<<ComboboxSelected>>", self.on_quality_preset_changed)
+
         # 输入文件选择 - 使用框架包装，使元素更紧凑
         input_frame = ttk.Frame(main_frame)
         input_frame.grid(row=3, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=5)
@@ -148,9 +210,38 @@ class AudioConverterGUI:
 
         input_frame.columnconfigure(1, weight=1)  # 让输入框可扩展
 
+        # 批量队列：多个文件依次转换，共用同一个浏览器
+        batch_frame = ttk.LabelFrame(main_frame, text="批量队列（非空时依次转换队列中的文件，共用同一个浏览器）")
+        batch_frame.grid(row=4, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=5, padx=5)
+        batch_frame.columnconfigure(0, weight=1)
+
+        self.batch_tree = ttk.Treeview(batch_frame, columns=("file", "status", "result"),
+                                       show="headings", height=4)
+        self.batch_tree.heading("file", text="文件")
+        self.batch_tree.heading("status", text="状态")
+        self.batch_tree.heading("result", text="结果")
+        self.batch_tree.column("file", width=420)
+        self.batch_tree.column("status", width=90, anchor=tk.CENTER)
+        self.batch_tree.column("result", width=180, anchor=tk.CENTER)
+        self.batch_tree.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=(5, 0), pady=5)
+        batch_scroll = ttk.Scrollbar(batch_frame, orient=tk.VERTICAL, command=self.batch_tree.yview)
+        batch_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S), pady=5)
+        self.batch_tree.configure(yscrollcommand=batch_scroll.set)
+
+        batch_buttons = ttk.Frame(batch_frame)
+        batch_buttons.grid(row=0, column=2, sticky=tk.N, padx=5, pady=5)
+        ttk.Button(batch_buttons, text="添加文件", width=10,
+                   command=self.add_batch_files).pack(pady=(0, 2))
+        ttk.Button(batch_buttons, text="添加文件夹", width=10,
+                   command=self.add_batch_folder).pack(pady=2)
+        ttk.Button(batch_buttons, text="移除所选", width=10,
+                   command=self.remove_batch_files).pack(pady=2)
+        ttk.Button(batch_buttons, text="清空队列", width=10,
+                   command=self.clear_batch_files).pack(pady=2)
+
         # 下载路径选择 - 同样使用框架包装
         download_frame = ttk.Frame(main_frame)
-        download_frame.grid(row=4, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=5)
+        download_frame.grid(row=5, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=5)
 
         ttk.Label(download_frame, text="下载路径:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
         download_entry = ttk.Entry(download_frame, textvariable=self.download_path,
@@ -163,7 +254,7 @@ class AudioConverterGUI:
 
         # LRC字幕选项
         lrc_frame = ttk.Frame(main_frame)
-        lrc_frame.grid(row=5, column=0, columnspan=4, sticky=(tk.W), pady=5)
+        lrc_frame.grid(row=6, column=0, columnspan=4, sticky=(tk.W), pady=5)
         ttk.Checkbutton(lrc_frame, text="生成LRC字幕文件", variable=self.generate_lrc).pack(side=tk.LEFT)
 
         # 添加LRC说明标签
@@ -171,9 +262,17 @@ class AudioConverterGUI:
                              font=("Arial", 8), foreground="gray")
         lrc_info.pack(side=tk.LEFT, padx=(10, 0))
 
+        # 分段合成的长句按段写入字幕时间
+        ttk.Checkbutton(lrc_frame, text="长句逐段时间",
+                        variable=self.lrc_segments).pack(side=tk.LEFT, padx=(20, 0))
+
+        # 增量渲染选项
+        ttk.Checkbutton(lrc_frame, text="增量渲染（仅重新生成修改过的行）",
+                        variable=self.incremental).pack(side=tk.LEFT, padx=(20, 0))
+
         # 转换按钮和进度条
         button_frame = ttk.Frame(main_frame)
-        button_frame.grid(row=6, column=0, columnspan=4, pady=20)
+        button_frame.grid(row=7, column=0, columnspan=4, pady=20)
 
         self.convert_btn = ttk.Button(button_frame, text="开始转换",
                                       command=self.start_conversion, state="disabled")
@@ -194,9 +293,9 @@ class AudioConverterGUI:
         self.progress_label.pack(side=tk.LEFT, padx=(10, 0))
 
         # 日志显示区域
-        ttk.Label(main_frame, text="转换日志:").grid(row=7, column=0, sticky=(tk.W, tk.N), pady=(10, 5))
+        ttk.Label(main_frame, text="转换日志:").grid(row=8, column=0, sticky=(tk.W, tk.N), pady=(10, 5))
         self.log_text = scrolledtext.ScrolledText(main_frame, height=15, width=80)
-        self.log_text.grid(row=7, column=0, columnspan=4, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(5, 0))
+        self.log_text.grid(row=8, column=0, columnspan=4, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(5, 0))
 
         # 状态栏
         self.status_var = tk.StringVar(value="准备就绪")
@@ -257,6 +356,52 @@ class AudioConverterGUI:
             self.log(f"已选择输入文件: {file_path}")
             self.check_ready_state()
 
+    def add_batch_files(self, file_paths=None):
+        """向批量队列添加文件（已在队列中的文件不重复添加）"""
+        if file_paths is None:
+            file_paths = filedialog.askopenfilenames(
+                title="选择要批量转换的文件",
+                filetypes=[("文本文件", "*.txt"), ("所有文件", "*.*")]
+            )
+        queued = set(self.batch_items.values())
+        added = 0
+        for file_path in file_paths:
+            file_path = os.path.normpath(file_path)
+            if file_path in queued:
+                continue
+            item = self.batch_tree.insert("", tk.END, values=(file_path, "等待", ""))
+            self.batch_items[item] = file_path
+            queued.add(file_path)
+            added += 1
+        if added:
+            self.log(f"已添加 {added} 个文件到批量队列（共 {len(self.batch_items)} 个）")
+        self.check_ready_state()
+
+    def add_batch_folder(self):
+        """把文件夹中的全部 .txt 文件按文件名顺序加入批量队列"""
+        folder_path = filedialog.askdirectory(title="选择包含文本文件的文件夹")
+        if folder_path:
+            file_paths = sorted(glob.glob(os.path.join(folder_path, "*.txt")))
+            if not file_paths:
+                self.log(f"文件夹中没有 .txt 文件: {folder_path}")
+            self.add_batch_files(file_paths)
+
+    def remove_batch_files(self):
+        if self.is_converting:
+            return
+        for item in self.batch_tree.selection():
+            self.batch_tree.delete(item)
+            self.batch_items.pop(item, None)
+        self.check_ready_state()
+
+    def clear_batch_files(self):
+        if self.is_converting:
+            return
+        for item in list(self.batch_items):
+            self.batch_tree.delete(item)
+        self.batch_items = {}
+        self.check_ready_state()
+
     def select_download_path(self):
         """选择下载路径"""
         folder_path = filedialog.askdirectory(title="选择下载路径")
@@ -267,7 +412,8 @@ class AudioConverterGUI:
 
     def check_ready_state(self):
         """检查是否可以开始转换"""
-        if self.input_file_path.get() and self.download_path.get() and not self.is_converting:
+        has_input = self.input_file_path.get() or self.batch_items
+        if has_input and self.download_path.get() and not self.is_converting:
             self.convert_btn.config(state="normal")
             self.status_var.set("准备就绪 - 点击开始转换")
         else:
@@ -283,7 +429,8 @@ class AudioConverterGUI:
         """重置UI状态"""
         self.is_converting = False
         self.convert_btn.config(
-            state="normal" if self.input_file_path.get() and self.download_path.get() else "disabled")
+            state="normal" if (self.input_file_path.get() or self.batch_items) and self.download_path.get()
+            else "disabled")
         self.stop_btn.config(state="disabled")
         self.progress_var.set(0)
         self.progress_label.config(text="准备就绪")
@@ -291,7 +438,7 @@ class AudioConverterGUI:
 
     def start_conversion(self):
         """开始转换过程"""
-        if not self.input_file_path.get() or not self.download_path.get():
+        if not (self.input_file_path.get() or self.batch_items) or not self.download_path.get():
             messagebox.showerror("错误", "请选择输入文件和下载路径")
             return
 
@@ -304,6 +451,8 @@ class AudioConverterGUI:
         lrc_status = "生成LRC字幕" if self.generate_lrc.get() else "不生成LRC字幕"
         audio_params = f"语速: {self.speed_var.get()} | 音量: {self.volume_var.get()} | 音程: {self.pitch_var.get()}"
         voice_info = f"声种: {voice_display} ({voice_value})"
+        if self.batch_items:
+            voice_info += f"\n批量转换 {len(self.batch_items)} 个文件（每个文件输出到下载路径下的同名子目录）"
 
         if messagebox.askyesno("确认",
                                f"确定要开始{mode}转换吗？\n{lrc_status}\n{voice_info}\n音频参数: {audio_params}\n这个过程可能需要一些时间。"):
@@ -328,6 +477,38 @@ class AudioConverterGUI:
     def get_voice_value(self, display_text):
         return self.text_processor.get_voice_value(display_text)
 
+    def get_stretch_algorithm_key(self):
+        """根据下拉框显示文本获取时间伸缩算法键名"""
+        label = self.stretch_algorithm.get()
+        for key, text in STRETCH_ALGORITHMS.items():
+            if text == label:
+                return key
+        return DEFAULT_STRETCH_ALGORITHM
+
+    def get_quality_preset_key(self):
+        """根据下拉框显示文本获取质量预设键名"""
+        label = self.quality_preset.get()
+        for key, preset in QUALITY_PRESETS.items():
+            if preset["label"] == label:
+                return key
+        return DEFAULT_QUALITY_PRESET
+
+    def on_quality_preset_changed(self, event=None):
+        """切换质量预设时把输出格式与变速算法设为该预设的默认值"""
+        key = self.get_quality_preset_key()
+        preset = QUALITY_PRESETS[key]
+        self.output_format.set(OUTPUT_FORMATS[preset["output_format"] or DEFAULT_OUTPUT_FORMAT]["label"])
+        self.stretch_algorithm.set(STRETCH_ALGORITHMS[preset["stretch_algorithm"] or DEFAULT_STRETCH_ALGORITHM])
+        self.log(f"质量预设: {preset['label']}")
+
+    def get_output_format_key(self):
+        """根据下拉框显示文本获取输出格式键名"""
+        label = self.output_format.get()
+        for key, fmt in OUTPUT_FORMATS.items():
+            if fmt["label"] == label:
+                return key
+        return DEFAULT_OUTPUT_FORMAT
+
     def on_mode_changed(self, event=None):
         """转换模式改变时的处理"""
         mode = self.conversion_mode.get()
@@ -340,11 +521,18 @@ class AudioConverterGUI:
             "input_file": self.input_file_path.get(),
             "output_dir": self.download_path.get(),
             "mode": self.conversion_mode.get(),
+            "auto_chinese_mode": "中文翻译日文Yukkuri" if self.auto_translate_chinese.get() else "中文Yukkuri",
             "voice_type": voice_value,
             "speed": self.speed_var.get(),
             "volume": self.volume_var.get(),
             "pitch": self.pitch_var.get(),
+            "output_format": self.get_output_format_key(),
+            "stretch_algorithm": self.get_stretch_algorithm_key(),
+            "preserve_formants": self.preserve_formants.get(),
+            "quality_preset": self.get_quality_preset_key(),
             "generate_lrc": self.generate_lrc.get(),
+            "lrc_segments": self.lrc_segments.get(),
+            "incremental": self.incremental.get(),
             "browser_type": self.browser_type.get(),
             "log_callback": self.log,
             "progress_callback": self.update_progress,
@@ -352,21 +540,113 @@ class AudioConverterGUI:
             "stop_flag": lambda: not self.is_converting
         }
 
+        if self.batch_items:
+            try:
+                self.run_batch_conversion(params)
+            except Exception as e:
+                self.log(f"批量转换过程中发生错误: {str(e)}")
+            finally:
+                self.root.after(0, self.reset_conversion_state)
+            return
+
+        if self.use_job_server.get():
+            try:
+                self.run_remote_conversion(params)
+            except Exception as e:
+                self.log(f"任务服务器执行失败: {str(e)}")
+            finally:
+                self.root.after(0, self.reset_conversion_state)
+            return
+
         try:
-            # 启动转换线程
-            self.conversion_thread = threading.Thread(
-                target=self.conversion_engine.run_conversion,
-                args=(params,)
-            )
-            self.conversion_thread.daemon = True
-            self.conversion_thread.start()
-            self.conversion_thread.join()  # 等待转换线程完成
+            self.async_engine.run_conversion_blocking(params)
         except Exception as e:
             self.log(f"转换过程中发生错误: {str(e)}")
         finally:
             # 无论成功或失败，转换完成后重置UI状态
             self.root.after(0, self.reset_conversion_state)
 
+    def run_batch_conversion(self, params):
+        """按队列顺序转换多个文件：本地执行时共用同一个浏览器，使用任务服务器时逐个提交"""
+        items = list(self.batch_items)
+        input_files = [self.batch_items[item] for item in items]
+        status_texts = {"running": "转换中", "done": "完成", "failed": "失败",
+                        "stopped": "已停止", "skipped": "未执行"}
+        for item in items:
+            self.batch_tree.set(item, "status", "等待")
+            self.batch_tree.set(item, "result", "")
+
+        current = {"position": 0}
+
+        def on_progress(value, text):
+            # 进度条显示整个队列的进度，队列中显示当前文件的进度
+            position = current["position"]
+            self.batch_tree.set(items[position], "result", f"{value:.0f}%")
+            self.update_progress((position + value / 100) / len(items) * 100,
+                                 f"[{position + 1}/{len(items)}] {text}")
+
+        def on_file(position, result):
+            current["position"] = position
+            item = items[position]
+            self.batch_tree.set(item, "status", status_texts.get(result["status"], result["status"]))
+            if result["status"] != "running":
+                lines_text = f"{result['succeeded']}/{result['lines']} 行，" if result["lines"] else ""
+                self.batch_tree.set(item, "result", f"{lines_text}{result['elapsed']:.1f} 秒")
+            else:
+                self.batch_tree.see(item)
+
+        params = dict(params, progress_callback=on_progress)
+        if not self.use_job_server.get():
+            self.async_engine.run_batch_blocking(params, input_files, file_callback=on_file)
+            return
+
+        for position, input_file in enumerate(input_files):
+            if params["stop_flag"]():
+                on_file(position, {"status": "skipped", "succeeded": 0, "lines": 0, "elapsed": 0.0})
+                continue
+            name = os.path.splitext(os.path.basename(input_file))[0]
+            result = {"status": "running", "succeeded": 0, "lines": 0, "elapsed": 0.0}
+            on_file(position, result)
+            start = time.time()
+            try:
+                status = self.run_remote_conversion(dict(params, input_file=input_file,
+                                                         output_dir=os.path.join(params["output_dir"], name)))
+                result["status"] = {"cancelled": "stopped"}.get(status, status)
+            except Exception as e:
+                self.log(f"任务服务器执行失败: {str(e)}")
+                result["status"] = "failed"
+            result["elapsed"] = time.time() - start
+            on_file(position, result)
+
+    def run_remote_conversion(self, params):
+        """作为本地任务服务器的客户端执行转换：提交任务后通过事件流显示日志与进度，返回任务最终状态"""
+        client = JobClient(self.job_server_url.get())
+        with open(params["input_file"], "r", encoding="utf-8") as f:
+            lines = [line.strip() for line in f if line.strip()]
+
+        job = client.submit(
+            lines, {key: params[key] for key in JOB_DEFAULTS},
+            name=os.path.splitext(os.path.basename(params["input_file"]))[0],
+            output_dir=params["output_dir"]
+        )
+        self.log(f"已提交到任务服务器 {self.job_server_url.get()}，任务ID: {job['id']}")
+
+        cancel_sent = False
+        status = job["status"]
+        for kind, data in client.events(job["id"]):
+            if params["stop_flag"]() and not cancel_sent:
+                client.cancel(job["id"])
+                cancel_sent = True
+            if kind == "log":
+                self.log(data["message"])
+            elif kind == "progress":
+                self.update_progress(data["progress"], data["text"])
+            elif kind == "status":
+                status = data["status"]
+                self.update_status({"queued": "排队中...", "running": "转换中...", "done": "转换完成",
+                                    "failed": "转换失败", "cancelled": "已取消"}.get(data["status"], data["status"]))
+        return status
+
     def reset_conversion_state(self):
         """重置转换状态，启用开始按钮"""
         self.is_converting = False
@@ -1,16 +1,64 @@
 import re
-import time
 import os
+import time
+import mutagen
 from mutagen.mp3 import MP3
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
+from core.adaptive_limiter import get_limiter
+from core.cancellation import check_cancelled
+from core.endpoints import resolve_endpoints
+from core.page_waits import FILL_AND_CLICK_SCRIPT, READ_TEXT_SCRIPT, WaitLedger, poll_rounding, timed_script, wait_until
+
+# 行首的参数覆盖，如 "[voice=aqtk2-rm speed=130] こんにちは"
+LINE_OVERRIDE_PATTERN = re.compile(r'^\[((?:\s*[A-Za-z_]+\s*=\s*[^\s\]=]+)+)\s*\]\s*')
+LINE_OVERRIDE_ITEM = re.compile(r'([A-Za-z_]+)\s*=\s*([^\s\]=]+)')
+# 行参数名 -> (转换参数名, 最小值, 最大值)
+LINE_OVERRIDE_KEYS = {
+    "voice": ("voice_type", None, None),
+    "speed": ("speed", 50, 300),
+    "volume": ("volume", 0, 300),
+    "pitch": ("pitch", 20, 200),
+}
+
+# 逐行语言验证（预编译）：英文/日文模式查找不允许的字符，中文模式要求每行包含中文字符
+NOT_ENGLISH_PATTERN = re.compile(r'[^a-zA-Z0-9\s\.,!?;:\'\"-]')
+NOT_JAPANESE_PATTERN = re.compile(r'[^\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF\s\.,!?;:\'\"-]')
+CHINESE_PATTERN = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf]')
+KANA_PATTERN = re.compile(r'[\u3040-\u309F\u30A0-\u30FF]')
+
+# 自动识别模式：逐行识别语言后按对应的单一模式转换；中文行可选择转片假名或翻译为日文
+AUTO_MODE = "自动识别Yukkuri"
+AUTO_CHINESE_MODES = ("中文Yukkuri", "中文翻译日文Yukkuri")
+
+# 片假名转换网站上的元素
+LTOOL_INPUT = "#contents"
+LTOOL_SUBMIT = '//*[@id="ltool"]/div[2]/div[1]/form/div[3]/center/input'
+LTOOL_RESULT = "#result"
+SLJFAQ_INPUT = "#word-input"
+SLJFAQ_SUBMIT = "#converter > form > table > tbody > tr:nth-child(4) > td.buttons > input[type=submit]:nth-child(1)"
+SLJFAQ_RESULT = '//*[@id="katakana-string"]'
+
 
 class TextProcessor:
     def __init__(self):
-        pass
+        self.endpoints = resolve_endpoints()
+        self.wait_ledger = WaitLedger()
+
+    def submit_and_read(self, driver, input_locator, text, submit_locator, result_locator, visible=False):
+        """
+        一次脚本调用填写并提交表单，再等待提交后的新页面中出现结果元素，返回 (结果文本, 估计节省的秒数)
+        原先逐元素操作共5次往返（现为1次），WebDriverWait 每0.5秒检查一次结果
+        """
+        timing = {}
+        wait_until(lambda: timed_script(driver, FILL_AND_CLICK_SCRIPT, input_locator, text, submit_locator,
+                                        timing=timing),
+                   20, description="输入框")
+        start = time.monotonic()
+        result = wait_until(lambda: driver.execute_script(READ_TEXT_SCRIPT, result_locator, visible, True),
+                            20, description="转换结果")
+        saved = 4 * timing.get("rtt", 0.0) + poll_rounding(time.monotonic() - start, 0.5, check_first=True)
+        return result[0] or "", saved
 
     def get_voice_options(self):
         return [
@@ -51,73 +99,122 @@ class TextProcessor:
                 return option["value"]
         return "aqtk1-f1"
 
-    def validate_input_language(self, lines, mode):
-        """验证输入语言"""
-        combined_text = "\n".join(lines)
+    def parse_line_overrides(self, line):
+        """
+        解析行首的参数覆盖（voice/speed/volume/pitch），如 "[voice=aqtk2-rm speed=130] 本文"
+        返回 (去掉参数后的文本, {转换参数名: 值}, [错误说明])；无效的参数被忽略
+        """
+        match = LINE_OVERRIDE_PATTERN.match(line)
+        if not match:
+            return line, {}, []
+
+        overrides = {}
+        errors = []
+        voices = {option["value"] for option in self.get_voice_options()}
+        for name, value in LINE_OVERRIDE_ITEM.findall(match.group(1)):
+            name = name.lower()
+            if name not in LINE_OVERRIDE_KEYS:
+                errors.append(f"未知参数 {name}")
+                continue
+            key, low, high = LINE_OVERRIDE_KEYS[name]
+            if key == "voice_type":
+                if value.lower() not in voices:
+                    errors.append(f"未知声种 {value}")
+                    continue
+                overrides[key] = value.lower()
+                continue
+            try:
+                number = int(value)
+            except ValueError:
+                errors.append(f"{name}={value} 不是整数")
+                continue
+            if not low <= number <= high:
+                errors.append(f"{name}={number} 超出范围 {low}-{high}")
+                continue
+            overrides[key] = number
 
-        if mode == "英文Yukkuri":
-            if not self.is_pure_english(combined_text):
-                return False, "输入内容不是纯英文，请检查文本内容。"
-        elif mode == "日文Yukkuri":
-            if not self.is_pure_japanese(combined_text):
-                return False, "输入内容不是纯日文，请检查文本内容。"
-        elif mode in ["中文Yukkuri", "中文翻译日文Yukkuri"]:
-            if not self.contains_chinese(combined_text):
-                return False, "输入内容不包含中文字符，请检查文本内容。"
+        return line[match.end():].strip(), overrides, errors
 
-        return True, ""
+    def validate_input_language(self, lines, mode):
+        """验证输入语言：逐行检查，返回 (是否全部通过, 未通过的行号与原因)"""
+        validator = self.line_validator(mode)
+        errors = [(number, validator(line)) for number, line in enumerate(lines, 1)]
+        errors = [(number, error) for number, error in errors if error]
+        if not errors:
+            return True, ""
+        details = "；".join(f"第{number}行{error}" for number, error in errors[:10])
+        more = f"（共 {len(errors)} 行）" if len(errors) > 10 else ""
+        return False, f"{details}{more}，请检查文本内容。"
+
+    def line_validator(self, mode):
+        """返回按模式逐行验证的函数：line -> None（通过）或原因"""
+        if mode == "英文Yukkuri":
+            return lambda line: self._disallowed(line, NOT_ENGLISH_PATTERN, "英文")
+        if mode == "日文Yukkuri":
+            return lambda line: self._disallowed(line, NOT_JAPANESE_PATTERN, "日文")
+        if mode in ["中文Yukkuri", "中文翻译日文Yukkuri"]:
+            return lambda line: None if CHINESE_PATTERN.search(line) else "不包含中文字符"
+        if mode == AUTO_MODE:
+            return lambda line: None if self.detect_line_mode(line) else (
+                "无法识别语言（" + self._disallowed(line, NOT_ENGLISH_PATTERN, "英文") + "）")
+        return lambda line: None
+
+    def detect_line_mode(self, line, chinese_mode="中文Yukkuri"):
+        """
+        识别一行的语言，返回该行适用的转换模式：含假名为日文，含汉字（无假名）为中文，
+        只含英文字母、数字与常用标点为英文；都不是时返回 None（只含汉字的日文行会识别为中文）
+        """
+        if KANA_PATTERN.search(line):
+            return "日文Yukkuri"
+        if CHINESE_PATTERN.search(line):
+            return chinese_mode
+        if NOT_ENGLISH_PATTERN.search(line) is None:
+            return "英文Yukkuri"
+        return None
+
+    @staticmethod
+    def _disallowed(line, pattern, language):
+        match = pattern.search(line)
+        if match is None:
+            return None
+        chars = "".join(dict.fromkeys(pattern.findall(line)))[:5]
+        return f"第{match.start() + 1}个字符起包含非{language}字符「{chars}」"
 
     def is_pure_english(self, text):
-        pattern = r'^[a-zA-Z0-9\s\.,!?;:\'\"-]*$'
-        return bool(re.match(pattern, text))
+        return NOT_ENGLISH_PATTERN.search(text) is None
 
     def is_pure_japanese(self, text):
-        japanese_pattern = r'^[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF\s\.,!?;:\'\"-]*$'
-        return bool(re.match(japanese_pattern, text))
+        return NOT_JAPANESE_PATTERN.search(text) is None
 
     def contains_chinese(self, text):
-        pattern = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf]')
-        return bool(pattern.search(text))
+        return bool(CHINESE_PATTERN.search(text))
 
     def convert_chinese_to_katakana(self, driver, chinese_lines, log_callback):
-        """将中文转换为片假名"""
+        """将中文转换为片假名（重试之间的退避与熔断由 ltool 的自适应限速器决定）"""
         max_retries = 3
+        limiter = get_limiter("ltool")
         for attempt in range(max_retries):
+            check_cancelled()
             try:
-                log_callback(f"访问中文转片假名网站（尝试 #{attempt + 1}）")
-                driver.get(
-                    "https://www.ltool.net/chinese_simplified_and_traditional_characters_pinyin_to_katakana_converter_in_simplified_chinese.php"
-                )
-
-                # 输入文本并转换
-                input_area = WebDriverWait(driver, 20).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "#contents"))
-                )
-                input_area.clear()
-                input_area.send_keys("\n".join(chinese_lines))
+                with limiter.request(log_callback):
+                    log_callback(f"访问中文转片假名网站（尝试 #{attempt + 1}）")
+                    driver.get(self.endpoints["ltool"])
 
-                submit_btn = driver.find_element(By.XPATH, '//*[@id="ltool"]/div[2]/div[1]/form/div[3]/center/input')
-                submit_btn.click()
+                    # 输入文本并转换，获取结果
+                    raw_katakana, saved = self.submit_and_read(
+                        driver, LTOOL_INPUT, "\n".join(chinese_lines), LTOOL_SUBMIT, LTOOL_RESULT, visible=True
+                    )
+                    self.wait_ledger.record("text", 0, saved)
 
-                # 获取结果
-                result_div = WebDriverWait(driver, 20).until(
-                    EC.visibility_of_element_located((By.CSS_SELECTOR, "#result"))
-                )
-                raw_katakana = result_div.text
+                    katakana_lines = [self.clean_katakana(line) for line in raw_katakana.splitlines() if line.strip()]
+                    if not katakana_lines:
+                        raise ValueError("转换结果为空")
 
-                if not raw_katakana.strip():
-                    raise ValueError("转换结果为空")
-
-                katakana_lines = [self.clean_katakana(line) for line in raw_katakana.splitlines() if line.strip()]
-
-                if katakana_lines:
-                    log_callback(f"中文转片假名成功（第{attempt + 1}次尝试）")
-                    return katakana_lines
+                log_callback(f"中文转片假名成功（第{attempt + 1}次尝试）")
+                return katakana_lines
 
             except Exception as e:
                 log_callback(f"尝试 #{attempt + 1} 失败: {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(2)
 
         log_callback(f"中文转片假名失败，尝试{max_retries}次后仍无有效结果")
         raise Exception(f"中文转片假名失败，尝试{max_retries}次后仍无有效结果")
@@ -127,54 +224,46 @@ class TextProcessor:
         katakana_lines = []
         try:
             log_callback("正在访问英文转片假名网站...")
-            wait = WebDriverWait(driver, 20)  # 修复：定义 wait 对象
+            # 行与行之间、空结果重试之间的间隔由 sljfaq 的自适应限速器决定
+            limiter = get_limiter("sljfaq")
 
             for i, line in enumerate(english_lines):
-
+                check_cancelled()
                 log_callback(f"转换第{i + 1}行英文: {line}")
 
-                driver.get("https://www.sljfaq.org/cgi/e2k_ja.cgi")
-
-                # 输入英文
-                input_field = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "#word-input")))
-                input_field.clear()
-                input_field.send_keys(line)
-
-                # 点击转换按钮
-                submit_btn = driver.find_element(By.CSS_SELECTOR,
-                                                 "#converter > form > table > tbody > tr:nth-child(4) > td.buttons > input[type=submit]:nth-child(1)")
-                submit_btn.click()
-
                 # 添加重试机制解决空文本问题
                 max_retries = 5
-                retry_delay = 1
                 katakana_text = ""
 
+                reload = True
                 for attempt in range(max_retries):
                     try:
-                        # 获取片假名结果
-                        katakana_element = wait.until(
-                            EC.presence_of_element_located((By.XPATH, '//*[@id="katakana-string"]'))
-                        )
-                        katakana_text = katakana_element.text.strip()
-
-                        if katakana_text:
-                            break
-
-                        if attempt == max_retries - 1:
-                            log_callback(f"第{i + 1}行转换失败（尝试{max_retries}次后仍为空）")
-                            katakana_text = ""
+                        with limiter.request(log_callback) as call:
+                            # 每行第一次尝试、以及上一次尝试出错（页面可能已损坏）后重新打开页面
+                            if reload:
+                                driver.get(self.endpoints["sljfaq"])
+                                reload = False
+
+                            # 输入英文、点击转换按钮并获取片假名结果
+                            katakana_text, saved = self.submit_and_read(
+                                driver, SLJFAQ_INPUT, line, SLJFAQ_SUBMIT, SLJFAQ_RESULT
+                            )
+                            katakana_text = katakana_text.strip()
+                            self.wait_ledger.record("text", i + 1, saved)
+
+                            if not katakana_text:
+                                call.fail()
                     except Exception as e:
                         log_callback(f"第{i + 1}行转换尝试时出错: {str(e)}")
+                        katakana_text = ""
+                        reload = True
 
-                    if not katakana_text and attempt < max_retries - 1:
-                        log_callback(f"第{i + 1}行转换结果为空，等待{retry_delay}秒后重试...")
-                        time.sleep(retry_delay)
-
-                        submit_btn = driver.find_element(By.CSS_SELECTOR,
-                                                         "#converter > form > table > tbody > tr:nth-child(4) > td.buttons > input[type=submit]:nth-child(1)")
-                        submit_btn.click()
-                        time.sleep(1)
+                    if katakana_text:
+                        break
+                    if attempt == max_retries - 1:
+                        log_callback(f"第{i + 1}行转换失败（尝试{max_retries}次后仍为空）")
+                    else:
+                        log_callback(f"第{i + 1}行转换结果为空，稍后重试...")
 
                 if katakana_text:
                     # 清理片假名文本（但保留"・"）
@@ -187,8 +276,6 @@ class TextProcessor:
                     katakana_lines.append("")
                     log_callback(f"第{i + 1}行转换失败，使用空文本")
 
-                time.sleep(1)
-
         except Exception as e:
             log_callback(f"英文转片假名失败: {str(e)}")
 
@@ -271,16 +358,19 @@ class TextProcessor:
         return re.sub(r'[\\/*?:"<>|]', '', filename)
 
     def get_audio_duration(self, audio_file_path):
-        """获取音频时长"""
+        """获取音频时长（支持MP3/OGG/FLAC/WAV）"""
         try:
-            audio = MP3(audio_file_path)
+            if audio_file_path.lower().endswith(".mp3"):
+                audio = MP3(audio_file_path)
+            else:
+                audio = mutagen.File(audio_file_path)
             return audio.info.length
         except Exception:
             return 5.0
 
     def generate_combined_lrc_file(self, text_lines, audio_files, output_prefix, output_dir, language_suffix,
-                                   log_callback):
-        """生成整合的LRC字幕文件"""
+                                   log_callback, sub_lines=None):
+        """生成整合的LRC字幕文件；sub_lines 为 {行位置: [(起始比例, 文本)]}，这些行按段分别写入时间"""
         try:
             # 计算总时长
             total_duration = 0
@@ -308,10 +398,13 @@ class TextProcessor:
             for i, line in enumerate(text_lines):
                 if i < len(audio_files):
                     if line.strip():
-                        minutes = int(current_time // 60)
-                        seconds = current_time % 60
-                        time_tag = f"[{minutes:02d}:{seconds:05.2f}]"
-                        lrc_content.append(f"{time_tag}{line.strip()}")
+                        duration = durations[i] if i < len(durations) else 0
+                        for fraction, text in (sub_lines or {}).get(i, [(0.0, line)]):
+                            start = current_time + fraction * duration
+                            minutes = int(start // 60)
+                            seconds = start % 60
+                            time_tag = f"[{minutes:02d}:{seconds:05.2f}]"
+                            lrc_content.append(f"{time_tag}{text.strip()}")
 
                     if i < len(durations):
                         current_time += durations[i]
@@ -1,34 +1,41 @@
-import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
+from core.adaptive_limiter import get_limiter
+from core.endpoints import resolve_endpoints
+
 
 class TranslationService:
     def __init__(self):
-        pass
+        self.endpoints = resolve_endpoints()
 
     def translate_chinese_to_japanese(self, chinese_lines, log_callback):
-        """将中文翻译为日文"""
-        japanese_lines = []
+        """将中文翻译为日文；各行并发请求，并发数与请求间隔由翻译接口的自适应限速器决定"""
+        japanese_lines = ["" if not line.strip() else line for line in chinese_lines]
 
-        try:
-            log_callback("开始中文到日文翻译...")
+        def translate(i, line):
+            log_callback(f"翻译第{i + 1}行: {line}")
+            translated_text = self.translate_with_api(line)
 
-            for i, line in enumerate(chinese_lines):
-                if not line.strip():
-                    japanese_lines.append("")
-                    continue
+            if translated_text:
+                japanese_lines[i] = translated_text
+                log_callback(f"第{i + 1}行翻译成功: {translated_text}")
+            else:
+                log_callback(f"第{i + 1}行翻译失败，使用原文")
 
-                log_callback(f"翻译第{i + 1}行: {line}")
-                translated_text = self.translate_with_api(line)
-
-                if translated_text:
-                    japanese_lines.append(translated_text)
-                    log_callback(f"第{i + 1}行翻译成功: {translated_text}")
-                else:
-                    japanese_lines.append(line)
-                    log_callback(f"第{i + 1}行翻译失败，使用原文")
+        try:
+            log_callback("开始中文到日文翻译...")
 
-                time.sleep(0.5)
+            # 每个任务在提交时的上下文中运行，以便继承取消令牌
+            with ThreadPoolExecutor(max_workers=get_limiter("translation").max_concurrency) as executor:
+                futures = [
+                    executor.submit(contextvars.copy_context().run, translate, i, line)
+                    for i, line in enumerate(chinese_lines) if line.strip()
+                ]
+                for future in futures:
+                    future.result()
 
             return japanese_lines
 
@@ -40,17 +47,25 @@ class TranslationService:
         """使用API进行翻译"""
         try:
             # 使用免费的翻译API
-            url = "https://api.mymemory.translated.net/get"
+            url = self.endpoints["translation"]
             params = {
                 'q': text,
                 'langpair': 'zh|ja'
             }
 
-            response = requests.get(url, params=params, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if 'responseData' in data and 'translatedText' in data['responseData']:
-                    return data['responseData']['translatedText']
+            with get_limiter("translation").request() as call:
+                response = requests.get(url, params=params, timeout=10)
+                if response.status_code == 429 or response.status_code >= 500:
+                    call.fail(throttled=response.status_code == 429)
+                    return ""
+                if response.status_code == 200:
+                    data = response.json()
+                    # 免费额度用完时接口仍返回200，responseStatus 为429
+                    if str(data.get('responseStatus')) == '429':
+                        call.fail(throttled=True)
+                        return ""
+                    if 'responseData' in data and 'translatedText' in data['responseData']:
+                        return data['responseData']['translatedText']
 
             return ""
         except Exception:
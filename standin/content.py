@@ -0,0 +1,163 @@
+"""
+替身服务器返回的页面与伪造内容（片假名、翻译、合成音频）
+页面只保留 BrowserManager / TextProcessor 用到的元素结构（id、XPath、CSS选择器），结果可复现
+"""
+import hashlib
+import html
+import io
+import struct
+
+import numpy as np
+
+KATAKANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+HIRAGANA = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわん"
+FULLWIDTH_PUNCTUATION = {"，": "、", ",": "、", "。": "。", ".": "。", "？": "？", "?": "？", "！": "！", "!": "！"}
+
+# 没有安装 services.text_processor 依赖时使用的声种列表
+FALLBACK_VOICES = ["aqtk1-f1", "aqtk1-f2", "aqtk1-m1", "aqtk2-rm", "aqtk10-f1"]
+
+
+def voice_values():
+    """与GUI一致的声种值，保证 select_voice_type 能找到对应的 option"""
+    try:
+        from services.text_processor import TextProcessor
+        return [option["value"] for option in TextProcessor().get_voice_options()]
+    except ImportError:
+        return FALLBACK_VOICES
+
+
+def _kana_for(char, alphabet, count):
+    digest = hashlib.md5(char.encode("utf-8")).digest()
+    return "".join(alphabet[digest[i] % len(alphabet)] for i in range(count))
+
+
+def fake_katakana_from_chinese(text):
+    """每个汉字对应两个片假名，标点保留"""
+    return "".join(
+        _kana_for(char, KATAKANA, 2) if "一" <= char <= "鿿" else FULLWIDTH_PUNCTUATION.get(char, char)
+        for char in text
+    )
+
+
+def fake_katakana_from_english(text):
+    """每个英文单词按长度对应若干片假名，单词之间用"・"连接"""
+    words = [word for word in "".join(c if c.isalnum() else " " for c in text).split()]
+    return "・".join(_kana_for(word.lower(), KATAKANA, max(2, (len(word) + 1) // 2)) for word in words)
+
+
+def fake_japanese_translation(text):
+    """中文 -> 平假名伪翻译（每个汉字对应一个平假名）"""
+    return "".join(
+        _kana_for(char, HIRAGANA, 1) if "一" <= char <= "鿿" else FULLWIDTH_PUNCTUATION.get(char, char)
+        for char in text
+    )
+
+
+def _silent_mp3(seconds):
+    """
+    不依赖编码器的静音MP3：MPEG-1 Layer III，128kbps，44.1kHz，单声道
+    边信息全为0的帧解码为静音，帧长 417 字节，每帧 1152 个采样
+    """
+    header = bytes([0xFF, 0xFB, 0x90, 0xC0])
+    frame = header + bytes(417 - len(header))
+    return frame * max(1, int(seconds * 44100 / 1152))
+
+
+def synthesize_mp3(text, voice, seconds_per_char=0.09, sample_rate=44100):
+    """
+    按文本长度生成类语音的MP3（基频由声种决定），优先使用 soundfile 编码，
+    libsndfile 不支持MP3时退回静音帧
+    """
+    seconds = max(0.5, len(text.strip()) * seconds_per_char)
+    n = int(seconds * sample_rate)
+    t = np.arange(n) / sample_rate
+
+    f0 = 110 + struct.unpack("<H", hashlib.md5(voice.encode("utf-8")).digest()[:2])[0] % 120
+    voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(np.pi * 5.0 * t) * 1.5, 0.0, 1.0)
+    audio = (0.3 * voiced * envelope / 2.6).astype(np.float32)
+
+    try:
+        import soundfile as sf
+        buffer = io.BytesIO()
+        sf.write(buffer, audio, sample_rate, format="MP3")
+        return buffer.getvalue()
+    except Exception:
+        return _silent_mp3(seconds)
+
+
+def yukumo_page():
+    options = "".join(f'<option value="{value}">{value}</option>' for value in voice_values())
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>yukumo (stand-in)</title></head>
+<body>
+<div id="home-main">
+  <div><h1>ゆくも (stand-in)</h1></div>
+  <div>
+    <div>
+      <textarea id="__BVID__21" rows="4" cols="60"></textarea>
+      <select id="__BVID__22">{options}</select>
+    </div>
+    <div><div>
+      <button type="button">再生</button>
+      <button type="button" onclick="downloadVoice()">ダウンロード</button>
+    </div></div>
+  </div>
+</div>
+<script>
+function downloadVoice() {{
+  var text = document.getElementById('__BVID__21').value;
+  var voice = document.getElementById('__BVID__22').value;
+  var link = document.createElement('a');
+  link.href = '/yukumo/synth?voice=' + encodeURIComponent(voice) + '&text=' + encodeURIComponent(text);
+  link.download = '';
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+}}
+</script>
+</body></html>"""
+
+
+def ltool_page(contents="", result=None):
+    result_html = ""
+    if result is not None:
+        result_html = '<div id="result">' + "<br>".join(html.escape(line) for line in result.splitlines()) + "</div>"
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>ltool (stand-in)</title></head>
+<body>
+<div id="ltool">
+  <div><h1>中文→片假名 (stand-in)</h1></div>
+  <div>
+    <div>
+      <form method="post" action="/ltool/">
+        <div><textarea id="contents" name="contents" rows="8" cols="60">{html.escape(contents)}</textarea></div>
+        <div></div>
+        <div><center><input type="submit" value="変換"></center></div>
+      </form>
+    </div>
+    {result_html}
+  </div>
+</div>
+</body></html>"""
+
+
+def sljfaq_page(word="", result=None):
+    result_html = ""
+    if result is not None:
+        result_html = f'<p id="katakana-string">{html.escape(result)}</p>'
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>e2k (stand-in)</title></head>
+<body>
+<div id="converter">
+  <form method="get" action="/sljfaq/e2k_ja.cgi">
+    <table><tbody>
+      <tr><td>English</td></tr>
+      <tr><td><input id="word-input" name="word" value="{html.escape(word)}"></td></tr>
+      <tr><td></td></tr>
+      <tr><td class="buttons"><input type="submit" value="変換"><input type="reset" value="クリア"></td></tr>
+    </tbody></table>
+  </form>
+  {result_html}
+</div>
+</body></html>"""
@@ -0,0 +1,284 @@
+"""
+yukumo / ltool / sljfaq / mymemory 的本地替身服务器，用于离线压测与性能分析
+
+    python -m standin.server --port 8765 --latency 150 --jitter 50 --error-rate 0.02
+    python -m standin.server --profile yukumo_synth:latency=800,rate_limit=2 --profile ltool:error_rate=0.2
+
+转换引擎通过 params["endpoints"]、分片命令行的 --endpoints 或环境变量 YUKKURI_ENDPOINT_BASE
+指向 http://127.0.0.1:8765 即可。GET /__stats 返回各服务的请求、错误与限流计数。
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from standin import content
+
+# 可单独配置故障注入的服务名
+SERVICES = ("yukumo_page", "yukumo_synth", "ltool", "sljfaq", "translation")
+
+
+class FaultProfile:
+    """
+    单个服务的故障注入配置
+    latency_ms/jitter_ms: 每个请求的基础延迟与随机抖动（正态分布标准差）
+    error_rate: 返回 503 的概率
+    rate_limit/burst: 令牌桶限流（每秒请求数，0 为不限），超出时返回 429
+    ms_per_char: 按请求文本长度增加的延迟（模拟合成耗时）
+    """
+
+    FIELDS = ("latency_ms", "jitter_ms", "error_rate", "rate_limit", "burst", "ms_per_char")
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit=0.0, burst=1,
+                 ms_per_char=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.ms_per_char = ms_per_char
+
+    def updated(self, **changes):
+        values = {field: getattr(self, field) for field in self.FIELDS}
+        values.update(changes)
+        return FaultProfile(**values)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class _TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """取一个令牌；不足时返回需要等待的秒数"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class StandinServer(ThreadingHTTPServer):
+    """多线程HTTP替身服务器；port 为 0 时使用随机空闲端口"""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, profiles=None, seed=None):
+        super().__init__((host, port), _Handler)
+        self.profiles = {name: FaultProfile() for name in SERVICES}
+        self.profiles.update(profiles or {})
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.stats = {name: {"requests": 0, "errors": 0, "throttled": 0, "latency_total": 0.0}
+                      for name in SERVICES}
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_profile(self, service, profile):
+        """运行中替换某个服务的故障配置（限流状态同时重置）"""
+        with self.lock:
+            self.profiles[service] = profile
+            self.buckets.pop(service, None)
+
+    def start(self):
+        """在后台线程中运行，返回基地址"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def admit(self, service, text_length=0):
+        """
+        按故障配置决定请求结果：返回 (HTTP状态码, 附加等待秒数)
+        状态码为 200 时调用方在等待后返回正常内容
+        """
+        with self.lock:
+            profile = self.profiles[service]
+            stats = self.stats[service]
+            stats["requests"] += 1
+
+            if profile.rate_limit > 0:
+                bucket = self.buckets.get(service)
+                if bucket is None:
+                    bucket = self.buckets[service] = _TokenBucket(profile.rate_limit, profile.burst)
+                retry_after = bucket.take()
+                if retry_after > 0:
+                    stats["throttled"] += 1
+                    return 429, retry_after
+
+            delay = profile.latency_ms + profile.ms_per_char * text_length
+            if profile.jitter_ms:
+                delay += self.random.gauss(0.0, profile.jitter_ms)
+            delay = max(0.0, delay) / 1000.0
+            stats["latency_total"] += delay
+
+            if profile.error_rate and self.random.random() < profile.error_rate:
+                stats["errors"] += 1
+                return 503, delay
+        return 200, delay
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: dict(stats, profile=self.profiles[name].to_dict())
+                for name, stats in self.stats.items()
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "YukkuriStandin/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self._route(url.path, query)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+        form = {key: values[-1] for key, values in parse_qs(body).items()}
+        self._route(url.path, form)
+
+    def _route(self, path, fields):
+        if path == "/__stats":
+            return self._send(200, json.dumps(self.server.snapshot(), ensure_ascii=False), "application/json")
+
+        if path in ("/yukumo", "/yukumo/"):
+            return self._serve("yukumo_page", 0, lambda: (content.yukumo_page(), "text/html"))
+
+        if path == "/yukumo/synth":
+            text, voice = fields.get("text", ""), fields.get("voice", "aqtk1-f1")
+            return self._serve("yukumo_synth", len(text),
+                               lambda: (content.synthesize_mp3(text, voice), "audio/mpeg"),
+                               filename=f"yukumo_{int(time.time() * 1000)}.mp3")
+
+        if path in ("/ltool", "/ltool/"):
+            contents = fields.get("contents")
+            if contents is None:
+                return self._serve("ltool", 0, lambda: (content.ltool_page(), "text/html"))
+            return self._serve("ltool", len(contents), lambda: (
+                content.ltool_page(contents, "\n".join(
+                    content.fake_katakana_from_chinese(line) for line in contents.splitlines()
+                )), "text/html"))
+
+        if path == "/sljfaq/e2k_ja.cgi":
+            word = fields.get("word")
+            if word is None:
+                return self._serve("sljfaq", 0, lambda: (content.sljfaq_page(), "text/html"))
+            return self._serve("sljfaq", len(word), lambda: (
+                content.sljfaq_page(word, content.fake_katakana_from_english(word)), "text/html"))
+
+        if path == "/translation/get":
+            text = fields.get("q", "")
+            return self._serve("translation", len(text), lambda: (json.dumps({
+                "responseData": {"translatedText": content.fake_japanese_translation(text), "match": 1},
+                "responseStatus": 200,
+            }, ensure_ascii=False), "application/json"))
+
+        self._send(404, "not found", "text/plain")
+
+    def _serve(self, service, text_length, render, filename=None):
+        status, delay = self.server.admit(service, text_length)
+        if status == 429:
+            return self._send(429, "Too Many Requests", "text/plain",
+                              {"Retry-After": str(max(1, int(round(delay))))})
+
+        time.sleep(delay)
+        if status != 200:
+            return self._send(status, "Service Unavailable (injected)", "text/plain")
+
+        body, content_type = render()
+        headers = {}
+        if filename:
+            headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        self._send(200, body, content_type, headers)
+
+    def _send(self, status, body, content_type, headers=None):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        if content_type.startswith("text/") or content_type == "application/json":
+            content_type += "; charset=utf-8"
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def parse_profile(spec, profiles):
+    """解析 "服务名:latency=800,error_rate=0.1" 形式的单服务配置，在 profiles 中该服务的配置上修改"""
+    service, _, options = spec.partition(":")
+    if service not in SERVICES:
+        raise ValueError(f"未知服务 {service}，可选: {', '.join(SERVICES)}")
+    changes = {}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        key = key if key in FaultProfile.FIELDS else f"{key}_ms"
+        if key not in FaultProfile.FIELDS:
+            raise ValueError(f"未知配置项 {option}")
+        changes[key] = int(value) if key == "burst" else float(value)
+    return service, profiles[service].updated(**changes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Yukkuri转换引擎用的本地替身服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="所有服务的基础延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟抖动标准差（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回503的概率")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="每个服务每秒允许的请求数（0为不限）")
+    parser.add_argument("--burst", type=int, default=1, help="限流令牌桶容量")
+    parser.add_argument("--synth-ms-per-char", type=float, default=30.0, help="音频合成每个字符增加的延迟（毫秒）")
+    parser.add_argument("--profile", action="append", default=[],
+                        help="单服务配置，例如 yukumo_synth:latency=800,error_rate=0.05,rate_limit=2")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子（使故障注入可复现）")
+    args = parser.parse_args(argv)
+
+    base = FaultProfile(args.latency, args.jitter, args.error_rate, args.rate_limit, args.burst)
+    profiles = {name: base for name in SERVICES}
+    profiles["yukumo_synth"] = base.updated(ms_per_char=args.synth_ms_per_char)
+    for spec in args.profile:
+        try:
+            service, profile = parse_profile(spec, profiles)
+        except ValueError as e:
+            parser.error(str(e))
+        profiles[service] = profile
+
+    server = StandinServer(args.host, args.port, profiles, args.seed)
+    print(f"替身服务器已启动: {server.base_url}", flush=True)
+    for name in SERVICES:
+        print(f"  {name:<13} {server.profiles[name].to_dict()}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
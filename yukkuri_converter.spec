@@ -33,9 +33,30 @@ a = Analysis(
         'gui.audio_converter_gui',
         'core',
         'core.conversion_engine',
+        'core.async_engine',
+        'core.cancellation',
         'core.browser_manager',
+        'core.audio_codec',
         'core.audio_processor',
+        'core.dsp',
+        'core.block_stream',
+        'core.audio_verifier',
         'core.utils',
+        'core.throughput_tracker',
+        'core.render_manifest',
+        'core.work_queue',
+        'core.shard_runner',
+        'core.endpoints',
+        'core.adaptive_limiter',
+        'core.page_waits',
+        'core.replay',
+        'core.retry_queue',
+        'core.script_reader',
+        'core.segmenter',
+        'core.driver_pool',
+        'core.job_server',
+        'core.job_client',
+        'core.memory_governor',
         'services',
         'services.text_processor',
         'services.translation_service',